@@ -0,0 +1,84 @@
+#!/bin/bash
+
+#
+# This script is used to build the provisioning tool as a single executable
+# zipapp, bundling its dependencies.
+#
+
+###############################################################################
+# Constants.
+
+instructions="This script is used to build the provisioning tool (the provisioning
+package run by init.py) as a single executable zipapp.
+
+Usage:
+  $0 [options]
+
+Options:
+  --output FILE      Archive to write (default dist/provisioning.pyz)
+  --no-deps          Do not bundle the packages of requirements.txt, which
+                     must then be installed where the archive runs
+
+The dependencies are bundled by default, so the archive can be run with
+python3 -S, which skips the site module and the scan of site-packages:
+
+  python3 -S dist/provisioning.pyz provision
+  python3 -S dist/provisioning.pyz plan --reconcile
+"
+
+output="dist/provisioning.pyz"
+bundle_deps=true
+
+###############################################################################
+# Usage.
+
+usage()
+{
+    echo "$instructions"
+    exit 1
+}
+
+###############################################################################
+# Main.
+
+set -e
+
+while [[ $# -gt 0 ]]; do
+    case "$1" in
+        --output)
+            [[ -n "$2" ]] || usage
+            output="$2"
+            shift 2
+            ;;
+        --no-deps)
+            bundle_deps=false
+            shift
+            ;;
+        *)
+            usage
+            ;;
+    esac
+done
+
+cd "$(dirname "$0")"
+
+build_dir=$(mktemp -d)
+trap 'rm -rf "$build_dir"' EXIT
+
+cp -r provisioning "$build_dir/"
+find "$build_dir" -name __pycache__ -prune -exec rm -rf {} +
+
+if [[ "$bundle_deps" == true ]]; then
+    echo "Bundling the dependencies of requirements.txt..."
+    # Compiled extensions cannot be imported from a zip archive, so only pure
+    # Python distributions are installed
+    python3 -m pip install --quiet --no-compile --no-binary charset-normalizer --target "$build_dir" \
+        -r requirements.txt
+    rm -rf "$build_dir"/bin "$build_dir"/*.dist-info
+fi
+
+mkdir -p "$(dirname "$output")"
+python3 -m zipapp "$build_dir" --main 'provisioning.cli:main' --python '/usr/bin/env python3' --compress \
+    --output "$output"
+
+echo "Built $output ($(du -h "$output" | cut -f1))"
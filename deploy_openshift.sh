@@ -12,6 +12,8 @@
 bank_app_name="bank-app"
 dmv_app_name="dmv-app"
 config_map_name="oid4vc-config"
+config_secret_name="oid4vc-secrets"
+config_manifest="oid4vc-config.yaml"
 vc_repo_secret="isva-vc-repo-dal" # pragma: allowlist secret
 
 # DC Agency constants
@@ -162,8 +164,8 @@ switch_iag_to_oidc()
 # Function to check if .env file exists
 check_env_file()
 {
-    if [ ! -f .env ]; then
-        echo "Error: .env file not found. Please run init.py first."
+    if [ ! -f .env ] || [ ! -f $config_manifest ]; then
+        echo "Error: .env or $config_manifest file not found. Please run init.py first."
         exit 1
     fi
 }
@@ -558,8 +560,8 @@ deploy_web_apps()
     # Check if .env file was created successfully
     check_env_file
 
-    echo "Creating ConfigMap: $config_map_name..."
-    kubectl create configmap $config_map_name --from-env-file=.env
+    echo "Creating ConfigMap $config_map_name and Secret $config_secret_name..."
+    kubectl apply -f $config_manifest
 
     # Update the deployment YAML files with the registry information
     echo "Updating deployment YAML files with registry information..."
@@ -633,6 +635,8 @@ undeploy_web_apps()
     # Delete the ConfigMap
     echo "Deleting ConfigMap: $config_map_name..."
     kubectl delete configmap $config_map_name || echo "ConfigMap not found or could not be deleted."
+    echo "Deleting Secret: $config_secret_name..."
+    kubectl delete secret $config_secret_name || echo "Secret not found or could not be deleted."
 
     # Switch back to original project if needed
     if [[ -n "$project_name" && -n "$original_project_name" ]]; then
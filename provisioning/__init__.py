@@ -0,0 +1,9 @@
+"""
+Provisioning of the digital credentials demo: the issuer and verifier
+agents, their credential schema, definition and exchange template, trust
+registries and the configuration of the web applications.
+
+Run `python3 -m provisioning --help` for the commands. Importing the
+package itself is cheap, the modules are imported by the commands which
+need them.
+"""
@@ -0,0 +1,272 @@
+"""
+Access tokens and listing of the objects held by the agency.
+"""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .settings import OBJECT_COLLECTIONS, PAGE_SIZE
+
+def get_access_token(client, client_id, client_secret):
+    """
+    Retrieve an access token.
+    
+    Tokens are served from the client's token cache while they are still
+    valid, and a new client_credentials grant is only made when none is
+    cached or the cached one is about to expire.
+    
+    Args:
+        client: ProvisioningClient holding the OAuth token endpoint URL
+        client_id: OAuth client ID
+        client_secret: OAuth client secret
+        
+    Returns:
+        Access token string
+    """
+    def fetch():
+        data = {
+            'client_id': client_id,
+            'client_secret': client_secret,
+            'grant_type': 'client_credentials'
+        }
+        
+        headers = {
+            'Accept': 'application/json',
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+        
+        # A client_credentials grant has no side effects, so it can be retried
+        response = client.post(client.token_endpoint, headers=headers, data=data, idempotent=True)
+        
+        if response.status_code != 200:
+            print(f"Error getting access token: {response.text}")
+            return None, None
+            
+        token = response.json()
+        return token.get('access_token'), token.get('expires_in')
+    
+    return client.token_cache.get(client.token_endpoint, client_id, client_secret, fetch)
+
+class AgencyRequestError(Exception):
+    """Raised when an agency request made while listing a collection fails."""
+
+    def __init__(self, response):
+        super().__init__(f"{response.request.method} {response.url} returned {response.status_code}")
+        self.response = response
+
+def iter_collection(client, access_token, path, item_filter=None, include=None, page_size=PAGE_SIZE):
+    """
+    Stream the items of an agency collection, one page at a time.
+    
+    Only the current page is held in memory. Paging stops at the first page
+    shorter or longer than page_size, or once the number of items given by
+    the 'count' of the response has been received. The filter is applied
+    by the agency, callers which depend on it should still check the items
+    they receive.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token for authentication
+        path: Collection path relative to the agency URL
+        item_filter: Optional filter document, e.g. {'name': 'DMVIssuer'}
+        include: Optional list of the fields to return for each item
+        page_size: Number of items requested per page
+        
+    Yields:
+        Collection items as dictionaries
+        
+    Raises:
+        AgencyRequestError: If a page could not be retrieved
+    """
+    headers = {
+        'Accept': 'application/json',
+        'Authorization': f'Bearer {access_token}'
+    }
+    params = {'limit': page_size}
+    if item_filter:
+        params['filter'] = json.dumps(item_filter, separators=(',', ':'))
+    if include:
+        params['include'] = ','.join(include)
+
+    offset = 0
+    previous_first = None
+    while True:
+        params['offset'] = offset
+        response = client.get(f"{client.agency_url}{path}", headers=headers, params=params)
+        if response.status_code != 200:
+            raise AgencyRequestError(response)
+
+        page = response.json()
+        items = page.get('items', [])
+        # Stop if the agency ignored the offset and returned the same page again
+        if not items or (offset and items[0] == previous_first):
+            return
+        yield from items
+
+        # A short page is the last one, and a page longer than the limit
+        # means the agency does not page and returned the whole collection
+        if len(items) != page_size:
+            return
+        total = page.get('count')
+        if isinstance(total, int) and offset + len(items) >= total:
+            return
+        previous_first = items[0]
+        offset += len(items)
+
+def find_agent_id(client, access_token, agent_name):
+    """
+    Find the ID of the agent with the given name.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token for authentication
+        agent_name: Agent name
+        
+    Returns:
+        Agent ID, or None if there is no such agent
+    """
+    for item in iter_collection(client, access_token, '/v1.0/diagency/agents',
+                                item_filter={'name': agent_name}, include=['id', 'name']):
+        if item.get('name') == agent_name:
+            return item.get('id')
+    return None
+
+class AgentIndex:
+    """
+    Name to ID index of the agency's agents.
+
+    The agent list is streamed once, on the first lookup, so resolving many
+    agents in bulk modes costs a single pass over the collection rather than
+    one listing per agent.
+    """
+
+    path = '/v1.0/diagency/agents'
+    key_field = 'name'
+
+    def __init__(self, client, access_token, ids=None):
+        """
+        Args:
+            client: ProvisioningClient for the agency
+            access_token: Access token allowed to list the agents
+            ids: Optional already listed key to ID mapping
+        """
+        self.client = client
+        self.access_token = access_token
+        self._ids = ids
+        self._lock = threading.Lock()
+
+    def _load(self):
+        ids = {}
+        for item in iter_collection(self.client, self.access_token, self.path,
+                                    include=['id', self.key_field]):
+            ids.setdefault(item.get(self.key_field), item.get('id'))
+        return ids
+
+    def lookup(self, agent_name):
+        """
+        Return the ID of the named agent, or None if there is no such agent.
+        
+        Raises:
+            AgencyRequestError: If the agent list could not be retrieved
+        """
+        with self._lock:
+            if self._ids is None:
+                self._ids = self._load()
+            return self._ids.get(agent_name)
+
+    def add(self, agent_name, agent_id):
+        """Record an agent created after the index was loaded."""
+        with self._lock:
+            if self._ids is not None:
+                self._ids[agent_name] = agent_id
+
+class TrustRegistryIndex(AgentIndex):
+    """
+    Endpoint to ID index of the agency's remote trust registries, loaded
+    the same way as the AgentIndex.
+    """
+
+    path = OBJECT_COLLECTIONS['trust_registry']
+    key_field = 'endpoint'
+
+class AgencySnapshot:
+    """
+    Indexed in-memory copy of the agency objects this script manages.
+
+    The agents and every collection of OBJECT_COLLECTIONS are listed once,
+    concurrently, and only their IDs (and agent names) are kept. The
+    snapshot is used to plan a run without probing the agency object by
+    object, and can then stand in for the AgentIndex and the existence
+    checks of --reconcile during the apply, so nothing is fetched twice.
+    """
+
+    def __init__(self, client, access_token):
+        """
+        Args:
+            client: ProvisioningClient for the agency
+            access_token: Access token allowed to list the collections
+        """
+        self.client = client
+        self.access_token = access_token
+        self.agent_ids = {}
+        self.object_ids = {kind: set() for kind in OBJECT_COLLECTIONS}
+        self.registry_index = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        List every collection, one thread per collection.
+
+        Returns:
+            The snapshot
+
+        Raises:
+            AgencyRequestError: If a collection could not be listed
+        """
+        def list_ids(path, include):
+            return list(iter_collection(self.client, self.access_token, path, include=include))
+
+        with ThreadPoolExecutor(max_workers=len(OBJECT_COLLECTIONS) + 1) as executor:
+            agents = executor.submit(list_ids, '/v1.0/diagency/agents', ['id', 'name'])
+            objects = {kind: executor.submit(list_ids, path, ['id', 'endpoint'] if kind == 'trust_registry' else ['id'])
+                       for kind, path in OBJECT_COLLECTIONS.items()}
+
+            for item in agents.result():
+                self.agent_ids.setdefault(item.get('name'), item.get('id'))
+            for kind, future in objects.items():
+                items = future.result()
+                self.object_ids[kind] = {item.get('id') for item in items}
+                if kind == 'trust_registry':
+                    endpoints = {}
+                    for item in items:
+                        endpoints.setdefault(item.get('endpoint'), item.get('id'))
+                    self.registry_index = TrustRegistryIndex(self.client, self.access_token, endpoints)
+        return self
+
+    def lookup(self, agent_name):
+        """Return the ID of the named agent, or None if there is no such agent."""
+        with self._lock:
+            return self.agent_ids.get(agent_name)
+
+    def add(self, agent_name, agent_id):
+        """Record an agent created after the snapshot was taken."""
+        with self._lock:
+            self.agent_ids[agent_name] = agent_id
+
+    def exists(self, kind, object_id):
+        """Return whether an object of the given kind existed or was created."""
+        with self._lock:
+            return object_id in self.object_ids[kind]
+
+    def add_object(self, kind, object_id):
+        """Record an object created after the snapshot was taken."""
+        with self._lock:
+            self.object_ids[kind].add(object_id)
+
+    def counts(self):
+        """Number of objects of each kind in the snapshot."""
+        with self._lock:
+            counts = {'agent': len(self.agent_ids)}
+            counts.update({kind: len(ids) for kind, ids in self.object_ids.items()})
+            return counts
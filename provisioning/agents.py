@@ -0,0 +1,162 @@
+"""
+Creation of the issuer and verifier agents.
+"""
+
+import os
+
+from .agency import AgencyRequestError, find_agent_id
+from .images import encode_image_file
+from .settings import DEFAULT_EXCHANGE_TTL
+
+def create_agent(client, access_token, agent_id, agent_name, is_did_on_ledger, agent_type, agent_index=None):
+    """
+    Create an agent.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token for authentication
+        agent_id: Agent ID (can be empty string for new agents)
+        agent_name: Agent name
+        is_did_on_ledger: Boolean indicating if DID is on ledger
+        agent_type: Type of agent (issuer or verifier)
+        agent_index: Optional AgentIndex used to look up existing agents
+        
+    Returns:
+        Agent data as dictionary
+    """
+    headers = {
+        'Accept': 'application/json',
+        'Authorization': f'Bearer {access_token}'
+    }
+    
+    # Check if agent already exists
+    try:
+        if agent_index is not None:
+            identifier = agent_index.lookup(agent_name)
+        else:
+            identifier = find_agent_id(client, access_token, agent_name)
+    except AgencyRequestError as e:
+        print(f"Error getting agents: {e.response.text}")
+        return None
+    
+    if identifier:
+        # Agent exists, get its details
+        print(f"Reusing the agent {agent_name}: {identifier}")
+        response = client.get(
+            f"{client.agency_url}/v1.0/diagency/agents/{identifier}?includepass=true",
+            headers=headers
+        )
+        
+        if response.status_code != 200:
+            print(f"Error getting agent details: {response.text}")
+            return None
+            
+        return response.json()
+    else:
+        # Create new agent
+        print(f"Creating the agent: {agent_name}")
+        headers['Content-Type'] = 'application/json'
+        
+        agent_data = {
+            'id': agent_id,
+            'name': agent_name,
+            'is_did_on_ledger': is_did_on_ledger,
+            'agent_type': agent_type,
+            'did_method': 'did:web'
+        }
+        
+        if agent_type == "verifier":
+            # For verifier, add profile with logo and 'verifier' attribute
+            bank_host = os.environ.get('BANK_HOST', '')
+            image_url = f"{bank_host}/logo.png"
+            
+            # Check if URL is HTTP and encode image if needed (API doesn't accept URI's starting with http, only data: and https:)
+            logo_data = {}
+            if bank_host and bank_host.startswith('http://'):
+                print(f"Bank host uses HTTP, encoding logo image from file...")
+                # Use the local file path instead of URL
+                logo_file_path = "bank-app/public/logo.png"
+                encoded_image = encode_image_file(logo_file_path)
+                if encoded_image:
+                    logo_data = {'uri': encoded_image}
+                else:
+                    # Fallback to URL if encoding fails
+                    logo_data = {'uri': image_url}
+            else:
+                logo_data = {'uri': image_url}
+            
+            agent_data['profile'] = {
+                'verifier': {
+                    'root_of_trust': {
+                        'system_generated': {}
+                    },
+                    'metadata': {
+                        'response_types': ['vp_token'],
+                        'vp_formats_supported': {
+                            'mso_mdoc': {
+                                'issuerauth_alg_values': [-9, -7],
+                                'deviceauth_alg_values': [-9, -7]
+                            }
+                        }
+                    },
+                    'default_exchange_template': {
+                        'response_mode': 'direct_post',
+                        'client_id_prefix': 'redirect_uri',
+                        'request_mode': 'by_value_params',
+                        'default_authorization_url_scheme': 'openid4vp://',
+                        'ttl': DEFAULT_EXCHANGE_TTL
+                    }
+                },
+                'display': [
+                    {
+                        'locale': 'en-AU',
+                        'name': 'Smart Money Bank',
+                        'logo': logo_data
+                    }
+                ]
+            }
+        
+        elif agent_type == "issuer":
+            # For issuer, add profile with logo
+            dmv_host = os.environ.get('DMV_HOST', '')
+            image_url = f"{dmv_host}/logo.png"
+            
+            # Check if URL is HTTP and encode image if needed (API doesn't accept URI's starting with http, only data: and https:)
+            logo_data = {}
+            if dmv_host and dmv_host.startswith('http://'):
+                print(f"DMV host uses HTTP, encoding logo image from file...")
+                # Use the local file path instead of URL
+                logo_file_path = "dmv-app/public/logo.png"
+                encoded_image = encode_image_file(logo_file_path)
+                if encoded_image:
+                    logo_data = {'uri': encoded_image}
+                else:
+                    # Fallback to URL if encoding fails
+                    logo_data = {'uri': image_url}
+            else:
+                logo_data = {'uri': image_url}
+
+            agent_data['profile'] = {
+                'display': [
+                    {
+                        'locale': 'en-AU',
+                        'name': 'Department of Motor Vehicles',
+                        'logo': logo_data
+                    }
+                ]
+            }
+        
+        response = client.post(
+            f"{client.agency_url}/v1.0/diagency/agents?includepass=true",
+            headers=headers,
+            json=agent_data
+        )
+        
+        if response.status_code not in [200, 201]:
+            print(f"Error creating agent: {response.text}")
+            return None
+            
+        agent = response.json()
+        if agent_index is not None:
+            agent_index.add(agent_name, agent.get('id'))
+        return agent
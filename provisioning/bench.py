@@ -0,0 +1,258 @@
+"""
+Benchmark the provisioning against the local mock agency.
+
+Each scenario is run several times and its median wall time, request count
+and peak Python memory are compared against a stored baseline. The script
+exits with a non-zero status when a scenario regresses beyond the allowed
+tolerance, so it can be used as a CI gate:
+
+    python3 -m provisioning bench                      # compare against bench_baseline.json
+    python3 -m provisioning bench --update-baseline    # record a new baseline
+    python3 -m provisioning bench --transport all      # compare the HTTP transports
+
+Results of the default requests transport are stored under the scenario
+name, those of another transport under scenario/transport. The mock agency
+only speaks HTTP/1.1, so the http2 transport falls back to it there and the
+comparison measures the overhead of each client rather than multiplexing.
+"""
+
+import contextlib
+import io
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import requests
+
+from .files import write_file_atomic
+from .http import POOL_MAXSIZE, ProvisioningClient
+from .settings import BENCH_SCENARIOS, HTTP_TRANSPORTS, MAX_STEP_WORKERS
+from .steps import ProvisioningError, build_provisioning_steps, run_provisioning_steps
+from .tenants import provision_tenants
+
+class MockAgencyProcess:
+    """
+    Run the mock agency in a separate process so that it does not share
+    the interpreter, or its memory, with the code being measured.
+    """
+
+    def __init__(self, latency, jitter, error_rate):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.agency_url = f"{self.base_url}/diagency"
+        self.token_endpoint = f"{self.base_url}/oauth2/token"
+        self._args = [
+            sys.executable, '-m', __package__, 'mock',
+            '--port', str(self.port),
+            '--latency', str(latency),
+            '--jitter', str(jitter),
+            '--error-rate', str(error_rate)
+        ]
+        self._process = None
+
+    def __enter__(self):
+        # The directory holding the package, or the zipapp it is run from
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self._process = subprocess.Popen(self._args, stdout=subprocess.DEVNULL, env=env)
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                requests.get(f"{self.base_url}/__stats", timeout=1)
+                return self
+            except requests.ConnectionError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def __exit__(self, *exc_info):
+        self._process.terminate()
+        self._process.wait()
+
+    def reset(self):
+        requests.post(f"{self.base_url}/__reset", timeout=5)
+
+    def stats(self):
+        return requests.get(f"{self.base_url}/__stats", timeout=5).json()
+
+def open_client(agency, transport, pool_maxsize=POOL_MAXSIZE, tracer=None):
+    """
+    Create a client of the mock agency.
+
+    Raises:
+        RuntimeError: If the transport is not available
+    """
+    client = ProvisioningClient(agency.agency_url, agency.token_endpoint, pool_maxsize, tracer=tracer,
+                                transport=transport)
+    if client.transport.name != transport:
+        client.close()
+        raise RuntimeError(f"the {transport} transport is not available, install httpx[http2] to use it")
+    return client
+
+def run_single(agency, args, transport, tracer=None):
+    """Provision one issuer/verifier pair, as the provision command does by default."""
+    with open_client(agency, transport, tracer=tracer) as client:
+        steps = build_provisioning_steps(client, 'admin', 'secret', agency.agency_url)
+        run_provisioning_steps(steps)
+
+def run_bulk(agency, args, transport, tracer=None):
+    """Provision --tenants issuer/verifier pairs, as provision --manifest does."""
+    pool_maxsize = max(POOL_MAXSIZE, args.concurrency * MAX_STEP_WORKERS)
+    with open_client(agency, transport, pool_maxsize, tracer) as client:
+        tenants = ({'name': f"bench-{i}"} for i in range(args.tenants))
+        with open(os.devnull, 'w') as output:
+            succeeded, failed = provision_tenants(client, 'admin', 'secret', tenants, agency.agency_url,
+                                                  output, args.concurrency)
+    if failed:
+        raise RuntimeError(f"{failed} tenants failed to provision")
+
+SCENARIO_RUNNERS = {
+    'single': run_single,
+    'bulk': run_bulk
+}
+
+def measure(agency, scenario, args, transport):
+    """
+    Measure a scenario over an HTTP transport.
+
+    The wall time is the median of --runs runs after a warm-up run. Peak
+    memory is measured by a separate run under tracemalloc, so that its
+    overhead does not skew the timings.
+
+    Returns:
+        Dictionary of metrics
+    """
+    runner = SCENARIO_RUNNERS[scenario]
+    wall_times = []
+    requests_made = None
+
+    # Provisioning output is not interesting here
+    with contextlib.redirect_stdout(io.StringIO()):
+        agency.reset()
+        runner(agency, args, transport)
+
+        for _ in range(args.runs):
+            agency.reset()
+            start = time.perf_counter()
+            runner(agency, args, transport)
+            wall_times.append(time.perf_counter() - start)
+            requests_made = agency.stats()['total']
+
+        agency.reset()
+        tracemalloc.start()
+        try:
+            runner(agency, args, transport)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'wall_time': round(statistics.median(wall_times), 4),
+        'wall_time_min': round(min(wall_times), 4),
+        'requests': requests_made,
+        'peak_memory_kb': round(peak_memory / 1024, 1)
+    }
+
+def result_key(scenario, transport):
+    """Key of the results of a scenario, the scenario name for the default transport."""
+    return scenario if transport == 'requests' else f"{scenario}/{transport}"
+
+def print_transport_comparison(results, scenarios, transports):
+    """Print the metrics of each transport relative to the requests transport."""
+    for scenario in scenarios:
+        reference = results[result_key(scenario, 'requests')]
+        for transport in transports:
+            if transport == 'requests':
+                continue
+            metrics = results[result_key(scenario, transport)]
+            ratios = "  ".join(f"{metric} x{metrics[metric] / reference[metric]:.2f}"
+                               for metric in ('wall_time', 'peak_memory_kb') if reference[metric])
+            print(f"{scenario:<13} {transport} vs requests (over HTTP/1.1, client overhead only): {ratios}")
+
+def compare(results, baseline, time_tolerance, memory_tolerance):
+    """
+    Compare results against a baseline.
+
+    Returns:
+        List of regression messages, empty if there are none
+    """
+    regressions = []
+    for scenario, metrics in results.items():
+        expected = baseline.get('scenarios', {}).get(scenario)
+        if not expected:
+            continue
+        checks = [
+            ('wall_time', time_tolerance),
+            ('peak_memory_kb', memory_tolerance),
+            ('requests', 0)
+        ]
+        for metric, tolerance in checks:
+            limit = expected[metric] * (1 + tolerance)
+            if metrics[metric] > limit:
+                regressions.append(f"{scenario}: {metric} {metrics[metric]} exceeds baseline "
+                                   f"{expected[metric]} (+{tolerance:.0%})")
+    return regressions
+
+def settings(args):
+    """Benchmark settings that must match for results to be comparable."""
+    return {
+        'tenants': args.tenants,
+        'concurrency': args.concurrency,
+        'latency': args.latency,
+        'jitter': args.jitter,
+        'error_rate': args.error_rate
+    }
+
+def main(args):
+    """Run the bench command."""
+    scenarios = BENCH_SCENARIOS if args.scenario == 'all' else [args.scenario]
+    transports = HTTP_TRANSPORTS if args.transport == 'all' else [args.transport]
+
+    results = {}
+    with MockAgencyProcess(args.latency, args.jitter, args.error_rate) as agency:
+        for scenario in scenarios:
+            for transport in transports:
+                key = result_key(scenario, transport)
+                try:
+                    results[key] = measure(agency, scenario, args, transport)
+                except (RuntimeError, ProvisioningError, requests.RequestException) as e:
+                    # With --error-rate, a step can exhaust its retries
+                    print(f"Error> {key}: a run failed: {e}")
+                    sys.exit(1)
+                metrics = results[key]
+                print(f"{key:<13} wall {metrics['wall_time']:.3f}s (min {metrics['wall_time_min']:.3f}s)  "
+                      f"requests {metrics['requests']}  peak memory {metrics['peak_memory_kb']:.0f} KiB")
+    if 'requests' in transports and len(transports) > 1:
+        print_transport_comparison(results, scenarios, transports)
+
+    report = {'settings': settings(args), 'scenarios': results}
+    if args.output:
+        write_file_atomic(args.output, json.dumps(report, indent=2))
+
+    if args.update_baseline:
+        write_file_atomic(args.baseline, json.dumps(report, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline found at {args.baseline}, run with --update-baseline to create one.")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('settings') != settings(args):
+        print(f"Warning: benchmark settings differ from the baseline {baseline.get('settings')}, "
+              "results may not be comparable.")
+
+    regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+    for regression in regressions:
+        print(f"Regression> {regression}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against the baseline.")
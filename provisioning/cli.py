@@ -0,0 +1,315 @@
+"""
+Command line entry point.
+
+The module running a command, and the HTTP stack it depends on, is only
+imported once the command line has been parsed, so that --help and the
+commands which do not contact the agency start quickly.
+"""
+
+import argparse
+import importlib
+import sys
+
+from .settings import (
+    BENCH_SCENARIOS, CONFIG_FILES, CONFIG_FORMATS, DEFAULT_BASELINE_FILE, DEFAULT_DRIFT_THRESHOLD,
+    DEFAULT_EXCHANGE_TTL, DEFAULT_HOLDER_COUNT, DEFAULT_HOLDER_SHARD_SIZE, DEFAULT_HOLDERS_DIR, DEFAULT_JOURNAL_FILE,
+    DEFAULT_LOAD_DURATION, DEFAULT_LOAD_USERS, DEFAULT_MAX_IN_FLIGHT, DEFAULT_MEMORY_TOLERANCE, DEFAULT_MOCK_PORT,
+    DEFAULT_POPULATION, DEFAULT_PORTRAIT_MAX_BYTES, DEFAULT_SAMPLE_INTERVAL, DEFAULT_SNAPSHOT_DIR,
+    DEFAULT_SNAPSHOT_SHARD_SIZE, DEFAULT_STATE_FILE, DEFAULT_TARGETS_REPORT, DEFAULT_TENANT_CONCURRENCY,
+    DEFAULT_TIME_TOLERANCE, DEFAULT_TIMESERIES_FILE, DEFAULT_TRACE_FILE, HTTP_TRANSPORTS, INSTRUCTIONS,
+    LOAD_SCENARIOS, PAGE_SIZE
+)
+
+# Module running each command, relative to this package
+COMMANDS = {
+    'provision': 'provision',
+    'plan': 'provision',
+    'config': 'config',
+    'bench': 'bench',
+    'load': 'loadgen',
+    'teardown': 'teardown',
+    'holders': 'holders',
+    'export': 'snapshot',
+    'import': 'snapshot',
+    'mock': 'mock_agency'
+}
+
+# Command run when none is given, as init.py has always provisioned
+DEFAULT_COMMAND = 'provision'
+
+DESCRIPTION = """Provision the issuer and verifier of the digital credentials demo, and
+write the configuration of the web applications.
+
+provision is run when no command is given."""
+
+def add_config_format_arguments(parser):
+    parser.add_argument('--config-formats', default=','.join(CONFIG_FORMATS),
+                        help=f"comma separated configuration files to write, of {', '.join(CONFIG_FORMATS)} "
+                             "(default all)")
+    parser.add_argument('--config-dir', default='.', help="directory receiving the configuration files")
+
+def add_transport_argument(parser):
+    parser.add_argument('--transport', choices=HTTP_TRANSPORTS,
+                        help="HTTP transport of the agency calls (default HTTP_TRANSPORT or requests)")
+
+def parse_rate_limit(value):
+    """Parse a --rate-limit value, '[METHOD ]PATH=RATE' or '*=RATE'."""
+    endpoint, separator, rate = value.rpartition('=')
+    try:
+        rate = float(rate)
+    except ValueError:
+        rate = 0
+    if not separator or not endpoint.strip() or rate <= 0:
+        raise argparse.ArgumentTypeError(f"expected [METHOD ]PATH=RATE or *=RATE, got '{value}'")
+    return endpoint.strip(), rate
+
+def add_limit_arguments(parser):
+    parser.add_argument('--adaptive', action='store_true',
+                        help="adapt the number of agency requests in flight, up to the bound set by --concurrency, "
+                             "growing it while latency stays flat and backing off on 429 and 5xx responses")
+    parser.add_argument('--rate-limit', action='append', type=parse_rate_limit, metavar='ENDPOINT=RATE',
+                        help="maximum requests per second to an endpoint, e.g. 'POST /v1.0/diagency/agents=20', "
+                             "'/v2.0/diagency/credential_schemas=50' or '*=100' for each endpoint (repeatable)")
+
+def add_provision_arguments(parser, plan=False):
+    """Add the arguments of the provision command, or of the plan command."""
+    parser.add_argument('--manifest',
+                        help="provision every tenant in a YAML or JSONL manifest instead of writing .env")
+    parser.add_argument('--targets',
+                        help="provision the same objects on every agency listed in this YAML or JSONL file (name, "
+                             "agency_url, token_endpoint) at the same time, writing the configuration of each "
+                             "to --config-dir/<name>")
+    parser.add_argument('--report', default=DEFAULT_TARGETS_REPORT,
+                        help="combined timing and status report written by --targets")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_TENANT_CONCURRENCY,
+                        help="maximum number of tenants (or trust anchors, or targets) provisioned at the same time")
+    parser.add_argument('--trust-anchors',
+                        help="register the issuer VICALs listed in this file (one URL or JSON object per line) "
+                             "as trust registries instead of writing .env")
+    parser.add_argument('--output', default='tenants.jsonl',
+                        help="file receiving one result record per tenant ('-' for stdout)")
+    parser.add_argument('--reconcile', action='store_true',
+                        help="skip objects recorded in the state file which exist and are unchanged")
+    parser.add_argument('--state-file', default=DEFAULT_STATE_FILE,
+                        help="state file used by --reconcile")
+    parser.add_argument('--resume', action='store_true',
+                        help="replay the step journal of an interrupted run and only run the steps (or, with "
+                             "--manifest, the tenant steps) which did not complete; implies --journal")
+    parser.add_argument('--journal', nargs='?', const=DEFAULT_JOURNAL_FILE,
+                        help=f"record the completed steps, agent secrets included, in a write-ahead journal "
+                             f"(default file {DEFAULT_JOURNAL_FILE}) so that a failed run can be resumed; "
+                             f"started again unless --resume is given")
+    if plan:
+        parser.set_defaults(plan=True)
+    else:
+        parser.add_argument('--plan', action='store_true',
+                            help="print what would be created, updated or kept, from one snapshot of the agency, "
+                                 "without changing anything")
+    parser.add_argument('--apply', action='store_true',
+                        help="apply the plan afterwards using the same snapshot" if plan else
+                             "with --plan, apply the plan afterwards using the same snapshot")
+    add_config_format_arguments(parser)
+    parser.add_argument('--trace', nargs='?', const=DEFAULT_TRACE_FILE,
+                        help=f"write a JSON trace of every step and request (default {DEFAULT_TRACE_FILE}) "
+                             "and print a latency summary")
+    add_transport_argument(parser)
+    add_limit_arguments(parser)
+
+def add_config_arguments(parser):
+    parser.add_argument('--from', dest='source', default=CONFIG_FILES['json'],
+                        help="JSON configuration written by the provision command")
+    add_config_format_arguments(parser)
+
+def add_bench_arguments(parser):
+    parser.add_argument('--scenario', choices=BENCH_SCENARIOS + ['all'], default='all')
+    parser.add_argument('--runs', type=int, default=3, help="measured runs per scenario")
+    parser.add_argument('--tenants', type=int, default=50, help="tenants provisioned by the bulk scenario")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_TENANT_CONCURRENCY,
+                        help="tenants provisioned at the same time by the bulk scenario")
+    parser.add_argument('--transport', choices=HTTP_TRANSPORTS + ['all'], default='requests',
+                        help="HTTP transport of the provisioning client, all compares their overhead (the mock only "
+                             "speaks HTTP/1.1, so HTTP/2 multiplexing is not measured)")
+    parser.add_argument('--latency', type=float, default=20, help="mock agency latency (ms)")
+    parser.add_argument('--jitter', type=float, default=5, help="mock agency latency jitter (ms)")
+    parser.add_argument('--error-rate', type=float, default=0, help="fraction of mock requests failing with 503")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_FILE)
+    parser.add_argument('--update-baseline', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--time-tolerance', type=float, default=DEFAULT_TIME_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=DEFAULT_MEMORY_TOLERANCE)
+    parser.add_argument('--output', help="also write the results to this JSON file")
+
+def add_load_arguments(parser):
+    parser.add_argument('--config', default=CONFIG_FILES['json'],
+                        help="JSON configuration written by the provision command")
+    parser.add_argument('--scenario', choices=LOAD_SCENARIOS, default='mixed')
+    parser.add_argument('--offer-ratio', type=float, default=0.5, help="fraction of offers in the mixed scenario")
+    parser.add_argument('--poll', action='store_true', help="read every created offer or exchange back")
+    parser.add_argument('--duration', type=float, default=DEFAULT_LOAD_DURATION, help="length of the run (s)")
+    parser.add_argument('--users', type=int, default=DEFAULT_LOAD_USERS, help="closed loop virtual users")
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help="closed loop mean pause between a user's requests (s)")
+    parser.add_argument('--rate', type=float, help="open loop target requests per second, instead of --users")
+    parser.add_argument('--poisson', action='store_true', help="open loop Poisson arrivals instead of even spacing")
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help="open loop limit of concurrent requests")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    add_transport_argument(parser)
+    soak = parser.add_argument_group('soak mode')
+    soak.add_argument('--soak', action='store_true', help="keep a population of open exchanges and sample "
+                      "latencies over time, run by --users workers")
+    soak.add_argument('--population', type=int, default=DEFAULT_POPULATION, help="open exchanges to maintain")
+    soak.add_argument('--exchange-ttl', type=float, default=DEFAULT_EXCHANGE_TTL,
+                      help="exchange lifetime of the verifier profile (s)")
+    soak.add_argument('--sample-interval', type=float, default=DEFAULT_SAMPLE_INTERVAL,
+                      help="time between samples (s)")
+    soak.add_argument('--timeseries', default=DEFAULT_TIMESERIES_FILE, help="JSON Lines file the samples are "
+                      "appended to")
+    soak.add_argument('--drift-threshold', type=float, default=DEFAULT_DRIFT_THRESHOLD,
+                      help="growth between the start and the end of the run reported as drift")
+
+def parse_duration(value):
+    """Parse a duration such as 90s, 30m, 12h or 7d into seconds."""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    number, unit = (value[:-1], value[-1]) if value and value[-1] in units else (value, 's')
+    try:
+        seconds = float(number) * units[unit]
+    except ValueError:
+        seconds = -1
+    if seconds < 0:
+        raise argparse.ArgumentTypeError(f"expected a duration such as 90s, 30m, 12h or 7d, got '{value}'")
+    return seconds
+
+def add_teardown_arguments(parser):
+    parser.add_argument('--state-file', default=DEFAULT_STATE_FILE,
+                        help="state file recording the objects to delete, or with a scan the objects to keep")
+    parser.add_argument('--scan', action='store_true',
+                        help="delete the objects created by this tool found in the agency, instead of those of "
+                             "the state file")
+    parser.add_argument('--name-pattern', action='append', metavar='PATTERN',
+                        help="with a scan, select the agents, schemas, templates and registries whose name "
+                             "matches this pattern, e.g. 'DMVIssuer-load-*' (repeatable, default the names "
+                             "given by this tool to every object but agents, implies --scan)")
+    parser.add_argument('--older-than', type=parse_duration, metavar='DURATION',
+                        help="with a scan, only select objects created before this long ago, e.g. 7d "
+                             "(implies --scan)")
+    parser.add_argument('--config', default=CONFIG_FILES['json'],
+                        help="JSON configuration written by the provision command, whose objects a scan keeps")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_TENANT_CONCURRENCY,
+                        help="maximum number of objects deleted at the same time")
+    parser.add_argument('--list', action='store_true', help="print every selected object")
+    parser.add_argument('--yes', action='store_true',
+                        help="delete the objects, otherwise they are only counted (a scan also requires "
+                             "--name-pattern)")
+    add_transport_argument(parser)
+    add_limit_arguments(parser)
+
+def add_holders_arguments(parser):
+    parser.add_argument('--count', type=int, default=DEFAULT_HOLDER_COUNT, help="number of holders to generate")
+    parser.add_argument('--schema', help="credential schema the holders match (default CREDENTIAL_SCHEMA or mdl)")
+    parser.add_argument('--output-dir', default=DEFAULT_HOLDERS_DIR, help="directory receiving the JSONL shards")
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_HOLDER_SHARD_SIZE, help="holders per shard")
+    parser.add_argument('--processes', type=int, help="worker processes (default the number of CPUs)")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the generated data")
+    parser.add_argument('--portraits', help="directory of PNG or JPEG portraits to pick from, instead of drawing "
+                                            "one per holder (requires Pillow)")
+    parser.add_argument('--portrait-max-bytes', type=int, default=DEFAULT_PORTRAIT_MAX_BYTES,
+                        help="size budget of each portrait before encoding")
+    parser.add_argument('--no-portraits', action='store_true', help="leave the portrait out")
+
+def add_export_arguments(parser):
+    parser.add_argument('--output-dir', default=DEFAULT_SNAPSHOT_DIR,
+                        help="directory receiving the compressed JSONL shards and their manifest")
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SNAPSHOT_SHARD_SIZE, help="objects per shard")
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE, help="objects requested per page")
+    add_transport_argument(parser)
+
+def add_import_arguments(parser):
+    parser.add_argument('--input-dir', default=DEFAULT_SNAPSHOT_DIR, help="snapshot written by the export command")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_TENANT_CONCURRENCY,
+                        help="maximum number of objects created at the same time")
+    add_transport_argument(parser)
+    add_limit_arguments(parser)
+
+def add_mock_arguments(parser):
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_MOCK_PORT)
+    parser.add_argument('--latency', type=float, default=0, help="delay added to each response (ms)")
+    parser.add_argument('--jitter', type=float, default=0, help="maximum random variation of the delay (ms)")
+    parser.add_argument('--error-rate', type=float, default=0, help="fraction of requests answered with a 503")
+    parser.add_argument('--cert', help="certificate file, serves HTTPS when given")
+    parser.add_argument('--key', help="private key of the certificate")
+    parser.add_argument('--fetch-delay', type=float, default=0,
+                        help="complete registry fetches asynchronously after this delay (ms)")
+    parser.add_argument('--exchange-ttl', type=float, default=DEFAULT_EXCHANGE_TTL,
+                        help="lifetime of presentation exchanges (s)")
+    parser.add_argument('--capacity', type=int, default=0,
+                        help="answer requests beyond this many in flight with a 429 (default unlimited)")
+    parser.add_argument('--retry-after', type=float, default=1, help="Retry-After of those 429 responses (s)")
+
+def build_parser(prog=None):
+    """
+    Build the command line parser.
+
+    Returns:
+        Tuple of the parser and a dictionary of the command parsers
+    """
+    parser = argparse.ArgumentParser(prog=prog, description=DESCRIPTION,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    commands = {}
+
+    def add_command(name, help, add_arguments, description=None):
+        commands[name] = subparsers.add_parser(name, help=help, description=description or help,
+                                               formatter_class=argparse.RawDescriptionHelpFormatter)
+        add_arguments(commands[name])
+
+    add_command('provision', "create the agents and objects and write the application configuration",
+                add_provision_arguments, INSTRUCTIONS)
+    add_command('plan', "show what provision would create, update or keep, without changing anything",
+                lambda command: add_provision_arguments(command, plan=True))
+    add_command('config', "write the application configuration again from the JSON configuration",
+                add_config_arguments)
+    add_command('bench', "benchmark provisioning against the mock agency", add_bench_arguments)
+    add_command('load', "generate credential offer and presentation exchange load", add_load_arguments)
+    add_command('teardown', "delete the objects recorded in the state file, or the objects found by a scan",
+                add_teardown_arguments)
+    add_command('holders', "generate synthetic mDL holder data for issuance tests", add_holders_arguments)
+    add_command('export', "export the agents and objects of the agency to compressed JSONL shards",
+                add_export_arguments)
+    add_command('import', "create the agents and objects of an exported snapshot in the agency",
+                add_import_arguments)
+    add_command('mock', "run the local mock agency", add_mock_arguments)
+    return parser, commands
+
+def parse_args(argv=None, prog=None):
+    """Parse the command line arguments."""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ('-h', '--help')):
+        argv.insert(0, DEFAULT_COMMAND)
+
+    parser, commands = build_parser(prog)
+    args = parser.parse_args(argv)
+    command = commands[args.command]
+    if args.command == 'provision' and args.apply and not args.plan:
+        command.error("--apply requires --plan")
+    if args.command in ('provision', 'plan') and args.targets and (args.manifest or args.trust_anchors or args.plan):
+        command.error("--targets cannot be combined with --manifest, --trust-anchors or a plan")
+    if args.command in ('provision', 'plan', 'config'):
+        unknown = set(args.config_formats.split(',')) - set(CONFIG_FORMATS)
+        if unknown:
+            command.error(f"unknown configuration format(s): {', '.join(sorted(unknown))}")
+    if args.command == 'holders' and (args.count < 1 or args.shard_size < 1):
+        command.error("--count and --shard-size must be positive")
+    if args.command == 'export' and (args.shard_size < 1 or args.page_size < 1):
+        command.error("--shard-size and --page-size must be positive")
+    if args.command in ('import', 'teardown') and args.concurrency < 1:
+        command.error("--concurrency must be positive")
+    if args.command == 'load' and args.soak and args.rate:
+        command.error("--soak runs a closed loop and cannot be combined with --rate")
+    return args
+
+def main(argv=None, prog=None):
+    """Parse the command line and run the command."""
+    args = parse_args(argv, prog)
+    module = importlib.import_module(f".{COMMANDS[args.command]}", __package__)
+    module.main(args)
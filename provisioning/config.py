@@ -0,0 +1,245 @@
+"""
+Configuration of the web applications, rendered as a .env file, a
+Kubernetes manifest and JSON.
+"""
+
+import json
+import os
+import sys
+
+from .files import write_file_if_changed
+from .settings import (
+    BANK_AGENT_NAME, CONFIG_FILES, CONFIG_FORMATS, CONFIG_MAP_NAME, CONFIG_SECRET_NAME, DMV_AGENT_NAME, SECRET_MASK
+)
+
+def build_app_config(agency_url, oidc_token_endpoint, node_env, dmv_agent_id, dmv_agent_password, dmv_agent_did,
+                     dmv_app_url, bank_agent_id, bank_agent_password, bank_app_url, client_id, client_secret,
+                     w3_root_url, dmv_redirect_url, schema_id, credential_definition_id, template_id):
+    """
+    Build the configuration of the web applications.
+    
+    Returns:
+        List of (section title, entries) where entries are (key, value,
+        is_secret) tuples, in the order they are written
+    """
+    dmv_logout_redirect_url = f"{dmv_app_url}/logout-callback"
+    return [
+        ("Account and token endpoints", [
+            ('ACCOUNT_URL', agency_url, False),
+            ('REACT_APP_ACCOUNT_URL', agency_url, False),
+            ('REACT_APP_TOKEN_ENDPOINT', oidc_token_endpoint, False),
+            ('NODE_ENV', node_env, False),
+        ]),
+        ("DMV agent configuration", [
+            ('DMV_AGENT_NAME', DMV_AGENT_NAME, False),
+            ('DMV_AGENT_ID', dmv_agent_id, False),
+            ('REACT_APP_DMV_AGENT_ID', dmv_agent_id, False),
+            ('DMV_AGENT_PASSWORD', dmv_agent_password, True),
+            ('REACT_APP_DMV_AGENT_PASSWORD', dmv_agent_password, True),
+            ('DMV_URL', dmv_app_url, False),
+            ('DMV_AGENT_DID', dmv_agent_did, False),
+        ]),
+        ("Bank agent configuration", [
+            ('BANK_AGENT_NAME', BANK_AGENT_NAME, False),
+            ('BANK_AGENT_ID', bank_agent_id, False),
+            ('REACT_APP_BANK_AGENT_ID', bank_agent_id, False),
+            ('BANK_AGENT_PASSWORD', bank_agent_password, True),
+            ('REACT_APP_BANK_AGENT_PASSWORD', bank_agent_password, True),
+            ('BANK_URL', bank_app_url, False),
+        ]),
+        ("Authentication configuration", [
+            ('REACT_APP_CLIENT_ID', client_id, False),
+            ('REACT_APP_CLIENT_SECRET', client_secret, True),
+            ('W3_ROOT', w3_root_url, False),
+            ('REACT_APP_W3_ROOT', w3_root_url, False),
+            ('DMV_REDIRECT_URL', dmv_redirect_url, False),
+            ('REACT_APP_DMV_REDIRECT_URL', dmv_redirect_url, False),
+            ('DMV_LOGOUT_REDIRECT_URL', dmv_logout_redirect_url, False),
+            ('REACT_APP_DMV_LOGOUT_REDIRECT_URL', dmv_logout_redirect_url, False),
+        ]),
+        ("Credential configuration", [
+            ('CREDENTIAL_SCHEMA_ID', schema_id, False),
+            ('REACT_APP_CREDENTIAL_SCHEMA_ID', schema_id, False),
+            ('CREDENTIAL_DEFINITION_ID', credential_definition_id, False),
+            ('REACT_APP_CREDENTIAL_DEFINITION_ID', credential_definition_id, False),
+            ('EXCHANGE_TEMPLATE_ID', template_id, False),
+            ('REACT_APP_EXCHANGE_TEMPLATE_ID', template_id, False),
+        ]),
+    ]
+
+def read_app_settings():
+    """
+    Read the application URLs and credentials from the environment.
+    
+    Returns:
+        Tuple of (settings dictionary, list of the required environment
+        variables which are missing)
+    """
+    app_settings = {
+        'dmv_app_url': os.environ.get('DMV_HOST'),
+        'bank_app_url': os.environ.get('BANK_HOST'),
+        'w3_root_url': os.environ.get('IDP_URL'),
+        'client_id': os.environ.get('IDP_CLIENT_ID'),
+        'client_secret': os.environ.get('IDP_CLIENT_SECRET'),
+        'node_env': 'production' if os.environ.get('IS_APP_PROD_DEPLOY') == 'true' else 'development'
+    }
+    
+    # Check for required environment variables
+    required = [
+        ('DMV_HOST', 'dmv_app_url'),
+        ('BANK_HOST', 'bank_app_url'),
+        ('IDP_URL', 'w3_root_url'),
+        ('IDP_CLIENT_ID', 'client_id'),
+        ('IDP_CLIENT_SECRET', 'client_secret')
+    ]
+    missing_vars = [variable for variable, key in required if not app_settings[key]]
+    return app_settings, missing_vars
+
+def build_provisioned_config(results, agency_url, oidc_token_endpoint, app_settings):
+    """
+    Build the configuration of the web applications from the results of
+    the provisioning steps.
+    
+    Args:
+        results: Step results returned by run_provisioning_steps()
+        agency_url: Agency URL the objects were provisioned on
+        oidc_token_endpoint: OAuth token endpoint URL of the agency
+        app_settings: Settings returned by read_app_settings()
+        
+    Returns:
+        Configuration, see build_app_config()
+    """
+    # dmv_agent_iaca_root_cert = dmv_agent.get('profile', {}).get('issuer', {}).get('root_of_trust', {}).get('x5c', {}).get('certificate')
+    
+    # If the account URL and token endpoint provided were for localhost, these need to be remapped to internal 
+    # docker container network names within the .env file
+    if agency_url == "https://localhost:8443/diagency":
+        agency_url = "https://iviadcgw:8443/diagency"
+    if oidc_token_endpoint == "https://localhost:8443/oauth2/token":
+        oidc_token_endpoint = "https://iviadcgw:8443/oauth2/token"
+    
+    return build_app_config(
+        agency_url=agency_url,
+        oidc_token_endpoint=oidc_token_endpoint,
+        node_env=app_settings['node_env'],
+        dmv_agent_id=results['dmv_agent'].get('id'),
+        dmv_agent_password=results['dmv_agent'].get('client_secret'),
+        dmv_agent_did=results['dmv_agent'].get('did'),
+        dmv_app_url=app_settings['dmv_app_url'],
+        bank_agent_id=results['bank_agent'].get('id'),
+        bank_agent_password=results['bank_agent'].get('client_secret'),
+        bank_app_url=app_settings['bank_app_url'],
+        client_id=app_settings['client_id'],
+        client_secret=app_settings['client_secret'],
+        w3_root_url=app_settings['w3_root_url'],
+        # Set redirect URL based on DMV app URL
+        dmv_redirect_url=f"{app_settings['dmv_app_url']}/logincallback",
+        schema_id=results['credential_schema'],
+        credential_definition_id=results['credential_definition'],
+        template_id=results['exchange_template']
+    )
+
+def _config_entries(config):
+    for _, entries in config:
+        yield from entries
+
+def render_env(config, mask_secrets=False):
+    """Render the configuration as a .env file, optionally masking secrets."""
+    sections = []
+    for title, entries in config:
+        lines = [f"# {title}"]
+        for key, value, secret in entries:
+            lines.append(f"{key}={SECRET_MASK if secret and mask_secrets and value else value}")
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
+
+def render_kubernetes_manifest(config, config_map_name=CONFIG_MAP_NAME, secret_name=CONFIG_SECRET_NAME):
+    """
+    Render the configuration as a ConfigMap holding the plain values and a
+    Secret holding the secrets, ready for kubectl apply.
+    """
+    def data(secret):
+        # JSON strings are valid YAML scalars, and keep any value quoted
+        return "".join(f"  {key}: {json.dumps('' if value is None else str(value))}\n"
+                       for key, value, is_secret in _config_entries(config) if is_secret == secret)
+
+    return (f"apiVersion: v1\nkind: ConfigMap\nmetadata:\n  name: {config_map_name}\ndata:\n{data(False)}"
+            f"---\napiVersion: v1\nkind: Secret\nmetadata:\n  name: {secret_name}\ntype: Opaque\n"
+            f"stringData:\n{data(True)}")
+
+def render_config_json(config):
+    """Render the configuration as a flat JSON object."""
+    return json.dumps({key: value for key, value, _ in _config_entries(config)}, indent=2) + "\n"
+
+CONFIG_RENDERERS = {
+    'env': render_env,
+    'kubernetes': render_kubernetes_manifest,
+    'json': render_config_json
+}
+
+def emit_config(config, formats=CONFIG_FORMATS, directory='.'):
+    """
+    Write the configuration in each of the requested formats.
+    
+    Every file is rendered from the same model and written atomically, and
+    files whose contents would not change are not touched, so file watchers
+    and image rebuilds are not triggered for nothing. The files hold
+    secrets and are only readable by their owner.
+    
+    Args:
+        config: Configuration returned by build_app_config()
+        formats: Keys of CONFIG_FILES
+        directory: Directory receiving the files
+        
+    Returns:
+        List of (path, changed) tuples
+    """
+    written = []
+    for config_format in formats:
+        path = os.path.normpath(os.path.join(directory, CONFIG_FILES[config_format]))
+        written.append((path, write_file_if_changed(path, CONFIG_RENDERERS[config_format](config), 0o600)))
+    return written
+
+def load_app_config(path):
+    """
+    Rebuild the configuration from the JSON configuration written by the
+    provision command, so it can be rendered again without contacting the
+    agency.
+    
+    Args:
+        path: Path to the JSON configuration
+        
+    Returns:
+        Configuration as returned by build_app_config()
+    """
+    with open(path) as f:
+        values = json.load(f)
+    return build_app_config(
+        agency_url=values.get('ACCOUNT_URL'),
+        oidc_token_endpoint=values.get('REACT_APP_TOKEN_ENDPOINT'),
+        node_env=values.get('NODE_ENV'),
+        dmv_agent_id=values.get('DMV_AGENT_ID'),
+        dmv_agent_password=values.get('DMV_AGENT_PASSWORD'),
+        dmv_agent_did=values.get('DMV_AGENT_DID'),
+        dmv_app_url=values.get('DMV_URL'),
+        bank_agent_id=values.get('BANK_AGENT_ID'),
+        bank_agent_password=values.get('BANK_AGENT_PASSWORD'),
+        bank_app_url=values.get('BANK_URL'),
+        client_id=values.get('REACT_APP_CLIENT_ID'),
+        client_secret=values.get('REACT_APP_CLIENT_SECRET'),
+        w3_root_url=values.get('W3_ROOT'),
+        dmv_redirect_url=values.get('DMV_REDIRECT_URL'),
+        schema_id=values.get('CREDENTIAL_SCHEMA_ID'),
+        credential_definition_id=values.get('CREDENTIAL_DEFINITION_ID'),
+        template_id=values.get('EXCHANGE_TEMPLATE_ID')
+    )
+
+def main(args):
+    """Run the config command."""
+    try:
+        config = load_app_config(args.source)
+    except (OSError, ValueError) as e:
+        print(f"Error: could not read {args.source}: {e}")
+        sys.exit(1)
+    for path, changed in emit_config(config, args.config_formats.split(','), args.config_dir):
+        print(f"{'Wrote' if changed else 'Unchanged'} {path}")
@@ -0,0 +1,177 @@
+"""
+Creation of the credential schema, credential definition and
+presentation exchange template.
+"""
+
+from .schemas import get_credential_schema
+
+def create_oid4vci_credential_schema(client, access_token, schema_name=None):
+    """
+    Create credential schema.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token for authentication
+        schema_name: Optional key of CREDENTIAL_SCHEMAS
+        
+    Returns:
+        Schema ID
+    """
+    headers = {
+        'Content-Type': 'application/json',
+        'Accept': 'application/json',
+        'Authorization': f'Bearer {access_token}'
+    }
+    
+    # The body is serialised once and shared by every tenant
+    schema = get_credential_schema(schema_name)
+    
+    response = client.post(
+        f"{client.agency_url}/v2.0/diagency/credential_schemas",
+        headers=headers,
+        data=schema.data
+    )
+    
+    if response.status_code not in [200, 201]:
+        print(f"Error creating credential schema: {response.text}")
+        return None
+        
+    return response.json().get('id')
+
+def build_credential_definition_payload(schema_id):
+    """
+    Build the credential definition payload.
+    
+    Args:
+        schema_id: Schema ID to use for the credential definition
+        
+    Returns:
+        Credential definition as dictionary
+    """
+    return {
+        "schema_id": schema_id,
+        "credential_document_type": ["org.iso.18013.5.1.mDL"],
+        "credential_format": "mso_mdoc",
+        "credential_signing_algorithm": "ESP256",
+        "cryptographic_binding_methods": ["cose_key"],
+        "key_proof_types": {
+            "jwt": ["ES256"]
+        }
+    }
+
+def create_oid4vci_credential_definition(client, access_token, schema_id):
+    """
+    Create credential definition.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token for authentication
+        schema_id: Schema ID to use for the credential definition
+        
+    Returns:
+        Credential definition ID
+    """
+    headers = {
+        'Content-Type': 'application/json',
+        'Accept': 'application/json',
+        'Authorization': f'Bearer {access_token}'
+    }
+    
+    definition_data = build_credential_definition_payload(schema_id)
+    
+    response = client.post(
+        f"{client.agency_url}/v2.0/diagency/credential_definitions",
+        headers=headers,
+        json=definition_data
+    )
+    
+    if response.status_code not in [200, 201]:
+        print(f"Error creating credential definition: {response.text}")
+        return None
+        
+    return response.json().get('id')
+
+def build_exchange_template_payload():
+    """
+    Build the exchange template payload.
+    
+    Returns:
+        Exchange template as dictionary
+    """
+    return {
+        "name": "Identity Verification",
+        "description": "Request for identity verification using mobile drivers license",
+        "exchange_template": {
+            "client_id_prefix": "redirect_uri",
+            "request_mode": "by_value_params",
+            "exchange_completed_redirect_uri": "uri://completed.redirect",
+            "dcql_query": {
+                "credentials": [
+                    {
+                        "id": "mobile_id",
+                        "format": "mso_mdoc",
+                        "meta": {
+                            "doctype_value": "org.iso.18013.5.1.mDL"
+                        },
+                        "claims": [
+                            {
+                                "path": ["org.iso.18013.5.1", "family_name"]
+                            },
+                            {
+                                "path": ["org.iso.18013.5.1", "given_name"]
+                            },
+                            {
+                                "path": ["org.iso.18013.5.1", "birth_date"]
+                            },
+                            {
+                                "path": ["org.iso.18013.5.1", "resident_address"]
+                            },
+                            {
+                                "path": ["org.iso.18013.5.1", "resident_city"]
+                            },
+                            {
+                                "path": ["org.iso.18013.5.1", "resident_state"]
+                            },
+                            {
+                                "path": ["org.iso.18013.5.1", "resident_postal_code"]
+                            },
+                            {
+                                "path": ["org.iso.18013.5.1", "resident_country"]
+                            }
+                        ]
+                    }
+                ]
+            }
+        }
+    }
+
+def create_oid4vp_exchange_template(client, access_token):
+    """
+    Create exchange template.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token for authentication
+        
+    Returns:
+        Template ID
+    """
+    headers = {
+        'Content-Type': 'application/json',
+        'Accept': 'application/json',
+        'Authorization': f'Bearer {access_token}'
+    }
+    
+    template_data = build_exchange_template_payload()
+    
+    response = client.post(
+        f"{client.agency_url}/v1.0/oidvc/vp/exchange_templates",
+        headers=headers,
+        json=template_data
+    )
+    
+    if response.status_code not in [200, 201]:
+        print(f"Error creating exchange template: {response.text}")
+        return None
+        
+    return response.json().get('id')
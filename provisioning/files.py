@@ -0,0 +1,45 @@
+"""
+Helpers for writing local files safely.
+"""
+
+import os
+
+
+def write_file_atomic(path, data, mode=0o644):
+    """
+    Replace a file's contents atomically.
+    
+    The data is written to a temporary file in the same directory which is
+    then renamed over the target, so readers never see a partial file.
+    
+    Args:
+        path: File to write
+        data: Contents, as str or bytes
+        mode: Permissions of the new file
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    temp_path = f"{path}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def write_file_if_changed(path, data, mode=0o644):
+    """
+    Atomically replace a file, unless it already has these contents.
+    
+    Returns:
+        True if the file was written
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    write_file_atomic(path, data, mode)
+    return True
@@ -0,0 +1,418 @@
+"""
+Generation of synthetic mDL holders for issuance tests.
+
+Each holder is written as the credential_data of a credential offer, keyed
+"namespace:element" as the DMV app sends it, one JSON object per line. The
+records are split into shards of --shard-size holders, each generated by a
+worker of a process pool, since drawing and encoding portraits is CPU bound,
+and streamed to its file so that memory stays flat however many holders are
+generated. A holder only depends on the seed and its index, so the output
+does not depend on the number of processes.
+
+    python3 -m provisioning holders --count 1000000
+    python3 -m provisioning holders --count 5000 --schema mdl-aamva --portraits photos/
+"""
+
+import bisect
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from .files import write_file_atomic
+from .images import encode_image, encode_image_file
+from .schemas import CREDENTIAL_SCHEMAS, DEFAULT_CREDENTIAL_SCHEMA
+
+SHARD_NAME = 'holders-{:05d}.jsonl'
+MANIFEST_NAME = 'manifest.json'
+PORTRAIT_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Drawn portraits, at the 3:4 aspect ratio of ISO/IEC 19794-5 photos and a
+# resolution which usually fits DEFAULT_PORTRAIT_MAX_BYTES without shrinking
+PORTRAIT_SIZE = (240, 320)
+
+MIN_DRIVING_AGE = 17
+MAX_HOLDER_AGE = 90
+LICENCE_VALIDITY_YEARS = [1, 3, 5, 5, 10]
+ISSUING_AUTHORITY = "Department of Motor Vehicles"
+
+GIVEN_NAMES = [
+    "Olivia", "Jack", "Charlotte", "Noah", "Amelia", "William", "Isla", "Oliver", "Mia", "Thomas", "Ava",
+    "James", "Grace", "Lucas", "Chloe", "Henry", "Zoe", "Liam", "Ruby", "Ethan", "Sophie", "Leo", "Harper",
+    "Lachlan", "Matilda", "Hamish", "Priya", "Wei", "Aisha", "Mateo"
+]
+FAMILY_NAMES = [
+    "Smith", "Jones", "Williams", "Brown", "Wilson", "Taylor", "Johnson", "White", "Martin", "Anderson",
+    "Thompson", "Nguyen", "Thomas", "Walker", "Harris", "Lee", "Ryan", "Robinson", "Kelly", "King", "Davis",
+    "Wright", "Evans", "Roberts", "Chen", "Singh", "Papadopoulos", "O'Brien", "Rossi", "Tran"
+]
+# (city, state, lowest postcode, highest postcode)
+LOCALITIES = [
+    ("Brisbane", "QLD", 4000, 4179),
+    ("Gold Coast", "QLD", 4207, 4230),
+    ("Townsville", "QLD", 4810, 4818),
+    ("Sydney", "NSW", 2000, 2234),
+    ("Newcastle", "NSW", 2280, 2300),
+    ("Melbourne", "VIC", 3000, 3207),
+    ("Geelong", "VIC", 3211, 3228),
+    ("Perth", "WA", 6000, 6199),
+    ("Adelaide", "SA", 5000, 5199),
+    ("Hobart", "TAS", 7000, 7055),
+    ("Canberra", "ACT", 2600, 2620),
+    ("Darwin", "NT", 800, 832)
+]
+STREETS = [
+    "High Street", "George Street", "Queen Street", "King Street", "Church Street", "Victoria Road",
+    "Station Street", "Park Road", "Elizabeth Street", "Beach Road", "Railway Parade", "Main Road"
+]
+# ISO/IEC 18013-5 eye and hair colour values
+EYE_COLOURS = ["blue", "brown", "green", "grey", "hazel", "black", "dichromatic"]
+HAIR_COLOURS = ["black", "brown", "blond", "red", "auburn", "grey", "white", "sandy", "bald"]
+# Vehicle category codes, mostly car licences
+VEHICLE_CATEGORIES = ["B", "B", "B", "B", "A", "BE", "C", "D"]
+# Lower bounds (kg) of the AAMVA weight ranges 1 to 9
+AAMVA_WEIGHT_RANGES = [32, 46, 60, 71, 87, 101, 114, 128, 146]
+
+SKIN_TONES = [(255, 224, 196), (241, 194, 160), (224, 172, 105), (198, 134, 66), (141, 85, 36), (92, 56, 30)]
+HAIR_RGB = {
+    "black": (30, 25, 25), "brown": (95, 60, 35), "blond": (220, 190, 120), "red": (165, 70, 40),
+    "auburn": (130, 50, 30), "grey": (160, 160, 160), "white": (235, 235, 230), "sandy": (195, 160, 110)
+}
+
+def add_years(day, years):
+    """Add years to a date, 29 February becoming 28 February in other years."""
+    try:
+        return day.replace(year=day.year + years)
+    except ValueError:
+        return day.replace(year=day.year + years, day=28)
+
+def age_on(birth_date, day):
+    """Age in whole years of someone born on birth_date."""
+    return day.year - birth_date.year - ((day.month, day.day) < (birth_date.month, birth_date.day))
+
+def holder_attributes(rng, index, today):
+    """
+    Draw the data elements of a holder, except the portrait.
+
+    Dates are consistent with each other: holders are at least
+    MIN_DRIVING_AGE when their licence is issued and every licence is still
+    valid today.
+
+    Args:
+        rng: random.Random seeded for this holder
+        index: Index of the holder, which makes the document number unique
+        today: Date the data is generated for
+
+    Returns:
+        Dictionary of values by data element identifier, None for elements
+        the holder does not have
+    """
+    birth_date = today - timedelta(days=rng.randint(MIN_DRIVING_AGE * 366, MAX_HOLDER_AGE * 365))
+    validity = rng.choice(LICENCE_VALIDITY_YEARS)
+    issue_date = max(today - timedelta(days=rng.randrange(validity * 365)), add_years(birth_date, MIN_DRIVING_AGE))
+    expiry_date = add_years(issue_date, validity)
+    age = age_on(birth_date, today)
+
+    given_name = rng.choice(GIVEN_NAMES)
+    family_name = rng.choice(FAMILY_NAMES)
+    city, state, lowest_postcode, highest_postcode = rng.choice(LOCALITIES)
+    postcode = f"{rng.randint(lowest_postcode, highest_postcode):04d}"
+    street = f"{rng.randint(1, 250)} {rng.choice(STREETS)}"
+    sex = rng.choice((1, 2))
+    height = round(rng.gauss(178 if sex == 1 else 164, 7))
+    weight = max(40, round(rng.gauss(84 if sex == 1 else 70, 12)))
+    category = rng.choice(VEHICLE_CATEGORIES)
+
+    return {
+        # ISO/IEC 18013-5 mDL
+        'document_number': f"DL-{index:09d}",
+        'administrative_number': f"ADM-{rng.randint(10000, 99999)}",
+        'issue_date': issue_date.isoformat(),
+        'expiry_date': expiry_date.isoformat(),
+        'family_name': family_name,
+        'given_name': given_name,
+        'family_name_national_character': family_name,
+        'given_name_national_character': given_name,
+        'birth_date': birth_date.isoformat(),
+        'birth_place': f"{rng.choice(LOCALITIES)[1]}, Australia",
+        'issuing_authority': ISSUING_AUTHORITY,
+        'issuing_country': "AU",
+        'issuing_jurisdiction': f"AU-{state}",
+        'un_distinguishing_sign': "AUS",
+        'nationality': "AU",
+        'resident_address': f"{street}, {city}, {state} {postcode}, Australia",
+        'resident_city': city,
+        'resident_state': state,
+        'resident_postal_code': postcode,
+        'resident_country': "AU",
+        'sex': sex,
+        'height': height,
+        'weight': weight,
+        'eye_colour': rng.choice(EYE_COLOURS),
+        'hair_colour': rng.choice(HAIR_COLOURS),
+        'driving_privileges': [{
+            "vehicle_category_code": category,
+            "issue_date": issue_date.isoformat(),
+            "expiry_date": expiry_date.isoformat()
+        }],
+        'portrait_capture_date': issue_date.isoformat(),
+        'age_in_years': age,
+        'age_birth_year': birth_date.year,
+        'age_over_18': age >= 18,
+        'age_over_21': age >= 21,
+        'age_over_65': age >= 65,
+        # AAMVA extensions
+        'domestic_driving_privileges': [{
+            "domestic_vehicle_class": {
+                "domestic_vehicle_class_code": category,
+                "issue_date": issue_date.isoformat(),
+                "expiry_date": expiry_date.isoformat()
+            }
+        }],
+        'family_name_truncation': "N",
+        'given_name_truncation': "N",
+        'organ_donor': 1 if rng.random() < 0.35 else None,
+        'veteran': 1 if rng.random() < 0.05 else None,
+        'weight_range': bisect.bisect(AAMVA_WEIGHT_RANGES, weight),
+        'DHS_compliance': "F",
+        'aamva_version': 1
+    }
+
+def draw_portrait(rng, hair_colour):
+    """
+    Draw a head and shoulders portrait on a mottled background.
+
+    Requires Pillow. Only rng is used for randomness, so the same holder
+    always gets the same portrait.
+
+    Returns:
+        Pillow image of PORTRAIT_SIZE
+    """
+    from PIL import Image, ImageDraw
+
+    width, height = PORTRAIT_SIZE
+    background = Image.new('RGB', PORTRAIT_SIZE, tuple(rng.randint(170, 235) for _ in range(3)))
+    texture_size = (width // 8, height // 8)
+    texture = Image.frombytes('RGB', texture_size, rng.randbytes(texture_size[0] * texture_size[1] * 3))
+    image = Image.blend(background, texture.resize(PORTRAIT_SIZE, Image.BICUBIC), 0.2)
+
+    draw = ImageDraw.Draw(image)
+    skin = rng.choice(SKIN_TONES)
+    centre = width // 2 + rng.randint(-width // 30, width // 30)
+    head_width = width * rng.randint(20, 25) // 100
+    head_top = height * rng.randint(14, 18) // 100
+    head_bottom = height * 60 // 100
+
+    # Shoulders, neck, hair and face, back to front
+    draw.ellipse((centre - width * 48 // 100, height * 72 // 100, centre + width * 48 // 100, height * 13 // 10),
+                 fill=tuple(rng.randint(20, 200) for _ in range(3)))
+    draw.rectangle((centre - width // 10, height // 2, centre + width // 10, height * 78 // 100), fill=skin)
+    if hair_colour in HAIR_RGB:
+        hair_margin = width // 40
+        draw.ellipse((centre - head_width - hair_margin, head_top - 2 * hair_margin,
+                      centre + head_width + hair_margin, height * 45 // 100), fill=HAIR_RGB[hair_colour])
+    draw.ellipse((centre - head_width, head_top, centre + head_width, head_bottom), fill=skin)
+    eye_level = head_top + (head_bottom - head_top) * 9 // 20
+    eye_size = width // 40
+    for eye in (centre - head_width // 2, centre + head_width // 2):
+        draw.ellipse((eye - 2 * eye_size, eye_level - eye_size, eye + 2 * eye_size, eye_level + eye_size),
+                     fill=(40, 35, 30))
+    return image
+
+class HolderGenerator:
+    """
+    Generates the holders of a credential schema, each from the seed and
+    its index.
+    """
+
+    def __init__(self, schema_name, seed, today, portrait_files=None, draw_portraits=False,
+                 portrait_max_bytes=None):
+        """
+        Args:
+            schema_name: Key of CREDENTIAL_SCHEMAS
+            seed: Seed of the generated data
+            today: ISO date the data is generated for
+            portrait_files: Image files the portraits are picked from
+            draw_portraits: Draw a portrait for each holder, when no
+                portrait files are given
+            portrait_max_bytes: Size budget of a portrait before encoding
+
+        Raises:
+            ValueError: If the schema requires elements which cannot be
+                generated, or a portrait file cannot be encoded
+        """
+        self.seed = seed
+        self.today = date.fromisoformat(today)
+        self.portrait_files = portrait_files
+        self.draw_portraits = draw_portraits
+        self.portrait_max_bytes = portrait_max_bytes
+        namespaces = CREDENTIAL_SCHEMAS[schema_name]().namespaces
+        self.elements = [
+            (namespace, identifier)
+            for namespace, fields, _ in namespaces
+            for identifier, _, _, _, _ in fields
+        ]
+        self.requires_portrait = any(
+            identifier == 'portrait' and required
+            for _, fields, _ in namespaces
+            for identifier, _, _, _, required in fields
+        )
+        self.with_portrait = bool(portrait_files or draw_portraits) and any(
+            identifier == 'portrait' for _, identifier in self.elements)
+
+        generated = set(holder_attributes(random.Random(0), 0, self.today)) | {'portrait'}
+        missing = sorted({
+            identifier
+            for _, fields, _ in namespaces
+            for identifier, _, _, _, required in fields
+            if required and identifier not in generated
+        })
+        if missing:
+            raise ValueError(f"cannot generate the required elements {', '.join(missing)} "
+                             f"of the {schema_name} schema")
+
+        # Each portrait file is encoded once, rather than for every holder
+        self.portrait_uris = []
+        if self.with_portrait:
+            for path in portrait_files or []:
+                data_uri = encode_image_file(path, portrait_max_bytes)
+                if data_uri is None:
+                    raise ValueError(f"cannot encode the portrait {path}")
+                self.portrait_uris.append(data_uri)
+
+    def portrait(self, rng, attributes):
+        """Encode the portrait of a holder as a data URI."""
+        if self.portrait_uris:
+            return rng.choice(self.portrait_uris)
+        return encode_image(draw_portrait(rng, attributes['hair_colour']), self.portrait_max_bytes)
+
+    def record(self, index):
+        """
+        Generate a holder.
+
+        Returns:
+            Dictionary with the holder id and its credential_data
+        """
+        rng = random.Random(f"{self.seed}:{index}")
+        attributes = holder_attributes(rng, index, self.today)
+        if self.with_portrait:
+            attributes['portrait'] = self.portrait(rng, attributes)
+        return {
+            'id': f"holder-{index:09d}",
+            'credential_data': {
+                f"{namespace}:{identifier}": attributes[identifier]
+                for namespace, identifier in self.elements
+                if attributes.get(identifier) is not None
+            }
+        }
+
+# Generator of a worker process, created once by its initializer
+_generator = None
+
+def _init_worker(options):
+    global _generator
+    _generator = HolderGenerator(**options)
+
+def write_shard(output_dir, shard, start, count):
+    """
+    Generate holders start to start + count - 1 into a shard, one line at a
+    time. The shard is written under a temporary name, so an existing file
+    is always complete.
+
+    Returns:
+        Tuple of the shard path and the number of holders written
+    """
+    path = os.path.join(output_dir, SHARD_NAME.format(shard))
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        for index in range(start, start + count):
+            f.write(json.dumps(_generator.record(index), separators=(',', ':')))
+            f.write('\n')
+    os.replace(temp_path, path)
+    return path, count
+
+def list_portrait_files(directory):
+    """List the images of a directory, in a stable order."""
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(PORTRAIT_EXTENSIONS)
+    )
+
+def main(args):
+    """Run the holders command."""
+    schema_name = args.schema or os.environ.get('CREDENTIAL_SCHEMA', DEFAULT_CREDENTIAL_SCHEMA)
+    if schema_name not in CREDENTIAL_SCHEMAS:
+        print(f"Error: unknown credential schema '{schema_name}', "
+              f"expected one of {', '.join(CREDENTIAL_SCHEMAS)}")
+        sys.exit(1)
+
+    portrait_files = None
+    draw_portraits = False
+    if args.portraits:
+        try:
+            portrait_files = list_portrait_files(args.portraits)
+        except OSError as e:
+            print(f"Error: cannot list the portraits: {e}")
+            sys.exit(1)
+        if not portrait_files:
+            print(f"Error: no {', '.join(PORTRAIT_EXTENSIONS)} images found in {args.portraits}")
+            sys.exit(1)
+    elif not args.no_portraits:
+        draw_portraits = importlib.util.find_spec('PIL') is not None
+        if not draw_portraits:
+            print("Warning: Pillow is required to draw portraits, holders are generated without one.")
+
+    options = {
+        'schema_name': schema_name,
+        'seed': args.seed,
+        'today': date.today().isoformat(),
+        'portrait_files': portrait_files,
+        'draw_portraits': draw_portraits,
+        'portrait_max_bytes': args.portrait_max_bytes
+    }
+    try:
+        generator = HolderGenerator(**options)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if generator.requires_portrait and not generator.with_portrait:
+        print(f"Warning: the {schema_name} schema requires a portrait, the holders will not validate against it.")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    shards = [
+        (shard, start, min(args.shard_size, args.count - start))
+        for shard, start in enumerate(range(0, args.count, args.shard_size))
+    ]
+    print(f"Generating {args.count} holders into {len(shards)} shard(s) in {args.output_dir}...")
+
+    written = 0
+    start_time = time.monotonic()
+    with ProcessPoolExecutor(args.processes, initializer=_init_worker, initargs=(options,)) as executor:
+        futures = [executor.submit(write_shard, args.output_dir, *shard) for shard in shards]
+        for future in as_completed(futures):
+            try:
+                path, count = future.result()
+            except Exception as e:
+                print(f"Error> failed to generate a shard: {e}")
+                for pending in futures:
+                    pending.cancel()
+                sys.exit(1)
+            written += count
+            print(f"Wrote {path} ({written}/{args.count} holders, {time.monotonic() - start_time:.1f}s)")
+
+    elapsed = time.monotonic() - start_time
+    manifest = {
+        'schema': schema_name,
+        'seed': args.seed,
+        'date': options['today'],
+        'count': args.count,
+        'portraits': args.portraits or ('drawn' if draw_portraits else None),
+        'portrait_max_bytes': args.portrait_max_bytes,
+        'shards': [SHARD_NAME.format(shard) for shard, _, _ in shards]
+    }
+    write_file_atomic(os.path.join(args.output_dir, MANIFEST_NAME), json.dumps(manifest, indent=2) + "\n")
+    print(f"Generated {written} holders in {elapsed:.1f}s ({written / elapsed if elapsed else 0:.0f}/s).")
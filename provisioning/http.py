@@ -0,0 +1,765 @@
+"""
+The pooled HTTP client used for all agency and token endpoint requests,
+with DNS caching, retries, a circuit breaker and an access token cache, over
+a requests or an HTTP/2 transport.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import DEFAULT_CA_BUNDLE_PATH
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .files import write_file_atomic
+from .tracing import current_step, url_template
+
+# HTTP connection pool settings shared by every provisioning request
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+DNS_CACHE_TTL = 300
+
+# Request timeouts (seconds), retries and circuit breaker settings
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+MAX_REQUEST_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8
+MAX_RETRY_AFTER = 60
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'}
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30
+
+# Access tokens are renewed this many seconds before they expire
+TOKEN_REFRESH_MARGIN = 30
+
+def get_verify_option():
+    """
+    Returns the appropriate verify option for requests.
+    - If CUSTOM_CA_PATH is set, use that CA bundle (for localhost with self-signed certs)
+    - Otherwise, use True (system CA bundle for production)
+    - NEVER returns False - certificate validation is always enabled
+    
+    Returns:
+        str or bool: Path to custom CA bundle, or True for system CA bundle
+    """
+    custom_ca = os.environ.get('CUSTOM_CA_PATH')
+    if custom_ca and os.path.exists(custom_ca):
+        print(f"Using custom CA certificate from: {custom_ca}")
+        return custom_ca
+    # Always validate certificates using system CA bundle
+    return True
+
+def create_ssl_context(verify):
+    """
+    Build the SSL context used for every connection made by the client.
+
+    Loading the CA bundle is done once here instead of once per connection.
+
+    Args:
+        verify: Value returned by get_verify_option()
+
+    Returns:
+        ssl.SSLContext with certificate and hostname validation enabled
+    """
+    if isinstance(verify, str) and os.path.isdir(verify):
+        return ssl.create_default_context(capath=verify)
+    if isinstance(verify, str):
+        return ssl.create_default_context(cafile=verify)
+    return ssl.create_default_context(cafile=DEFAULT_CA_BUNDLE_PATH)
+
+class DNSCache:
+    """
+    Per-host cache of resolved addresses.
+
+    The agency and the token endpoint normally live behind the same gateway
+    host, so every new pooled connection would otherwise repeat the same
+    lookup.
+    """
+
+    def __init__(self, ttl=DNS_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, host, port):
+        """
+        Resolve a host, returning a cached address while it is still fresh.
+
+        Args:
+            host: Host name to resolve
+            port: Port the connection will be made to
+
+        Returns:
+            Address string, or None if the host could not be resolved
+        """
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                return entry[0]
+
+        try:
+            infos = socket.getaddrinfo(host.strip('[]'), port, 0, socket.SOCK_STREAM)
+        except OSError:
+            return None
+        finally:
+            record_connection_timing('dns', time.monotonic() - now)
+        if not infos:
+            return None
+
+        address = infos[0][4][0]
+        with self._lock:
+            self._entries[key] = (address, now + self.ttl)
+        return address
+
+    def invalidate(self, host, port):
+        """Forget the cached address for a host, e.g. after a failed connect."""
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+DNS_CACHE = DNSCache()
+
+# Time spent resolving, connecting and handshaking by the current thread's
+# request, collected for tracing
+_connection_timings = threading.local()
+
+def record_connection_timing(phase, seconds):
+    """Add time spent in a connection phase to the current thread's request."""
+    timings = getattr(_connection_timings, 'current', None)
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0) + seconds
+
+class _CachedDNSConnectionMixin:
+    """Resolve the connection host through DNS_CACHE before connecting."""
+
+    def _new_conn(self):
+        host = self._dns_host
+        address = DNS_CACHE.lookup(host, self.port)
+        start = time.monotonic()
+        if not address:
+            try:
+                return super()._new_conn()
+            finally:
+                self._tcp_time = time.monotonic() - start
+                record_connection_timing('connect', self._tcp_time)
+
+        # Only the TCP connect uses the resolved address, SNI and certificate
+        # validation still use the original host name
+        self._dns_host = address
+        try:
+            return super()._new_conn()
+        except Exception:
+            DNS_CACHE.invalidate(host, self.port)
+            raise
+        finally:
+            self._dns_host = host
+            self._tcp_time = time.monotonic() - start
+            record_connection_timing('connect', self._tcp_time)
+
+class _CachedDNSHTTPConnection(_CachedDNSConnectionMixin, HTTPConnection):
+    pass
+
+class _CachedDNSHTTPSConnection(_CachedDNSConnectionMixin, HTTPSConnection):
+
+    def connect(self):
+        self._tcp_time = 0
+        start = time.monotonic()
+        try:
+            super().connect()
+        finally:
+            record_connection_timing('tls', time.monotonic() - start - self._tcp_time)
+
+class _CachedDNSHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CachedDNSHTTPConnection
+
+class _CachedDNSHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CachedDNSHTTPSConnection
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter which shares one preloaded SSLContext between all of its
+    connections and resolves hosts through DNS_CACHE.
+    """
+
+    def __init__(self, ssl_context, **kwargs):
+        self.ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CachedDNSHTTPConnectionPool,
+            'https': _CachedDNSHTTPSConnectionPool
+        }
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        if verify is not False:
+            # Use the preloaded context rather than having urllib3 load the
+            # CA bundle again for each new connection
+            pool_kwargs['ssl_context'] = self.ssl_context
+            pool_kwargs.pop('ca_certs', None)
+            pool_kwargs.pop('ca_cert_dir', None)
+        return host_params, pool_kwargs
+
+    def cert_verify(self, conn, url, verify, cert):
+        super().cert_verify(conn, url, verify, cert)
+        if verify is not False:
+            conn.ca_certs = None
+            conn.ca_cert_dir = None
+
+class RequestsTransport:
+    """
+    Transport sending each request through a pooled requests.Session, one
+    HTTP/1.1 connection per request in flight.
+    """
+
+    name = 'requests'
+
+    def __init__(self, ssl_context, pool_maxsize):
+        adapter = PooledHTTPAdapter(
+            ssl_context,
+            pool_connections=POOL_CONNECTIONS,
+            pool_maxsize=pool_maxsize
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.verify = True
+        self.session.headers['Connection'] = 'keep-alive'
+
+    def send(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+class HTTP2Transport:
+    """
+    Transport multiplexing requests over HTTP/2 with httpx.
+
+    Every thread hands its requests to one httpx.AsyncClient running on an
+    event loop in a background thread, so concurrent steps and tenants share
+    a few connections as HTTP/2 streams instead of holding one connection
+    each. Servers which do not negotiate h2 are spoken to over HTTP/1.1.
+
+    Requests take the keyword arguments of requests.Session.request() that
+    the provisioning uses, and return requests.Response objects or raise
+    requests exceptions, so that callers do not depend on the backend.
+    """
+
+    name = 'http2'
+
+    def __init__(self, ssl_context, pool_maxsize):
+        """
+        Raises:
+            ImportError: If httpx or its HTTP/2 support is not installed
+        """
+        import httpx
+        self._httpx = httpx
+        # Raises ImportError when the h2 package is missing
+        self._client = httpx.AsyncClient(
+            http2=True,
+            verify=ssl_context,
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=POOL_CONNECTIONS),
+            headers={'Connection': 'keep-alive'}
+        )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='http2-transport', daemon=True)
+        self._thread.start()
+
+    def send(self, method, url, timeout=None, data=None, stream=None, **kwargs):
+        httpx = self._httpx
+        if isinstance(data, (bytes, str)):
+            kwargs['content'] = data
+        elif data is not None:
+            kwargs['data'] = data
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            timeout = httpx.Timeout(read, connect=connect)
+
+        request = self._client.request(method, url, timeout=timeout, **kwargs)
+        try:
+            response = asyncio.run_coroutine_threadsafe(request, self._loop).result()
+        except httpx.HTTPError as e:
+            raise self._requests_exception(e) from e
+        return self._requests_response(response)
+
+    def _requests_exception(self, error):
+        """Map an httpx exception to the requests exception callers expect."""
+        httpx = self._httpx
+        if isinstance(error, httpx.ConnectTimeout):
+            cls = requests.ConnectTimeout
+        elif isinstance(error, httpx.TimeoutException):
+            cls = requests.ReadTimeout
+        elif isinstance(error, httpx.ConnectError) and _caused_by(error, ssl.SSLError):
+            cls = requests.exceptions.SSLError
+        elif isinstance(error, httpx.TransportError):
+            cls = requests.ConnectionError
+        else:
+            cls = requests.RequestException
+        return cls(str(error) or type(error).__name__)
+
+    @staticmethod
+    def _requests_response(response):
+        """Convert a fully read httpx.Response to a requests.Response."""
+        request = requests.PreparedRequest()
+        request.method = response.request.method
+        request.url = str(response.request.url)
+        request.headers = CaseInsensitiveDict(response.request.headers)
+        request.body = response.request.content
+
+        result = requests.Response()
+        result.status_code = response.status_code
+        result.reason = response.reason_phrase
+        result.headers = CaseInsensitiveDict(response.headers)
+        result.url = str(response.url)
+        result.encoding = response.charset_encoding
+        result.elapsed = response.elapsed
+        result.request = request
+        result._content = response.content
+        result._content_consumed = True
+        return result
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+def _caused_by(error, cls):
+    """Whether an exception was raised while handling an exception of type cls."""
+    while error is not None:
+        if isinstance(error, cls):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+# HTTP transports by name, selected with --transport or HTTP_TRANSPORT
+TRANSPORTS = {
+    'requests': RequestsTransport,
+    'http2': HTTP2Transport
+}
+
+def create_transport(name, ssl_context, pool_maxsize):
+    """
+    Create an HTTP transport.
+
+    The requests transport is used instead when the one requested needs a
+    package which is not installed.
+
+    Args:
+        name: Name of the transport, a key of TRANSPORTS
+        ssl_context: SSLContext used for every connection
+        pool_maxsize: Maximum number of connections per host
+
+    Returns:
+        Transport with send(method, url, **kwargs) and close() methods
+
+    Raises:
+        ValueError: If the transport is unknown
+    """
+    if name not in TRANSPORTS:
+        raise ValueError(f"Unknown HTTP transport '{name}', expected one of {', '.join(TRANSPORTS)}")
+    try:
+        return TRANSPORTS[name](ssl_context, pool_maxsize)
+    except ImportError as e:
+        print(f"Warning: the {name} transport is not available ({e}), install httpx[http2] to use it. "
+              "Using the requests transport.")
+        return RequestsTransport(ssl_context, pool_maxsize)
+
+class TokenCache:
+    """
+    Cache of access tokens keyed by (token endpoint, client ID).
+
+    Tokens are kept until shortly before their expires_in elapses, and
+    concurrent callers asking for the same token share a single request to
+    the token endpoint. When a file and a Fernet key are given (and the
+    cryptography package is installed) the cache is also kept encrypted on
+    disk so that later runs can reuse still valid tokens.
+    """
+
+    def __init__(self, path=None, key=None, refresh_margin=TOKEN_REFRESH_MARGIN):
+        """
+        Args:
+            path: Optional file used to persist the cache between runs
+            key: Fernet key used to encrypt the cache file
+            refresh_margin: Seconds before expiry at which a token is
+                renewed, at most half the lifetime of the token so that
+                short-lived tokens are still reused
+        """
+        self.refresh_margin = refresh_margin
+        self._tokens = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._path = None
+        self._fernet = None
+
+        if path:
+            if not key:
+                print("Warning: TOKEN_CACHE_KEY is not set, tokens will not be cached on disk.")
+                return
+            try:
+                from cryptography.fernet import Fernet
+            except ImportError:
+                print("Warning: the cryptography package is required to cache tokens on disk.")
+                return
+            self._path = path
+            self._fernet = Fernet(key)
+            self._load()
+
+    @staticmethod
+    def _secret_digest(client_secret):
+        return hashlib.sha256((client_secret or '').encode('utf-8')).hexdigest()
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path, 'rb') as f:
+                entries = json.loads(self._fernet.decrypt(f.read()))
+        except Exception as e:
+            print(f"Warning: ignoring unreadable token cache {self._path}: {str(e)}")
+            return
+        for entry in entries:
+            self._tokens[(entry['token_endpoint'], entry['client_id'])] = entry
+
+    def _save(self):
+        now = time.time()
+        entries = [entry for entry in self._tokens.values() if entry['expires_at'] > now]
+        write_file_atomic(self._path, self._fernet.encrypt(json.dumps(entries).encode('utf-8')), 0o600)
+
+    def get(self, token_endpoint, client_id, client_secret, fetch):
+        """
+        Return a valid access token, fetching a new one if required.
+        
+        Args:
+            token_endpoint: OAuth token endpoint URL
+            client_id: OAuth client ID
+            client_secret: OAuth client secret, a cached token is only reused
+                for the secret it was issued for
+            fetch: Callable returning a tuple of (access token, expires_in)
+            
+        Returns:
+            Access token string, or None if it could not be obtained
+        """
+        key = (token_endpoint, client_id)
+        digest = self._secret_digest(client_secret)
+
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry and entry['secret'] == digest and entry.get(
+                    'refresh_at', entry['expires_at'] - self.refresh_margin) > time.time():
+                return entry['access_token']
+
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = Future()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            return future.result()
+
+        try:
+            access_token, expires_in = fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._inflight[key]
+            if access_token and expires_in:
+                now = time.time()
+                self._tokens[key] = {
+                    'token_endpoint': token_endpoint,
+                    'client_id': client_id,
+                    'secret': digest,
+                    'access_token': access_token,
+                    'expires_at': now + float(expires_in),
+                    'refresh_at': now + float(expires_in) - min(self.refresh_margin, float(expires_in) / 2)
+                }
+                if self._path:
+                    self._save()
+
+        future.set_result(access_token)
+        return access_token
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+class CircuitBreaker:
+    """
+    Fail fast while the agency appears to be down.
+
+    After failure_threshold consecutive transient failures the circuit
+    opens and requests are refused for reset_timeout seconds. Requests are
+    then let through again, and the first failure re-opens the circuit
+    while the first success closes it.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def before_request(self, url):
+        """
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        with self._lock:
+            if self._opened_at is not None and time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(
+                    f"Circuit open after {self._failures} consecutive failures, not sending request to {url}")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter for the given (1 based) attempt."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+
+def retry_after_delay(response):
+    """
+    Parse the Retry-After header of a response.
+    
+    Returns:
+        Delay in seconds, or None if the header is missing or invalid
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(delay, 0), MAX_RETRY_AFTER)
+
+class ProvisioningClient:
+    """
+    HTTP client shared by every provisioning step.
+
+    A single transport is used so that connections to the agency and the
+    token endpoint are kept alive and reused, rather than paying a new TCP
+    and TLS handshake for every call. The requests transport holds a pooled
+    session, the http2 transport multiplexes the calls over a few HTTP/2
+    connections.
+
+    Every request has connect and read timeouts. Idempotent requests are
+    retried on connection errors and 502/503/504 responses, any request is
+    retried on a 429, and a circuit breaker stops sending requests once the
+    agency keeps failing. An optional ConcurrencyLimiter bounds the requests
+    in flight and their rate.
+    """
+
+    def __init__(self, agency_url, token_endpoint, pool_maxsize=POOL_MAXSIZE, token_cache=None,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), max_attempts=MAX_REQUEST_ATTEMPTS, tracer=None,
+                 transport=None, limiter=None):
+        """
+        Args:
+            agency_url: Agency URL
+            token_endpoint: OAuth token endpoint URL
+            pool_maxsize: Maximum number of pooled connections per host
+            token_cache: TokenCache to use, by default one configured from
+                the TOKEN_CACHE_FILE and TOKEN_CACHE_KEY environment variables
+            timeout: Tuple of (connect, read) timeouts in seconds
+            max_attempts: Maximum number of attempts for a retryable request
+            tracer: Optional Tracer receiving a span for every request attempt
+            transport: Name of the HTTP transport, a key of TRANSPORTS, by
+                default the HTTP_TRANSPORT environment variable or requests
+            limiter: Optional ConcurrencyLimiter every request attempt goes
+                through
+        """
+        self.agency_url = agency_url
+        self.token_endpoint = token_endpoint
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.tracer = tracer
+        self.limiter = limiter
+        self.circuit_breaker = CircuitBreaker()
+        self.token_cache = token_cache or TokenCache(
+            os.environ.get('TOKEN_CACHE_FILE'),
+            os.environ.get('TOKEN_CACHE_KEY')
+        )
+        self.ssl_context = create_ssl_context(get_verify_option())
+        self.transport = create_transport(transport or os.environ.get('HTTP_TRANSPORT', 'requests'),
+                                          self.ssl_context, pool_maxsize)
+
+    def request(self, method, url, idempotent=None, **kwargs):
+        """
+        Send a request through the transport, retrying transient failures.
+        
+        Args:
+            method: HTTP method
+            url: Request URL
+            idempotent: Whether the request can safely be repeated, by
+                default true for GET, HEAD, PUT, DELETE and OPTIONS
+            kwargs: Passed on to requests.Session.request()
+            
+        Returns:
+            requests.Response
+            
+        Raises:
+            requests.RequestException: If the request failed and cannot be
+                retried, or every attempt failed
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        kwargs.setdefault('timeout', self.timeout)
+
+        attempt = 1
+        while True:
+            self.circuit_breaker.before_request(url)
+            try:
+                response = self._limited_send(method, url, attempt, kwargs)
+            except requests.exceptions.SSLError:
+                raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.circuit_breaker.record_failure()
+                # A request which could not connect was never sent, so it
+                # can be retried whatever its method
+                retryable = idempotent or isinstance(e, requests.ConnectTimeout)
+                if not retryable or attempt >= self.max_attempts:
+                    raise
+                delay = backoff_delay(attempt)
+            else:
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    self.circuit_breaker.record_failure()
+                elif response.status_code != 429:
+                    self.circuit_breaker.record_success()
+                    return response
+
+                retryable = idempotent or response.status_code == 429
+                if not retryable or attempt >= self.max_attempts:
+                    return response
+                delay = retry_after_delay(response)
+                if delay is None:
+                    delay = backoff_delay(attempt)
+                response.close()
+
+            time.sleep(delay)
+            attempt += 1
+
+    def probe(self, method, url, **kwargs):
+        """
+        Send a single request attempt to a host other than the agency, such
+        as a VICAL provider. It is not retried, and neither goes through the
+        limiter nor counts towards the circuit breaker of the agency, so an
+        unreachable host cannot hold back or stop the agency calls.
+
+        Returns:
+            requests.Response
+
+        Raises:
+            requests.RequestException: If the request failed
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        return self._send(method, url, 1, kwargs)
+
+    def _limited_send(self, method, url, attempt, kwargs):
+        """Send a single request attempt through the limiter, if any."""
+        if self.limiter is None:
+            return self._send(method, url, attempt, kwargs)
+
+        endpoint = f"{method} {url_template(url, self.agency_url)}"
+        start = self.limiter.acquire(endpoint)
+        overloaded = True
+        retry_after = None
+        try:
+            response = self._send(method, url, attempt, kwargs)
+            overloaded = response.status_code == 429 or response.status_code >= 500
+            if overloaded:
+                retry_after = retry_after_delay(response)
+            return response
+        finally:
+            self.limiter.release(endpoint, start, overloaded, retry_after)
+
+    def _send(self, method, url, attempt, kwargs):
+        """Send a single request attempt, recording a span when tracing."""
+        if self.tracer is None:
+            return self.transport.send(method, url, **kwargs)
+
+        _connection_timings.current = timings = {}
+        start = time.monotonic()
+        attributes = {
+            'method': method,
+            'url': url_template(url, self.agency_url),
+            'attempt': attempt,
+            'step': getattr(current_step, 'name', None)
+        }
+        try:
+            response = self.transport.send(method, url, **kwargs)
+        except Exception as e:
+            attributes['error'] = True
+            attributes['error_message'] = f"{type(e).__name__}: {e}"
+            raise
+        else:
+            body = response.request.body
+            attributes['status'] = response.status_code
+            attributes['error'] = response.status_code >= 400
+            attributes['bytes_out'] = len(body) if body else 0
+            if kwargs.get('stream'):
+                attributes['bytes_in'] = int(response.headers.get('Content-Length', 0))
+            else:
+                attributes['bytes_in'] = len(response.content)
+            attributes['server_time'] = round(max(0.0, response.elapsed.total_seconds()
+                                                  - sum(timings.values())), 6)
+            return response
+        finally:
+            _connection_timings.current = None
+            attributes.update({f"{phase}_time": round(seconds, 6) for phase, seconds in timings.items()})
+            self.tracer.record('http', f"{method} {attributes['url']}", start, time.monotonic(), **attributes)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def close(self):
+        """Close all pooled connections."""
+        self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
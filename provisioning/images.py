@@ -0,0 +1,195 @@
+"""
+Encoding of the logo and portrait images embedded in agent profiles and
+holder credentials.
+"""
+
+import base64
+import hashlib
+import io
+import os
+import threading
+
+from .files import write_file_atomic
+
+# Image encoding settings
+IMAGE_HEADER_SIZE = 512
+MIN_IMAGE_DIMENSION = 32
+IMAGE_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif')
+]
+
+def sniff_image_mime_type(header, file_path):
+    """
+    Determine the MIME type of an image from its leading bytes.
+    
+    Args:
+        header: First bytes of the image file
+        file_path: Path to the image file, its extension is only used when
+            the content is not recognised
+        
+    Returns:
+        MIME type string
+    """
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    if b'<svg' in header.lower():
+        return 'image/svg+xml'
+
+    # Fall back to the file extension
+    if file_path.lower().endswith('.jpg') or file_path.lower().endswith('.jpeg'):
+        return 'image/jpeg'
+    # Default to PNG if unknown
+    return 'image/png'
+
+def shrink_image(file_path, max_bytes):
+    """
+    Downscale and recompress an image until it fits within a size budget.
+    
+    Requires Pillow. Images with transparency are kept as PNG, all others
+    are recompressed as JPEG.
+    
+    Args:
+        file_path: Path to the image file
+        max_bytes: Maximum size of the encoded image
+        
+    Returns:
+        Tuple of (image bytes, MIME type), or None if Pillow is not available
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        print(f"Warning: Pillow is required to shrink {file_path} below {max_bytes} bytes, embedding it unchanged.")
+        return None
+
+    with Image.open(file_path) as image:
+        image.load()
+    return fit_image(image, max_bytes)
+
+def fit_image(image, max_bytes):
+    """
+    Recompress a Pillow image, downscaling it until it fits within a size
+    budget, as shrink_image does for files.
+
+    Args:
+        image: Loaded Pillow image
+        max_bytes: Maximum size of the encoded image
+
+    Returns:
+        Tuple of (image bytes, MIME type)
+    """
+    from PIL import Image
+
+    keep_alpha = image.mode in ('RGBA', 'LA', 'P')
+    candidate = image
+    while True:
+        buffer = io.BytesIO()
+        if keep_alpha:
+            candidate.save(buffer, 'PNG', optimize=True)
+        else:
+            candidate.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True)
+
+        if buffer.tell() <= max_bytes or min(candidate.size) <= MIN_IMAGE_DIMENSION:
+            return buffer.getvalue(), 'image/png' if keep_alpha else 'image/jpeg'
+
+        size = (max(1, int(candidate.width * 0.75)), max(1, int(candidate.height * 0.75)))
+        candidate = image.resize(size, Image.LANCZOS)
+
+def encode_image(image, max_bytes):
+    """
+    Encode a Pillow image held in memory as a data URI, fitting it within
+    max_bytes like encode_image_file does for larger files.
+
+    Unlike encode_image_file the result is not cached, as images generated
+    in memory are usually only encoded once.
+
+    Args:
+        image: Loaded Pillow image
+        max_bytes: Maximum size of the image before encoding
+
+    Returns:
+        Base64 encoded image with data URI prefix
+    """
+    image_data, mime_type = fit_image(image, max_bytes)
+    return f"data:{mime_type};base64,{base64.b64encode(image_data).decode('ascii')}"
+
+def logo_max_bytes():
+    """
+    Read the size budget of the logos from the LOGO_MAX_BYTES environment
+    variable.
+
+    Returns:
+        Maximum size in bytes, or None when unset or 0
+
+    Raises:
+        ValueError: If LOGO_MAX_BYTES is not a number of bytes
+    """
+    value = os.environ.get('LOGO_MAX_BYTES', '0')
+    if not value.strip().isdigit():
+        raise ValueError(f"LOGO_MAX_BYTES must be a number of bytes, not '{value}'.")
+    return int(value) or None
+
+_encoded_images = {}
+_encoded_images_lock = threading.Lock()
+
+def encode_image_file(file_path, max_bytes=None):
+    """
+    Read an image file and encode it as base64.
+    
+    The file is read once and held in memory whole, along with its base64
+    encoding, so it is meant for logos rather than large files. Encoded
+    images are cached by the SHA-256 of their content, in memory and, when
+    IMAGE_CACHE_DIR is set, on disk, so the same logo is only encoded once
+    however many agents embed it.
+    
+    Args:
+        file_path: Path to the image file
+        max_bytes: Optional size budget for the image before encoding,
+            defaults to the LOGO_MAX_BYTES environment variable. Larger
+            images are downscaled and recompressed when Pillow is installed.
+        
+    Returns:
+        Base64 encoded image with data URI prefix
+    """
+    try:
+        if max_bytes is None:
+            max_bytes = logo_max_bytes()
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        key = (digest, max_bytes)
+        with _encoded_images_lock:
+            if key in _encoded_images:
+                return _encoded_images[key]
+
+        cache_dir = os.environ.get('IMAGE_CACHE_DIR')
+        cache_path = os.path.join(cache_dir, f"{digest}-{max_bytes or 0}.uri") if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                data_uri = f.read()
+        else:
+            # Determine MIME type from the file content
+            mime_type = sniff_image_mime_type(data[:IMAGE_HEADER_SIZE], file_path)
+            shrunk = None
+            if max_bytes and len(data) > max_bytes:
+                shrunk = shrink_image(file_path, max_bytes)
+            if shrunk:
+                data, mime_type = shrunk
+            encoded_image = base64.b64encode(data).decode('ascii')
+
+            data_uri = f"data:{mime_type};base64,{encoded_image}"
+            if cache_path:
+                os.makedirs(cache_dir, exist_ok=True)
+                write_file_atomic(cache_path, data_uri)
+
+        with _encoded_images_lock:
+            _encoded_images[key] = data_uri
+        return data_uri
+    except Exception as e:
+        print(f"Error encoding image from {file_path}: {str(e)}")
+        return None
@@ -0,0 +1,123 @@
+"""
+Write-ahead journal of the completed provisioning steps, used to resume an
+interrupted run.
+"""
+
+import json
+import os
+import threading
+
+class StepJournal:
+    """
+    Append-only log of the results of completed provisioning steps.
+
+    Each completed step appends one JSON line holding its result, for
+    example the agent IDs and secrets or the credential schema ID, and the
+    line is flushed to disk with fsync before the run goes on. Replaying the
+    log gives back the results of every step which completed, so that a
+    resumed run only runs the steps which did not.
+
+    Results are grouped by scope: None for the issuer and verifier of a
+    single run, the tenant name for bulk runs, so each tenant resumes on its
+    own. Entries recorded against another agency are ignored.
+    """
+
+    def __init__(self, path, agency_url):
+        """
+        Args:
+            path: JSON Lines file holding the journal
+            agency_url: Agency URL the steps are run against
+        """
+        self.path = path
+        self.agency_url = agency_url
+        self._fd = None
+        self._completed = {}
+        self._lock = threading.Lock()
+
+    def replay(self):
+        """
+        Read the results of the steps recorded in the journal.
+
+        A line cut short by a crash while it was being appended is ignored,
+        its step is simply run again.
+
+        Returns:
+            Dictionary of scope to a dictionary of step name to result
+        """
+        completed = {}
+        if not os.path.exists(self.path):
+            return completed
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('agency_url') == self.agency_url:
+                    completed.setdefault(entry['scope'], {})[entry['step']] = entry['result']
+        return completed
+
+    def open(self, resume=False):
+        """
+        Open the journal for appending.
+
+        Args:
+            resume: Replay and keep the entries of the previous run,
+                otherwise the journal is started again
+        """
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        if resume:
+            self._completed = self.replay()
+        else:
+            flags |= os.O_TRUNC
+        # The journal holds agent secrets
+        self._fd = os.open(self.path, flags, 0o600)
+        if resume and not self._ends_with_newline():
+            # Terminate a line cut short, so that it does not swallow the next entry
+            os.write(self._fd, b"\n")
+        return self
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return True
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def scopes(self):
+        """Scopes with steps replayed when the journal was opened."""
+        return list(self._completed)
+
+    def completed(self, scope=None):
+        """Results of the steps of scope replayed when the journal was opened."""
+        return dict(self._completed.get(scope, {}))
+
+    def record(self, scope, step, result):
+        """Append the result of a completed step and flush it to disk."""
+        line = json.dumps({
+            'agency_url': self.agency_url,
+            'scope': scope,
+            'step': step,
+            'result': result
+        }, separators=(',', ':')) + "\n"
+        with self._lock:
+            os.write(self._fd, line.encode('utf-8'))
+            os.fsync(self._fd)
+
+    def checkpoint(self, scope=None):
+        """
+        Return the checkpoint callback of run_provisioning_steps() recording
+        steps under scope.
+        """
+        return lambda step, result: self.record(scope, step, result)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
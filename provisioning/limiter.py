@@ -0,0 +1,252 @@
+"""
+Adaptive limit of the requests in flight to the agency, and per-endpoint
+rate limits, shared by the bulk modes.
+"""
+
+import threading
+import time
+
+# Requests in flight allowed at the start of an adaptive run
+INITIAL_LIMIT = 4
+MIN_LIMIT = 1
+# Limit reductions on 429 and 5xx responses or failed requests, and on a
+# rise of latency
+BACKOFF_RATIO = 0.5
+LATENCY_BACKOFF_RATIO = 0.9
+# Smoothed latency above this multiple of the baseline counts as congestion
+LATENCY_TOLERANCE = 2.0
+LATENCY_SMOOTHING = 0.2
+# Growth of the baseline per request, so that it follows an agency which
+# becomes slower for good
+BASELINE_DRIFT = 0.001
+
+class TokenBucket:
+    """
+    Token bucket allowing rate requests per second, with bursts of up to
+    one second of requests.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, waiting until one is available. Tokens are reserved in
+        order, so waiting callers are served first come, first served.
+
+        Returns:
+            The time waited, in seconds
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+        return delay
+
+class ConcurrencyLimiter:
+    """
+    Limit of the requests in flight to the agency, adapted to how it copes.
+
+    The limit grows by about one request per round trip while latency stays
+    flat (additive increase), and is cut when the agency answers 429 or 5xx,
+    a request fails, or the smoothed latency of an endpoint rises above
+    LATENCY_TOLERANCE times its baseline (multiplicative decrease). It is
+    cut at most once per round trip, since the requests already in flight
+    were sent under the previous limit.
+
+    A request answered with a Retry-After header waits that long before it
+    is retried. Once the limit is down to a single request, the header also
+    holds every other request back, as time is then the only way left to
+    back off.
+
+    Requests also take a token from the bucket of their endpoint when rate
+    limits are configured, whether or not the limit adapts.
+    """
+
+    def __init__(self, maximum, adaptive=True, initial=INITIAL_LIMIT, rate_limits=None, tracer=None,
+                 metric='concurrency_limit'):
+        """
+        Args:
+            maximum: Maximum number of requests in flight
+            adaptive: Adapt the limit, otherwise it stays at the maximum
+            initial: Limit at the start of an adaptive run
+            rate_limits: Dictionary of endpoint to requests per second, keyed
+                'METHOD /path', '/path' (any method) or '*' (each endpoint),
+                paths as grouped by url_template()
+            tracer: Optional Tracer receiving the limit as a gauge
+            metric: Name of the gauge
+        """
+        self.maximum = maximum
+        self.adaptive = adaptive
+        self.limit = float(min(initial, maximum) if adaptive else maximum)
+        self.rate_limits = dict(rate_limits or {})
+        self.tracer = tracer
+        self.metric = metric
+        self.in_flight = 0
+        self.stats = {
+            'lowest_limit': int(self.limit),
+            'highest_limit': int(self.limit),
+            'backoffs': 0,
+            'throttled': 0,
+            'paused': 0.0
+        }
+        self._buckets = {}
+        self._shared_buckets = {}
+        self._baselines = {}
+        self._averages = {}
+        self._resume_at = 0.0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        self._record_limit()
+
+    def _bucket(self, endpoint):
+        with self._condition:
+            if endpoint not in self._buckets:
+                path = endpoint.split(' ', 1)[-1]
+                key = next((key for key in (endpoint, path, '*') if key in self.rate_limits), None)
+                if key is None:
+                    bucket = None
+                elif key == '*':
+                    # The default rate applies to each endpoint separately
+                    bucket = TokenBucket(self.rate_limits[key])
+                else:
+                    # Endpoints matching the same rate limit share its bucket
+                    bucket = self._shared_buckets.setdefault(key, TokenBucket(self.rate_limits[key]))
+                self._buckets[endpoint] = bucket
+            return self._buckets[endpoint]
+
+    def acquire(self, endpoint):
+        """
+        Wait for a token of the endpoint's bucket and for a free slot.
+
+        Args:
+            endpoint: 'METHOD /path' of the request
+
+        Returns:
+            time.monotonic() when the request was let through, to be given
+            back to release()
+        """
+        bucket = self._bucket(endpoint)
+        if bucket is not None and bucket.acquire():
+            with self._condition:
+                self.stats['throttled'] += 1
+
+        with self._condition:
+            while True:
+                delay = self._resume_at - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                elif self.in_flight < int(self.limit):
+                    break
+                else:
+                    self._condition.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, endpoint, start, overloaded=False, retry_after=None):
+        """
+        Free the slot of a completed request and adapt the limit.
+
+        Args:
+            endpoint: 'METHOD /path' of the request
+            start: Value returned by acquire()
+            overloaded: The request failed or was answered with a 429 or 5xx
+            retry_after: Delay asked for by the Retry-After header of the
+                response, in seconds
+        """
+        latency = time.monotonic() - start
+        with self._condition:
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            if overloaded and retry_after and int(self.limit) <= MIN_LIMIT:
+                self._pause(retry_after)
+            if self.adaptive:
+                self._adapt(endpoint, start, latency, overloaded, in_flight)
+            self._condition.notify_all()
+
+    def _pause(self, delay):
+        now = time.monotonic()
+        if now + delay > self._resume_at:
+            self.stats['paused'] += now + delay - max(self._resume_at, now)
+            self._resume_at = now + delay
+
+    def _adapt(self, endpoint, start, latency, overloaded, in_flight):
+        if overloaded:
+            self._decrease(start, BACKOFF_RATIO)
+            return
+
+        baseline = self._baselines.get(endpoint)
+        baseline = latency if baseline is None else min(latency, baseline * (1 + BASELINE_DRIFT))
+        self._baselines[endpoint] = baseline
+        average = self._averages.get(endpoint, latency)
+        average += (latency - average) * LATENCY_SMOOTHING
+        self._averages[endpoint] = average
+
+        if average > baseline * LATENCY_TOLERANCE:
+            self._decrease(start, LATENCY_BACKOFF_RATIO)
+        elif in_flight * 2 >= self.limit:
+            # Only grow while the limit is actually used
+            self._set_limit(min(self.maximum, self.limit + 1 / self.limit))
+
+    def _decrease(self, start, ratio):
+        if start < self._last_decrease:
+            return
+        self._last_decrease = time.monotonic()
+        self.stats['backoffs'] += 1
+        self._set_limit(max(MIN_LIMIT, self.limit * ratio))
+
+    def _set_limit(self, limit):
+        changed = int(limit) != int(self.limit)
+        self.limit = limit
+        if changed:
+            self.stats['lowest_limit'] = min(self.stats['lowest_limit'], int(limit))
+            self.stats['highest_limit'] = max(self.stats['highest_limit'], int(limit))
+            self._record_limit()
+
+    def _record_limit(self):
+        if self.tracer is not None:
+            self.tracer.gauge(self.metric, int(self.limit))
+
+    def metrics(self):
+        """Current limit, its range and how often requests were held back."""
+        with self._condition:
+            return dict(self.stats, limit=int(self.limit), maximum=self.maximum, paused=round(self.stats['paused'], 3))
+
+    def summary(self):
+        """Describe the limit and how often requests were held back."""
+        stats = self.metrics()
+        text = f"Concurrency limit {stats['limit']} of {stats['maximum']}"
+        if self.adaptive:
+            text += (f" (between {stats['lowest_limit']} and {stats['highest_limit']}, "
+                     f"{stats['backoffs']} backoff(s))")
+        if self.rate_limits:
+            text += f", {stats['throttled']} request(s) rate limited"
+        if stats['paused']:
+            text += f", paused {stats['paused']:.1f}s by Retry-After"
+        return text
+
+def create_limiter(maximum, adaptive=False, rate_limits=None, tracer=None, metric='concurrency_limit'):
+    """
+    Create the limiter of a bulk mode from its command line options.
+
+    Args:
+        maximum: Maximum number of requests in flight
+        adaptive: Adapt the limit up to the maximum
+        rate_limits: List of (endpoint, requests per second) pairs
+        tracer: Optional Tracer receiving the limit as a gauge
+        metric: Name of the gauge
+
+    Returns:
+        ConcurrencyLimiter, or None when neither option is given
+    """
+    if not adaptive and not rate_limits:
+        return None
+    return ConcurrencyLimiter(maximum, adaptive, rate_limits=dict(rate_limits or ()), tracer=tracer, metric=metric)
@@ -0,0 +1,657 @@
+"""
+Generate OID4VCI credential offer and OID4VP exchange load against a
+provisioned agency.
+
+The agents, credential definition and exchange template are read from the
+JSON configuration written by the provision command (oid4vc-config.json),
+and the offers and exchanges are created the same way the DMV and Bank
+apps create them. AGENCY_URL and OIDC_TOKEN_ENDPOINT override the URLs of
+the configuration, which are rewritten for the docker network when
+provisioning locally.
+
+Closed loop, 20 virtual users issuing requests back to back for 60s:
+
+    python3 -m provisioning load --users 20 --duration 60
+
+Open loop, 50 requests per second whatever the response times:
+
+    python3 -m provisioning load --rate 50 --duration 60 --output load-report.json
+
+Latencies are reported in milliseconds. In open loop they are measured from
+the time each request was scheduled, so queueing behind a slow agency is
+included rather than hidden (service_time excludes it).
+
+Soak mode keeps a population of open presentation exchanges for hours,
+replacing them as they expire, and appends a sample of the create and
+lookup latencies, expiries and exchanges held by the agency to a JSON Lines
+time series every --sample-interval seconds:
+
+    python3 -m provisioning load --soak --population 20000 --users 32 --duration 14400
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .agency import get_access_token
+from .files import write_file_atomic
+from .http import POOL_MAXSIZE, CircuitBreaker, ProvisioningClient
+from .tracing import percentile
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PERCENTILES = [('p50', 0.5), ('p90', 0.9), ('p95', 0.95), ('p99', 0.99)]
+
+OFFER_PATH = '/v1.0/oidvc/vci/offers'
+EXCHANGE_PATH = '/v1.0/oidvc/vp/exchange'
+
+# Samples compared at the start and end of the run
+DRIFT_WINDOW = 3
+# Allowance for clock skew and the agency's expiry sweep (s)
+EXPIRY_GRACE = 5
+EXCHANGE_DONE_STATES = {'success', 'error'}
+
+# Configuration keys the load generator needs
+REQUIRED_KEYS = [
+    'DMV_AGENT_ID', 'DMV_AGENT_PASSWORD', 'BANK_AGENT_ID', 'BANK_AGENT_PASSWORD',
+    'CREDENTIAL_DEFINITION_ID', 'EXCHANGE_TEMPLATE_ID'
+]
+
+def load_target(config_path):
+    """
+    Read the provisioned objects from the configuration written by the
+    provision command.
+
+    Args:
+        config_path: Path to the JSON configuration
+
+    Returns:
+        Configuration dictionary, with the agency and token endpoint URLs
+        taken from the environment when set
+    """
+    with open(config_path) as f:
+        target = json.load(f)
+    target['ACCOUNT_URL'] = os.environ.get('AGENCY_URL', target.get('ACCOUNT_URL'))
+    target['REACT_APP_TOKEN_ENDPOINT'] = os.environ.get('OIDC_TOKEN_ENDPOINT', target.get('REACT_APP_TOKEN_ENDPOINT'))
+
+    missing = [key for key in REQUIRED_KEYS + ['ACCOUNT_URL', 'REACT_APP_TOKEN_ENDPOINT'] if not target.get(key)]
+    if missing:
+        raise ValueError(f"{config_path} is missing {', '.join(missing)}")
+    return target
+
+def build_offer_payload(credential_definition_id):
+    """Build a credential offer for a made up holder, as the DMV app does."""
+    return {
+        "credential_configuration_ids": [credential_definition_id],
+        "credential_data": {
+            "org.iso.18013.5.1:document_number": str(random.randint(100000000, 999999999)),
+            "org.iso.18013.5.1:issue_date": "2024-01-01",
+            "org.iso.18013.5.1:expiry_date": "2029-01-01",
+            "org.iso.18013.5.1:given_name": "John",
+            "org.iso.18013.5.1:family_name": f"Smith-{uuid.uuid4().hex[:8]}",
+            "org.iso.18013.5.1:birth_date": "1980-01-01",
+            "org.iso.18013.5.1:issuing_authority": "Department of Motor Vehicles",
+            "org.iso.18013.5.1:resident_country": "AU"
+        }
+    }
+
+class LoadStats:
+    """
+    Latencies, status codes and errors of every operation, by operation name.
+    """
+
+    def __init__(self):
+        self.operations = {}
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def record(self, operation, response_time, service_time, status=None, error=None):
+        """
+        Record one operation.
+
+        Args:
+            operation: Operation name
+            response_time: Seconds from the scheduled start to completion
+            service_time: Seconds from the actual start to completion
+            status: HTTP status of the response, if there was one
+            error: Exception class name if the request failed
+        """
+        outcome = error or str(status)
+        failed = error is not None or status >= 400
+        with self._lock:
+            stats = self.operations.setdefault(operation, {
+                'response_times': [], 'service_times': [], 'outcomes': {}, 'errors': 0
+            })
+            stats['response_times'].append(response_time)
+            stats['service_times'].append(service_time)
+            stats['outcomes'][outcome] = stats['outcomes'].get(outcome, 0) + 1
+            stats['errors'] += failed
+
+    def reject(self, operation, status, error):
+        """
+        Count an operation already recorded with its status as failed,
+        when the body of its response cannot be used.
+
+        Args:
+            operation: Operation name
+            status: HTTP status the operation was recorded with
+            error: Exception class name of the parsing error
+        """
+        with self._lock:
+            outcomes = self.operations[operation]['outcomes']
+            outcomes[str(status)] -= 1
+            if not outcomes[str(status)]:
+                del outcomes[str(status)]
+            outcomes[error] = outcomes.get(error, 0) + 1
+            self.operations[operation]['errors'] += status < 400
+
+    def drop(self):
+        """Record an open loop request which was not sent."""
+        with self._lock:
+            self.dropped += 1
+
+    def report(self, elapsed, settings):
+        """
+        Summarise the run.
+
+        Args:
+            elapsed: Length of the run in seconds
+            settings: Run settings included in the report
+
+        Returns:
+            Report dictionary
+        """
+        def latencies(values):
+            values = sorted(values)
+            summary = {name: round(percentile(values, fraction) * 1000, 2) for name, fraction in PERCENTILES}
+            summary['max'] = round(values[-1] * 1000, 2)
+            summary['mean'] = round(sum(values) / len(values) * 1000, 2)
+            return summary
+
+        operations = {}
+        total = errors = 0
+        with self._lock:
+            for operation, stats in sorted(self.operations.items()):
+                count = len(stats['response_times'])
+                total += count
+                errors += stats['errors']
+                operations[operation] = {
+                    'count': count,
+                    'errors': stats['errors'],
+                    'error_rate': round(stats['errors'] / count, 4),
+                    'throughput': round(count / elapsed, 2),
+                    'response_time': latencies(stats['response_times']),
+                    'service_time': latencies(stats['service_times']),
+                    'outcomes': stats['outcomes']
+                }
+
+        return {
+            'settings': settings,
+            'elapsed': round(elapsed, 3),
+            'requests': total,
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0,
+            'dropped': self.dropped,
+            'throughput': round(total / elapsed, 2),
+            'operations': operations
+        }
+
+class Workload:
+    """
+    The offer and exchange operations, run against the provisioned objects
+    through one pooled ProvisioningClient.
+    """
+
+    def __init__(self, client, target, scenario, offer_ratio=0.5, poll=False):
+        """
+        Args:
+            client: ProvisioningClient for the agency
+            target: Configuration returned by load_target()
+            scenario: 'offer', 'exchange' or 'mixed'
+            offer_ratio: Fraction of offers in the mixed scenario
+            poll: Also read each created offer or exchange back, as the
+                apps do when polling for its state
+        """
+        self.client = client
+        self.target = target
+        self.scenario = scenario
+        self.offer_ratio = offer_ratio
+        self.poll = poll
+
+    def _headers(self, agent_id, agent_password):
+        # Tokens come from the shared cache and are refreshed before expiry
+        access_token = get_access_token(self.client, agent_id, agent_password)
+        if not access_token:
+            raise requests.exceptions.RequestException(f"could not obtain an access token for {agent_id}")
+        return {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Authorization': f'Bearer {access_token}'
+        }
+
+    def _create(self, path, headers, payload):
+        url = f"{self.client.agency_url}{path}"
+        response = self.client.post(url, headers=headers, json=payload)
+        if self.poll and response.status_code in (200, 201):
+            object_id = response.json().get('id')
+            response = self.client.get(f"{url}/{object_id}", headers=headers)
+        return response
+
+    def create_offer(self):
+        headers = self._headers(self.target['DMV_AGENT_ID'], self.target['DMV_AGENT_PASSWORD'])
+        return self._create(OFFER_PATH, headers,
+                            build_offer_payload(self.target['CREDENTIAL_DEFINITION_ID']))
+
+    def create_exchange(self):
+        headers = self._headers(self.target['BANK_AGENT_ID'], self.target['BANK_AGENT_PASSWORD'])
+        return self._create(EXCHANGE_PATH, headers,
+                            {'template_id': self.target['EXCHANGE_TEMPLATE_ID'], 'with_qr_code': False})
+
+    def lookup_exchange(self, exchange_id):
+        headers = self._headers(self.target['BANK_AGENT_ID'], self.target['BANK_AGENT_PASSWORD'])
+        return self.client.get(f"{self.client.agency_url}{EXCHANGE_PATH}/{exchange_id}", headers=headers)
+
+    def count_exchanges(self):
+        """Number of exchanges held by the agency, or None if it is not reported."""
+        headers = self._headers(self.target['BANK_AGENT_ID'], self.target['BANK_AGENT_PASSWORD'])
+        response = self.client.get(f"{self.client.agency_url}{EXCHANGE_PATH}", headers=headers,
+                                   params={'limit': 1})
+        if response.status_code != 200:
+            return None
+        return response.json().get('count')
+
+    def next_operation(self):
+        """Pick the next operation of the scenario, returning (name, callable)."""
+        if self.scenario == 'offer' or (self.scenario == 'mixed' and random.random() < self.offer_ratio):
+            return 'offer', self.create_offer
+        return 'exchange', self.create_exchange
+
+    def run_one(self, stats, scheduled=None):
+        """Run the next operation and record it, scheduled is its intended start time."""
+        name, operation = self.next_operation()
+        timed(stats, name, operation, scheduled=scheduled)
+
+def timed(stats, name, operation, *args, scheduled=None):
+    """
+    Run an operation and record it.
+
+    Returns:
+        The response, or None if the request failed
+    """
+    start = time.monotonic()
+    try:
+        response = operation(*args)
+    except requests.exceptions.RequestException as e:
+        end = time.monotonic()
+        stats.record(name, end - (scheduled or start), end - start, error=type(e).__name__)
+        return None
+    end = time.monotonic()
+    stats.record(name, end - (scheduled or start), end - start, status=response.status_code)
+    return response
+
+def run_closed_loop(workload, stats, users, duration, think_time=0.0):
+    """
+    Run `users` virtual users, each starting its next request as soon as
+    the previous one completed (plus an optional think time).
+    """
+    deadline = time.monotonic() + duration
+
+    def user():
+        while time.monotonic() < deadline:
+            workload.run_one(stats)
+            if think_time:
+                time.sleep(random.uniform(0, 2 * think_time))
+
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def run_open_loop(workload, stats, rate, duration, max_in_flight, poisson=False):
+    """
+    Start requests at `rate` per second whatever the response times, with
+    evenly spaced or Poisson distributed arrivals.
+
+    Requests which would exceed max_in_flight are not sent and are counted
+    as dropped, so an overloaded agency shows up in the report rather than
+    as an ever growing backlog in this process.
+    """
+    in_flight = threading.BoundedSemaphore(max_in_flight)
+    origin = time.monotonic()
+    scheduled = origin
+
+    def run(scheduled):
+        try:
+            workload.run_one(stats, scheduled)
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        while True:
+            scheduled += random.expovariate(rate) if poisson else 1 / rate
+            if scheduled - origin >= duration:
+                break
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if not in_flight.acquire(blocking=False):
+                stats.drop()
+                continue
+            executor.submit(run, scheduled)
+
+def max_rss_kb():
+    """Peak resident memory of this process in KiB, or None where unavailable."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class ExchangeSoak:
+    """
+    Keep a population of open presentation exchanges and sample the create
+    and lookup latencies over time.
+
+    Exchanges are created until `population` are open. After that the
+    oldest exchange is looked up once its TTL has passed, to check that the
+    agency expired it, and otherwise a random open exchange is looked up.
+    Expired and completed exchanges are replaced by new ones, exchanges
+    still pending after their TTL are counted as overdue and abandoned.
+
+    Only the latencies of the current sample are kept, so memory use does
+    not grow with the length of the run.
+    """
+
+    def __init__(self, workload, population, ttl, timeseries):
+        """
+        Args:
+            workload: Workload creating and looking up the exchanges
+            population: Number of open exchanges to maintain
+            ttl: Exchange lifetime configured in the verifier profile (s)
+            timeseries: File object the samples are appended to
+        """
+        self.workload = workload
+        self.population = population
+        self.ttl = ttl
+        self.timeseries = timeseries
+        self.samples = []
+        self.counters = {'created': 0, 'expired': 0, 'completed': 0, 'overdue': 0, 'lost': 0}
+        self._window = LoadStats()
+        self._sampled_counters = dict(self.counters)
+        # Open exchange IDs, for random lookups, and in creation order
+        self._ids = []
+        self._positions = {}
+        self._created = {}
+        self._by_age = deque()
+        self._lock = threading.Lock()
+
+    def _add(self, exchange_id):
+        with self._lock:
+            self._positions[exchange_id] = len(self._ids)
+            self._ids.append(exchange_id)
+            self._created[exchange_id] = time.monotonic()
+            self._by_age.append((self._created[exchange_id], exchange_id))
+            self.counters['created'] += 1
+
+    def _age(self, exchange_id):
+        with self._lock:
+            return time.monotonic() - self._created.get(exchange_id, time.monotonic())
+
+    def _close(self, exchange_id, outcome):
+        with self._lock:
+            position = self._positions.pop(exchange_id, None)
+            if position is None:
+                return
+            del self._created[exchange_id]
+            last = self._ids.pop()
+            if last != exchange_id:
+                self._ids[position] = last
+                self._positions[last] = position
+            self.counters[outcome] += 1
+
+    def _next_lookup(self):
+        """Pick the next exchange to look up, returning (id, due for expiry)."""
+        with self._lock:
+            while self._by_age and self._by_age[0][1] not in self._positions:
+                self._by_age.popleft()
+            if self._by_age and time.monotonic() - self._by_age[0][0] > self.ttl + EXPIRY_GRACE:
+                return self._by_age.popleft()[1], True
+            if len(self._ids) < self.population:
+                return None, False
+            return random.choice(self._ids), False
+
+    def step(self):
+        """Create or look up one exchange."""
+        exchange_id, due = self._next_lookup()
+        # The operation is counted in the window it started in, even if
+        # sample() starts the next one meanwhile
+        window = self._window
+        if exchange_id is None:
+            response = timed(window, 'create', self.workload.create_exchange)
+            if response is not None and response.status_code in (200, 201):
+                try:
+                    self._add(response.json()['id'])
+                except (KeyError, TypeError, ValueError) as e:
+                    window.reject('create', response.status_code, type(e).__name__)
+            return
+
+        response = timed(window, 'lookup', self.workload.lookup_exchange, exchange_id)
+        if response is None:
+            return
+        if response.status_code in (404, 410):
+            # Purged by the agency, which is only expected once it expired
+            self._close(exchange_id, 'expired' if self._age(exchange_id) >= self.ttl else 'lost')
+        elif response.status_code == 200:
+            try:
+                state = response.json().get('execution_state')
+            except (AttributeError, ValueError) as e:
+                window.reject('lookup', response.status_code, type(e).__name__)
+                return
+            if state == 'expired':
+                self._close(exchange_id, 'expired')
+            elif state in EXCHANGE_DONE_STATES:
+                self._close(exchange_id, 'completed')
+            elif due:
+                self._close(exchange_id, 'overdue')
+
+    def sample(self, elapsed, interval):
+        """Summarise the latest interval and append it to the time series."""
+        with self._lock:
+            window, self._window = self._window, LoadStats()
+            counters = dict(self.counters)
+            open_exchanges = len(self._ids)
+        delta = {name: counters[name] - self._sampled_counters[name] for name in counters}
+        self._sampled_counters = counters
+
+        try:
+            agency_exchanges = self.workload.count_exchanges()
+        except requests.exceptions.RequestException:
+            agency_exchanges = None
+
+        operations = window.report(interval, None)['operations']
+        sample = {
+            'time': round(elapsed, 1),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'open': open_exchanges,
+            'agency_exchanges': agency_exchanges,
+            'client_max_rss_kb': max_rss_kb(),
+            'totals': counters,
+            'interval': delta
+        }
+        for name in ('create', 'lookup'):
+            stats = operations.get(name)
+            sample[name] = stats and dict(count=stats['count'], errors=stats['errors'],
+                                          throughput=stats['throughput'], **stats['service_time'])
+
+        self.timeseries.write(json.dumps(sample) + "\n")
+        self.timeseries.flush()
+        self.samples.append(sample)
+        return sample
+
+    def run(self, users, duration, sample_interval, think_time=0.0):
+        """Run the soak for `duration` seconds with `users` concurrent workers."""
+        start = time.monotonic()
+        deadline = start + duration
+
+        def worker():
+            while time.monotonic() < deadline:
+                self.step()
+                if think_time:
+                    time.sleep(random.uniform(0, 2 * think_time))
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(users)]
+        for thread in threads:
+            thread.start()
+
+        previous = start
+        while previous < deadline:
+            time.sleep(max(0, min(previous + sample_interval, deadline) - time.monotonic()))
+            now = time.monotonic()
+            sample = self.sample(now - start, now - previous)
+            previous = now
+            print(f"[{sample['time']:>8.0f}s] open {sample['open']} expired {sample['totals']['expired']} "
+                  f"overdue {sample['totals']['overdue']} create p95 {(sample['create'] or {}).get('p95')} ms "
+                  f"lookup p95 {(sample['lookup'] or {}).get('p95')} ms", file=sys.stderr)
+
+        for thread in threads:
+            thread.join()
+        return time.monotonic() - start
+
+def analyse_soak(samples, ttl, drift_threshold):
+    """
+    Look for latency drift and memory growth symptoms in a soak time series.
+
+    The first TTL of the run, while the population is being built up and
+    nothing has expired yet, is left out of the comparison when the run is
+    long enough.
+
+    Args:
+        samples: Samples recorded by ExchangeSoak
+        ttl: Exchange lifetime (s)
+        drift_threshold: Growth factor between the start and the end of the
+            run which is reported
+
+    Returns:
+        List of findings, empty if there are none
+    """
+    steady = [sample for sample in samples if sample['time'] > ttl]
+    if len(steady) < 2 * DRIFT_WINDOW:
+        steady = samples
+    if len(steady) < 2:
+        return ["Too few samples to analyse, run longer or lower --sample-interval"]
+
+    def median(values):
+        values = sorted(value for value in values if value is not None)
+        return values[len(values) // 2] if values else None
+
+    def compare(values):
+        window = max(1, min(DRIFT_WINDOW, len(values) // 2))
+        return median(values[:window]), median(values[-window:])
+
+    findings = []
+    for name in ('create', 'lookup'):
+        first, last = compare([(sample[name] or {}).get('p95') for sample in steady])
+        if first and last and last > first * drift_threshold:
+            findings.append(f"{name} p95 latency drifted from {first} ms to {last} ms ({last / first:.1f}x)")
+
+    first, last = compare([sample['agency_exchanges'] for sample in steady])
+    if first and last and last > first * drift_threshold:
+        findings.append(f"The agency holds {last} exchanges for {steady[-1]['open']} open, up from {first}: "
+                        "expired exchanges do not appear to be purged")
+
+    first, last = compare([sample['client_max_rss_kb'] for sample in steady])
+    if first and last and last > first * drift_threshold:
+        findings.append(f"loadgen.py memory grew from {first} KiB to {last} KiB, results may be skewed")
+
+    totals = samples[-1]['totals']
+    if totals['overdue']:
+        findings.append(f"{totals['overdue']} exchanges were still pending {EXPIRY_GRACE}s after their TTL")
+    if totals['lost']:
+        findings.append(f"{totals['lost']} exchanges disappeared before their TTL")
+    if not totals['expired'] and samples[-1]['time'] > ttl + EXPIRY_GRACE:
+        findings.append("No exchanges expired during the run")
+    return findings
+
+def run_soak(args, workload):
+    """
+    Run a soak and build its report.
+
+    Returns:
+        Report dictionary
+    """
+    with open(args.timeseries, 'a') as timeseries:
+        soak = ExchangeSoak(workload, args.population, args.exchange_ttl, timeseries)
+        elapsed = soak.run(args.users, args.duration, args.sample_interval, args.think_time)
+
+    requests_made = sum((sample[name] or {}).get('count', 0) for sample in soak.samples
+                        for name in ('create', 'lookup'))
+    errors = sum((sample[name] or {}).get('errors', 0) for sample in soak.samples
+                 for name in ('create', 'lookup'))
+    return {
+        'settings': {
+            'mode': 'soak', 'users': args.users, 'think_time': args.think_time, 'duration': args.duration,
+            'population': args.population, 'exchange_ttl': args.exchange_ttl,
+            'sample_interval': args.sample_interval, 'drift_threshold': args.drift_threshold
+        },
+        'elapsed': round(elapsed, 3),
+        'requests': requests_made,
+        'errors': errors,
+        'error_rate': round(errors / requests_made, 4) if requests_made else 0,
+        'throughput': round(requests_made / elapsed, 2),
+        'exchanges': soak.counters,
+        'timeseries': args.timeseries,
+        'samples': len(soak.samples),
+        'findings': analyse_soak(soak.samples, args.exchange_ttl, args.drift_threshold)
+    }
+
+def main(args):
+    """Run the load command."""
+    try:
+        target = load_target(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    concurrency = args.max_in_flight if args.rate else args.users
+    # Requests are not retried, so that the report reflects the agency
+    with ProvisioningClient(target['ACCOUNT_URL'], target['REACT_APP_TOKEN_ENDPOINT'],
+                            max(POOL_MAXSIZE, concurrency), max_attempts=1,
+                            transport=args.transport) as client:
+        # Load is expected to push the agency into errors, which must be
+        # measured rather than short-circuited
+        client.circuit_breaker = CircuitBreaker(failure_threshold=float('inf'))
+        workload = Workload(client, target, args.scenario, args.offer_ratio, args.poll)
+        if args.soak:
+            report = run_soak(args, workload)
+        else:
+            stats = LoadStats()
+            start = time.monotonic()
+            if args.rate:
+                run_open_loop(workload, stats, args.rate, args.duration, args.max_in_flight, args.poisson)
+                settings = {'mode': 'open', 'rate': args.rate, 'poisson': args.poisson,
+                            'max_in_flight': args.max_in_flight}
+            else:
+                run_closed_loop(workload, stats, args.users, args.duration, args.think_time)
+                settings = {'mode': 'closed', 'users': args.users, 'think_time': args.think_time}
+            settings.update(scenario=args.scenario, duration=args.duration, poll=args.poll)
+            if args.scenario == 'mixed':
+                settings['offer_ratio'] = args.offer_ratio
+            report = stats.report(time.monotonic() - start, settings)
+
+    for finding in report.get('findings', []):
+        print(f"Warning: {finding}", file=sys.stderr)
+    if args.output:
+        write_file_atomic(args.output, json.dumps(report, indent=2) + "\n")
+        print(f"Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,366 @@
+"""
+A local stand-in for the digital credentials agency and its OIDC token
+endpoint, implementing the endpoints used by the provisioning commands with
+configurable latency, jitter, error injection and capacity.
+
+It is intended for benchmarking and testing the provisioning without a live
+agency:
+
+    python3 -m provisioning mock --port 9080 --latency 20 --jitter 5
+    AGENCY_URL=http://localhost:9080/diagency \\
+    OIDC_TOKEN_ENDPOINT=http://localhost:9080/oauth2/token ... python3 -m provisioning provision
+"""
+
+import hashlib
+import json
+import random
+import ssl
+import threading
+import time
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Collections served by the mock, keyed by their path relative to the
+# agency URL
+COLLECTIONS = [
+    '/v1.0/diagency/agents',
+    '/v2.0/diagency/credential_schemas',
+    '/v2.0/diagency/credential_definitions',
+    '/v1.0/oidvc/vp/exchange_templates',
+    '/v1.0/diagency/trust/remote_providers/registries',
+    # Created by the apps, and by the load command
+    '/v1.0/oidvc/vci/offers',
+    '/v1.0/oidvc/vp/exchange'
+]
+
+AGENCY_PREFIX = '/diagency'
+TOKEN_PATH = '/oauth2/token'
+TOKEN_LIFETIME = 3600
+# VICALs published for the issuer agents
+VICAL_PATH_PREFIX = '/v1.0/diagency/trust/anchor/'
+# Collections whose objects record the agent whose token created them
+OWNED_COLLECTIONS = [
+    '/v2.0/diagency/credential_schemas',
+    '/v2.0/diagency/credential_definitions',
+    '/v1.0/oidvc/vp/exchange_templates'
+]
+
+class MockAgency:
+    """
+    In-memory agency state and the HTTP server exposing it.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 certfile=None, keyfile=None, fetch_delay=0.0, exchange_ttl=120.0, capacity=0, retry_after=1.0):
+        """
+        Args:
+            host: Address to listen on
+            port: Port to listen on, 0 picks a free port
+            latency: Delay added to every response, in seconds
+            jitter: Maximum random variation of the delay, in seconds
+            error_rate: Fraction of requests answered with a 503
+            certfile: Optional certificate to serve HTTPS
+            keyfile: Private key of the certificate
+            fetch_delay: When set, registry fetches are answered with a 202
+                and complete asynchronously after this many seconds
+            exchange_ttl: Seconds after which presentation exchanges
+                expire. Expired exchanges are kept, as a real agency may
+                keep them until they are purged
+            capacity: When set, requests beyond this many in flight are
+                answered with a 429, as an overloaded gateway does
+            retry_after: Retry-After of those 429 responses, in seconds
+        """
+        self.latency = latency
+        self.fetch_delay = fetch_delay
+        self.exchange_ttl = exchange_ttl
+        self.capacity = capacity
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.vical_modified = time.time()
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.collections = {path: {} for path in COLLECTIONS}
+        # Client ID of each access token issued
+        self.tokens = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        self.scheme = 'http'
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+            self.scheme = 'https'
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"{self.scheme}://{host}:{port}"
+
+    @property
+    def agency_url(self):
+        return f"{self.base_url}{AGENCY_PREFIX}"
+
+    @property
+    def token_endpoint(self):
+        return f"{self.base_url}{TOKEN_PATH}"
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def reset(self):
+        """Forget all objects and request counts."""
+        with self.lock:
+            self.collections = {path: {} for path in COLLECTIONS}
+            self.tokens = {}
+            self.stats = {}
+
+    def complete_fetch(self, registry):
+        """Mark an asynchronous registry fetch as done."""
+        with self.lock:
+            registry['state'] = 'fetched'
+            registry['last_fetched'] = time.time()
+
+    def snapshot_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['total'] = sum(stats.values())
+        return stats
+
+def _matches(item, item_filter):
+    """Evaluate the subset of the agency filter syntax used by the tools."""
+    for key, value in item_filter.items():
+        if key == '$or':
+            if not any(_matches(item, alternative) for alternative in value):
+                return False
+        elif item.get(key) != value:
+            return False
+    return True
+
+def _make_handler(agency):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body=None, headers=None):
+            data = json.dumps(body).encode('utf-8') if body is not None else b''
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            # A HEAD response has headers only, a body would be read as the
+            # start of the next response on the connection
+            if self.command != 'HEAD':
+                self.wfile.write(data)
+
+        def _read_body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return self.rfile.read(length) if length else b''
+
+        def _route(self, path):
+            """Split a path into (collection, object id, action)."""
+            if path.startswith(AGENCY_PREFIX):
+                path = path[len(AGENCY_PREFIX):]
+            for collection in COLLECTIONS:
+                if path == collection:
+                    return collection, None, None
+                if path.startswith(collection + '/'):
+                    parts = path[len(collection) + 1:].split('/')
+                    return collection, parts[0], parts[1] if len(parts) > 1 else None
+            return None, None, None
+
+        def _handle(self, method):
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            body = self._read_body()
+            # Control endpoints used by the benchmark harness
+            if url.path == '/__stats':
+                return self._send(200, agency.snapshot_stats())
+            if url.path == '/__reset' and method == 'POST':
+                agency.reset()
+                return self._send(204)
+
+            collection, object_id, action = self._route(url.path)
+            agency.count(f"{method} {collection or url.path}{'/{id}' if object_id else ''}"
+                         f"{'/' + action if action else ''}")
+
+            with agency.lock:
+                agency.in_flight += 1
+                overloaded = agency.capacity and agency.in_flight > agency.capacity
+            try:
+                if overloaded:
+                    return self._send(429, {'error': 'too many requests'},
+                                      {'Retry-After': f"{agency.retry_after:g}"})
+                return self._respond(method, url, query, body, collection, object_id, action)
+            finally:
+                with agency.lock:
+                    agency.in_flight -= 1
+
+        def _respond(self, method, url, query, body, collection, object_id, action):
+            delay = agency.latency + random.uniform(-agency.jitter, agency.jitter)
+            if delay > 0:
+                time.sleep(delay)
+            if agency.error_rate and random.random() < agency.error_rate:
+                return self._send(503, {'error': 'injected failure'})
+
+            if url.path == TOKEN_PATH and method == 'POST':
+                access_token = uuid.uuid4().hex
+                client_id = parse_qs(body.decode('utf-8')).get('client_id', [None])[0]
+                with agency.lock:
+                    agency.tokens[access_token] = client_id
+                return self._send(200, {
+                    'access_token': access_token,
+                    'token_type': 'Bearer',
+                    'expires_in': TOKEN_LIFETIME
+                })
+            if url.path.startswith(AGENCY_PREFIX + VICAL_PATH_PREFIX) and method in ('GET', 'HEAD'):
+                return self._send_vical(method, url.path)
+            if collection is None:
+                return self._send(404, {'error': f"unknown path {url.path}"})
+
+            include_pass = query.get('includepass', ['false'])[0] == 'true'
+            # Build the response while holding the lock, but send it after
+            # releasing it
+            with agency.lock:
+                status, response = self._apply(method, agency.collections[collection], collection,
+                                               object_id, action, query, body, include_pass)
+            if status == 405:
+                response = {'error': f"{method} not supported on {url.path}"}
+            return self._send(status, response)
+
+        def _send_vical(self, method, path):
+            """Serve a VICAL, honouring conditional requests."""
+            data = json.dumps({'vical_provider': 'mock', 'path': path}).encode('utf-8')
+            etag = f'"{hashlib.sha256(data).hexdigest()[:16]}"'
+            last_modified = formatdate(agency.vical_modified, usegmt=True)
+            if self.headers.get('If-None-Match') == etag:
+                status = 304
+            elif 'If-None-Match' not in self.headers and self.headers.get('If-Modified-Since') == last_modified:
+                status = 304
+            else:
+                status = 200
+            self.send_response(status)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(data)) if status == 200 else '0')
+            self.end_headers()
+            if status == 200 and method == 'GET':
+                self.wfile.write(data)
+
+        def _apply(self, method, items, collection, object_id, action, query, body, include_pass):
+            """Apply a request to a collection, returning (status, body)."""
+            if method == 'GET' and object_id is None:
+                return 200, self._list(items, query, include_pass)
+            if method == 'GET':
+                if object_id not in items:
+                    return 404, {'error': 'not found'}
+                return 200, self._view(items[object_id], include_pass)
+            if method == 'POST' and object_id is None:
+                item = json.loads(body or b'{}')
+                if item.get('id') in items:
+                    return 409, {'error': f"{item['id']} already exists"}
+                item['id'] = item.get('id') or str(uuid.uuid4())
+                item['created'] = time.time()
+                if collection.endswith('/agents'):
+                    item['client_secret'] = uuid.uuid4().hex
+                    item['did'] = f"did:web:mock:{item['id']}"
+                if collection in OWNED_COLLECTIONS:
+                    authorization = self.headers.get('Authorization', '')
+                    client_id = agency.tokens.get(authorization[len('Bearer '):])
+                    if client_id in agency.collections['/v1.0/diagency/agents']:
+                        item['agent_id'] = client_id
+                if collection.endswith('/vp/exchange'):
+                    item['execution_state'] = 'pending'
+                    item['expires'] = item['created'] + agency.exchange_ttl
+                items[item['id']] = item
+                return 201, self._view(item, include_pass)
+            if method == 'POST' and action == 'fetch':
+                if object_id not in items:
+                    return 404, {'error': 'not found'}
+                if agency.fetch_delay:
+                    items[object_id]['state'] = 'fetching'
+                    timer = threading.Timer(agency.fetch_delay, agency.complete_fetch, [items[object_id]])
+                    timer.daemon = True
+                    timer.start()
+                    return 202, {'id': object_id, 'state': 'fetching'}
+                items[object_id]['state'] = 'fetched'
+                items[object_id]['last_fetched'] = time.time()
+                return 200, {'id': object_id, 'state': 'fetched'}
+            if method == 'DELETE' and object_id is not None:
+                if items.pop(object_id, None) is None:
+                    return 404, {'error': 'not found'}
+                return 204, None
+            return 405, None
+
+        def _view(self, item, include_pass):
+            if item.get('execution_state') == 'pending' and time.time() >= item['expires']:
+                item['execution_state'] = 'expired'
+            if include_pass or 'client_secret' not in item:
+                return dict(item)
+            return {key: value for key, value in item.items() if key != 'client_secret'}
+
+        def _list(self, items, query, include_pass):
+            selected = list(items.values())
+            if 'filter' in query:
+                item_filter = json.loads(query['filter'][0])
+                selected = [item for item in selected if _matches(item, item_filter)]
+            total = len(selected)
+            offset = int(query.get('offset', ['0'])[0])
+            limit = int(query.get('limit', [str(total or 1)])[0])
+            page = selected[offset:offset + limit]
+            if 'include' in query:
+                fields = query['include'][0].split(',')
+                page = [{field: item.get(field) for field in fields} for item in page]
+            else:
+                page = [self._view(item, include_pass) for item in page]
+            return {'items': page, 'count': total}
+
+        def do_GET(self):
+            self._handle('GET')
+
+        def do_POST(self):
+            self._handle('POST')
+
+        def do_HEAD(self):
+            self._handle('HEAD')
+
+        def do_DELETE(self):
+            self._handle('DELETE')
+
+    return Handler
+
+def main(args):
+    """Run the mock agency until interrupted."""
+    agency = MockAgency(args.host, args.port, args.latency / 1000, args.jitter / 1000, args.error_rate,
+                        args.cert, args.key, args.fetch_delay / 1000, args.exchange_ttl, args.capacity,
+                        args.retry_after)
+    print(f"Mock agency listening, AGENCY_URL={agency.agency_url} OIDC_TOKEN_ENDPOINT={agency.token_endpoint}")
+    try:
+        agency.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agency.server.server_close()
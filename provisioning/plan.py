@@ -0,0 +1,112 @@
+"""
+Preview of the changes a provisioning run would make.
+"""
+
+from .credentials import build_credential_definition_payload, build_exchange_template_payload
+from .schemas import get_credential_schema, payload_fingerprint
+from .settings import BANK_AGENT_NAME, DMV_AGENT_NAME
+from .state import ProvisioningState
+from .trust import build_trusted_authority_payload, create_isvdc_issuer_vical_url
+
+def plan_object(state, snapshot, agency_url, kind, name, payload_or_fingerprint):
+    """
+    Decide what a run would do with one object.
+    
+    Args:
+        state: ProvisioningState, or None when not reconciling
+        snapshot: AgencySnapshot
+        agency_url: Agency URL the state entries are keyed by
+        kind: Object kind, a key of OBJECT_COLLECTIONS
+        name: Name of the agent owning the object
+        payload_or_fingerprint: Desired payload or its fingerprint, None
+            if the payload depends on an object which will change
+        
+    Returns:
+        Plan entry dictionary with the action, create, update or skip
+    """
+    entry = {'kind': kind, 'name': name, 'id': None}
+    if state is None:
+        return dict(entry, action='create', reason="always created without --reconcile")
+
+    recorded = state.get(ProvisioningState.key(agency_url, kind, name))
+    if not recorded:
+        return dict(entry, action='create', reason="not in the state file")
+    if not snapshot.exists(kind, recorded['id']):
+        return dict(entry, action='create', reason=f"recorded {recorded['id']} no longer exists")
+
+    entry['id'] = recorded['id']
+    fingerprint = payload_or_fingerprint
+    if isinstance(fingerprint, dict):
+        fingerprint = payload_fingerprint(fingerprint)
+    if fingerprint != recorded['fingerprint']:
+        reason = "depends on a changed object" if fingerprint is None else "payload changed"
+        return dict(entry, action='update', reason=f"{reason}, will be replaced and the old one deleted")
+    return dict(entry, action='skip', reason="unchanged")
+
+def plan_provisioning(snapshot, state, agency_url, vical_base_url,
+                      dmv_agent_name=DMV_AGENT_NAME, bank_agent_name=BANK_AGENT_NAME):
+    """
+    Diff the objects a run would create for one issuer/verifier pair
+    against a snapshot of the agency, without making any request.
+    
+    Args:
+        snapshot: AgencySnapshot of the agency
+        state: ProvisioningState, or None when not reconciling
+        agency_url: Agency URL
+        vical_base_url: Base URL used to build the issuer VICAL URL
+        dmv_agent_name: Name of the issuer agent
+        bank_agent_name: Name of the verifier agent
+        
+    Returns:
+        List of plan entries, in provisioning order
+    """
+    plan = []
+    agent_ids = {}
+    for agent_name in (dmv_agent_name, bank_agent_name):
+        agent_ids[agent_name] = snapshot.lookup(agent_name)
+        if agent_ids[agent_name]:
+            plan.append({'action': 'skip', 'kind': 'agent', 'name': agent_name, 'id': agent_ids[agent_name],
+                         'reason': "exists"})
+        else:
+            plan.append({'action': 'create', 'kind': 'agent', 'name': agent_name, 'id': None,
+                         'reason': "no agent with this name"})
+
+    schema = plan_object(state, snapshot, agency_url, 'credential_schema', dmv_agent_name,
+                         get_credential_schema().fingerprint)
+    plan.append(schema)
+
+    # The definition payload embeds the schema ID, which is only known if
+    # the schema is kept
+    definition_payload = None
+    if schema['action'] == 'skip':
+        definition_payload = build_credential_definition_payload(schema['id'])
+    plan.append(plan_object(state, snapshot, agency_url, 'credential_definition', dmv_agent_name,
+                            definition_payload))
+
+    plan.append(plan_object(state, snapshot, agency_url, 'exchange_template', bank_agent_name,
+                            build_exchange_template_payload()))
+
+    # Likewise the registry endpoint embeds the issuer agent ID
+    registry_payload = None
+    if agent_ids[dmv_agent_name]:
+        registry_payload = build_trusted_authority_payload(
+            create_isvdc_issuer_vical_url(vical_base_url, agent_ids[dmv_agent_name]))
+    registry = plan_object(state, snapshot, agency_url, 'trust_registry', dmv_agent_name, registry_payload)
+    existing_registry = registry_payload and snapshot.registry_index.lookup(registry_payload['endpoint'])
+    if registry['action'] != 'skip' and existing_registry:
+        # Registries are reused by endpoint rather than registered again
+        registry.update(action='skip', id=existing_registry, reason="a registry already pulls this VICAL")
+    plan.append(registry)
+    return plan
+
+def summarize_plan(plan):
+    """Count the planned actions, returning a one line summary."""
+    totals = {action: sum(1 for entry in plan if entry['action'] == action) for action in ('create', 'update', 'skip')}
+    return f"Plan: {totals['create']} to create, {totals['update']} to update, {totals['skip']} unchanged."
+
+def print_plan(plan):
+    """Print plan entries and a summary of the planned actions."""
+    for entry in plan:
+        object_id = f" ({entry['id']})" if entry['id'] else ""
+        print(f"  {entry['action']:<7} {entry['kind']:<22} {entry['name']}{object_id}: {entry['reason']}")
+    print(summarize_plan(plan))
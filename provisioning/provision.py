@@ -0,0 +1,310 @@
+"""
+The provision and plan commands.
+"""
+
+import json
+import os
+import sys
+import time
+
+from .agency import AgencyRequestError, AgencySnapshot, get_access_token
+from .config import build_provisioned_config, emit_config, read_app_settings, render_env
+from .http import POOL_MAXSIZE, ProvisioningClient
+from .images import logo_max_bytes
+from .files import write_file_atomic
+from .journal import StepJournal
+from .limiter import create_limiter
+from .plan import plan_provisioning, print_plan, summarize_plan
+from .schemas import get_credential_schema
+from .settings import DEFAULT_JOURNAL_FILE, MAX_STEP_WORKERS
+from .state import ProvisioningState
+from .steps import ProvisioningError, build_provisioning_steps, print_critical_path, run_provisioning_steps
+from .targets import load_targets, provision_targets
+from .tenants import check_tenant_manifest, load_tenant_manifest, provision_tenants, tenant_agent_names
+from .tracing import Tracer
+from .trust import load_trust_anchors, sync_trust_registries
+
+def finish_run(args, tracer, limiter=None, state=None):
+    """
+    Write the pending HTTP cache validators to the state file, if any,
+    print the summary of the concurrency limiter, if any, then write the
+    trace file and print the latency summary when tracing.
+    """
+    if state is not None:
+        state.save()
+    if limiter is not None:
+        print(limiter.summary())
+    if tracer is None:
+        return
+    tracer.write(args.trace)
+    print(f"Trace written to {args.trace}")
+    tracer.print_summary()
+
+def take_snapshot(client, admin_access_token):
+    """Load an AgencySnapshot, exiting if the agency could not be listed."""
+    print("Taking a snapshot of the agency...")
+    start = time.monotonic()
+    try:
+        snapshot = AgencySnapshot(client, admin_access_token).load()
+    except AgencyRequestError as e:
+        print(f"Error> could not list the agency objects: {e}")
+        sys.exit(1)
+    counts = ', '.join(f"{count} {kind}" for kind, count in snapshot.counts().items())
+    print(f"Snapshot of {counts} taken in {time.monotonic() - start:.2f}s")
+    return snapshot
+
+def run_trust_anchor_sync(args, client, admin_name, admin_password, state=None):
+    """Register every VICAL listed in the trust anchors file given on the command line."""
+    print("Getting an access token...")
+    admin_access_token = get_access_token(client, admin_name, admin_password)
+    if not admin_access_token:
+        print("Error> failed to obtain an access token.")
+        sys.exit(1)
+
+    anchors = load_trust_anchors(args.trust_anchors)
+    start = time.monotonic()
+    records = sync_trust_registries(client, admin_access_token, anchors, args.concurrency, state=state)
+    for record in records:
+        print(f"  {record['status']:<8} {record['url']} ({record['id']})"
+              f"{', fetched' if record['fetched'] else ''}")
+
+    counts = {status: sum(1 for record in records if record['status'] == status)
+              for status in ('created', 'existing', 'failed')}
+    print(f"Synced {len(records)} trust anchors ({counts['created']} created, {counts['existing']} existing, "
+          f"{counts['failed']} failed) in {time.monotonic() - start:.2f}s")
+    if counts['failed']:
+        sys.exit(1)
+
+def journal_path(args):
+    """
+    Path of the step journal, None unless --journal or --resume is given:
+    the journal holds agent secrets, so it is only written when asked for.
+    """
+    if args.journal:
+        return args.journal
+    return DEFAULT_JOURNAL_FILE if args.resume else None
+
+def open_journal(args, agency_url):
+    """Open the step journal, replaying it with --resume, or return None without one."""
+    path = journal_path(args)
+    if path is None:
+        return None
+    journal = StepJournal(path, agency_url).open(resume=args.resume)
+    if args.resume:
+        print(f"Resuming from {path} ({len(journal.scopes())} run(s) recorded)")
+    return journal
+
+def run_bulk(args, client, admin_name, admin_password, vical_base_url, state=None):
+    """Provision every tenant listed in the manifest given on the command line."""
+    try:
+        check_tenant_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"Error: invalid tenant manifest: {e}")
+        sys.exit(1)
+
+    print("Getting an access token...")
+    admin_access_token = get_access_token(client, admin_name, admin_password)
+    if not admin_access_token:
+        print("Error> failed to obtain an access token.")
+        sys.exit(1)
+
+    snapshot = None
+    if args.plan:
+        snapshot = take_snapshot(client, admin_access_token)
+        plan = []
+        for tenant in load_tenant_manifest(args.manifest):
+            print(f"Tenant {tenant['name']}:")
+            tenant_plan = plan_provisioning(snapshot, state, client.agency_url, vical_base_url,
+                                            *tenant_agent_names(tenant))
+            print_plan(tenant_plan)
+            plan.extend(tenant_plan)
+        print(f"All tenants> {summarize_plan(plan)}")
+        if not args.apply:
+            return
+
+    tenants = load_tenant_manifest(args.manifest)
+    start = time.monotonic()
+    journal = open_journal(args, client.agency_url)
+    try:
+        if args.output == '-':
+            succeeded, failed = provision_tenants(client, admin_name, admin_password, tenants, vical_base_url,
+                                                  sys.stdout, args.concurrency, state, snapshot, journal)
+        else:
+            with open(args.output, 'w') as output:
+                succeeded, failed = provision_tenants(client, admin_name, admin_password, tenants, vical_base_url,
+                                                      output, args.concurrency, state, snapshot, journal)
+    finally:
+        if journal is not None:
+            journal.close()
+
+    print(f"Provisioned {succeeded} tenants ({failed} failed) in {time.monotonic() - start:.2f}s")
+    if failed:
+        sys.exit(1)
+
+def run_targets(args, state=None, tracer=None):
+    """Provision every agency listed in the targets file given on the command line."""
+    try:
+        targets = load_targets(args.targets)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if not targets:
+        print(f"Error: no targets found in {args.targets}")
+        sys.exit(1)
+
+    # The application settings are shared by every target, check them before
+    # provisioning anything
+    app_settings, missing_vars = read_app_settings()
+    if missing_vars:
+        print(f"Error: The following required environment variables are missing: {', '.join(missing_vars)}")
+        sys.exit(1)
+
+    print(f"Provisioning {len(targets)} targets: {', '.join(target['name'] for target in targets)}")
+    start = time.monotonic()
+    records = provision_targets(targets, app_settings, args.config_formats.split(','), args.config_dir,
+                                journal_path(args), args.concurrency, args.resume, state, tracer, args.transport,
+                                args.adaptive, args.rate_limit)
+    elapsed = time.monotonic() - start
+
+    print("Targets:")
+    for record in records:
+        if record['status'] == 'ok':
+            detail = f"wrote {', '.join(record['files'])}"
+        else:
+            detail = f"failed at {record['failed_step']}: {record['error']}"
+        print(f"  {record['target']:<12} {record['status']:<7} {record['elapsed']:7.2f}s  {detail}")
+        if record.get('limiter'):
+            print(f"  {'':<12} concurrency limit {record['limiter']['limit']} "
+                  f"(between {record['limiter']['lowest_limit']} and {record['limiter']['highest_limit']})")
+
+    report = {'elapsed': round(elapsed, 3), 'targets': records}
+    write_file_atomic(args.report, json.dumps(report, indent=2) + "\n")
+    failed = sum(1 for record in records if record['status'] != 'ok')
+    print(f"Provisioned {len(records) - failed} of {len(records)} targets ({failed} failed) in {elapsed:.2f}s, "
+          f"slowest target {max(record['elapsed'] for record in records):.2f}s, "
+          f"all targets {sum(record['elapsed'] for record in records):.2f}s")
+    print(f"Report written to {args.report}")
+    if failed:
+        sys.exit(1)
+
+def main(args):
+    """Run the provision and plan commands."""
+    
+    # Get agency URLs from environment variables (required)
+    agency_url = os.environ.get('AGENCY_URL')
+    vical_base_url = os.environ.get('VICAL_BASE_URL')
+    oidc_token_endpoint = os.environ.get('OIDC_TOKEN_ENDPOINT')
+    
+    if not args.targets and (not agency_url or not oidc_token_endpoint):
+        print("Error: AGENCY_URL and OIDC_TOKEN_ENDPOINT environment variables must be provided.")
+        sys.exit(1)
+        
+    admin_name = os.environ.get('ADMIN_NAME', 'admin')
+    admin_password = os.environ.get('ADMIN_PASSWORD', 'secret')
+
+    # Compile the credential schema up front, which also validates CREDENTIAL_SCHEMA,
+    # and check LOGO_MAX_BYTES before any agent is created
+    try:
+        get_credential_schema()
+        logo_max_bytes()
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    state = ProvisioningState(args.state_file) if args.reconcile else None
+    tracer = Tracer() if args.trace else None
+    
+    if args.targets:
+        try:
+            run_targets(args, state, tracer)
+        finally:
+            finish_run(args, tracer, state=state)
+        return
+    
+    # All agency and token endpoint calls share one pooled, keep-alive
+    # transport, and the requests in flight are bounded by its size
+    if args.manifest:
+        pool_maxsize = max(POOL_MAXSIZE, args.concurrency * MAX_STEP_WORKERS)
+    elif args.trust_anchors:
+        pool_maxsize = max(POOL_MAXSIZE, args.concurrency)
+    else:
+        pool_maxsize = POOL_MAXSIZE
+    limiter = create_limiter(pool_maxsize, args.adaptive, args.rate_limit, tracer)
+
+    if args.manifest:
+        try:
+            with ProvisioningClient(agency_url, oidc_token_endpoint, pool_maxsize, tracer=tracer,
+                                    transport=args.transport, limiter=limiter) as client:
+                run_bulk(args, client, admin_name, admin_password, vical_base_url, state)
+        finally:
+            finish_run(args, tracer, limiter, state)
+        return
+    if args.trust_anchors:
+        try:
+            with ProvisioningClient(agency_url, oidc_token_endpoint, pool_maxsize, tracer=tracer,
+                                    transport=args.transport, limiter=limiter) as client:
+                run_trust_anchor_sync(args, client, admin_name, admin_password, state)
+        finally:
+            finish_run(args, tracer, limiter, state)
+        return
+    client = ProvisioningClient(agency_url, oidc_token_endpoint, pool_maxsize, tracer=tracer,
+                                transport=args.transport, limiter=limiter)
+    
+    # With --plan, the agency is listed once up front and the same snapshot
+    # serves the apply
+    snapshot = None
+    completed = None
+    if args.plan:
+        print("Getting an access token...")
+        admin_access_token = get_access_token(client, admin_name, admin_password)
+        if not admin_access_token:
+            print("Error> failed to obtain an access token.")
+            sys.exit(1)
+        snapshot = take_snapshot(client, admin_access_token)
+        print_plan(plan_provisioning(snapshot, state, agency_url, vical_base_url))
+        if not args.apply:
+            client.close()
+            finish_run(args, tracer, limiter, state)
+            return
+        completed = {'admin_token': admin_access_token}
+    
+    # Run the provisioning steps, overlapping the ones which do not depend
+    # on each other, and journal each completed step so that a failed run
+    # can be resumed
+    steps = build_provisioning_steps(client, admin_name, admin_password, vical_base_url, state=state,
+                                     snapshot=snapshot)
+    journal = open_journal(args, agency_url)
+    if journal is not None:
+        completed = dict(journal.completed(), **(completed or {}))
+    try:
+        results, timings = run_provisioning_steps(steps, completed=completed, tracer=tracer,
+                                                  checkpoint=journal.checkpoint() if journal else None)
+    except ProvisioningError as e:
+        print(f"Error> {e}")
+        if journal is None:
+            print("Run with --journal to record the completed steps, so that a failed run can be resumed.")
+        elif not args.resume:
+            print(f"Run again with --resume to continue from the {e.step} step.")
+        sys.exit(1)
+    finally:
+        if journal is not None:
+            journal.close()
+        client.close()
+        finish_run(args, tracer, limiter, state)
+    
+    print_critical_path(steps, timings)
+    
+    # Get application URLs and credentials from environment variables (required)
+    app_settings, missing_vars = read_app_settings()
+    if missing_vars:
+        print(f"Error: The following required environment variables are missing: {', '.join(missing_vars)}")
+        sys.exit(1)
+    
+    config = build_provisioned_config(results, agency_url, oidc_token_endpoint, app_settings)
+    
+    # Write the .env file, the Kubernetes manifest and the JSON config from
+    # the same model, leaving unchanged files alone
+    for path, changed in emit_config(config, args.config_formats.split(','), args.config_dir):
+        print(f"{'Wrote' if changed else 'Unchanged'} {path}")
+    
+    print("\n" + render_env(config, mask_secrets=True))
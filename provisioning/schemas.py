@@ -0,0 +1,275 @@
+"""
+Credential schemas, built from tables of the credential fields.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+
+# Credential schemas are declared as field tables, one row per data element:
+# (identifier, display name, type, format, required)
+MDL_DOCTYPE = "org.iso.18013.5.1.mDL"
+MDL_NAMESPACE = "org.iso.18013.5.1"
+AAMVA_NAMESPACE = "org.iso.18013.5.1.aamva"
+MDL_BASE_ID = "https://iso.org/schemas/mdl"
+
+# Data elements issued by the demo DMV
+MDL_DEMO_FIELDS = [
+    ("document_number", "Document number", "string", None, True),
+    ("issue_date", "Issue date", "string", None, True),
+    ("expiry_date", "Expiry date", "string", None, True),
+    ("family_name", "Family name", "string", None, True),
+    ("given_name", "Given name(s)", "string", None, True),
+    ("birth_date", "Date of birth", "string", "date", True),
+    ("issuing_authority", "Issuing authority", "string", None, True),
+    ("resident_address", "Permanent place of residence", "string", None, False),
+    ("resident_city", "Resident city", "string", None, False),
+    ("resident_state", "Resident state / province / district", "string", None, False),
+    ("resident_postal_code", "Resident postal code", "string", None, False),
+    ("resident_country", "Resident country", "string", None, False),
+    ("portrait", "Portrait of holder", "string", None, False),
+]
+
+# Every data element of the ISO/IEC 18013-5 mDL namespace
+ISO_18013_5_FIELDS = [
+    ("family_name", "Family name", "string", None, True),
+    ("given_name", "Given name", "string", None, True),
+    ("birth_date", "Date of birth", "string", "date", True),
+    ("issue_date", "Date of issue", "string", "date", True),
+    ("expiry_date", "Date of expiry", "string", "date", True),
+    ("issuing_country", "Issuing country", "string", None, True),
+    ("issuing_authority", "Issuing authority", "string", None, True),
+    ("document_number", "Licence number", "string", None, True),
+    ("portrait", "Portrait of holder", "string", None, True),
+    ("driving_privileges", "Categories of holder vehicles/restrictions/conditions", "array", None, True),
+    ("un_distinguishing_sign", "UN distinguishing sign", "string", None, True),
+    ("administrative_number", "Administrative number", "string", None, False),
+    ("sex", "Sex", "integer", None, False),
+    ("height", "Height (cm)", "integer", None, False),
+    ("weight", "Weight (kg)", "integer", None, False),
+    ("eye_colour", "Eye colour", "string", None, False),
+    ("hair_colour", "Hair colour", "string", None, False),
+    ("birth_place", "Place of birth", "string", None, False),
+    ("resident_address", "Permanent place of residence", "string", None, False),
+    ("portrait_capture_date", "Portrait image timestamp", "string", "date", False),
+    ("age_in_years", "Age in years", "integer", None, False),
+    ("age_birth_year", "Birth year", "integer", None, False),
+    ("age_over_18", "Is age over 18?", "boolean", None, False),
+    ("age_over_21", "Is age over 21?", "boolean", None, False),
+    ("age_over_65", "Is age over 65?", "boolean", None, False),
+    ("issuing_jurisdiction", "Issuing jurisdiction", "string", None, False),
+    ("nationality", "Nationality", "string", None, False),
+    ("resident_city", "Resident city", "string", None, False),
+    ("resident_state", "Resident state/province/district", "string", None, False),
+    ("resident_postal_code", "Resident postal code", "string", None, False),
+    ("resident_country", "Resident country", "string", None, False),
+    ("biometric_template_face", "Biometric template face", "string", None, False),
+    ("biometric_template_signature_sign", "Biometric template signature/sign", "string", None, False),
+    ("family_name_national_character", "Family name in national characters", "string", None, False),
+    ("given_name_national_character", "Given name in national characters", "string", None, False),
+    ("signature_usual_mark", "Signature/usual mark", "string", None, False),
+]
+
+# AAMVA extensions to the mDL for US and Canadian jurisdictions
+AAMVA_FIELDS = [
+    ("domestic_driving_privileges", "Domestic driving privileges", "array", None, False),
+    ("name_suffix", "Name suffix", "string", None, False),
+    ("organ_donor", "Organ donor", "integer", None, False),
+    ("veteran", "Veteran", "integer", None, False),
+    ("family_name_truncation", "Family name truncation", "string", None, True),
+    ("given_name_truncation", "Given name truncation", "string", None, True),
+    ("aka_family_name", "Alias family name", "string", None, False),
+    ("aka_given_name", "Alias given name", "string", None, False),
+    ("aka_suffix", "Alias suffix", "string", None, False),
+    ("weight_range", "Weight range", "integer", None, False),
+    ("race_ethnicity", "Race / ethnicity", "string", None, False),
+    ("EDL_credential", "Enhanced driving licence", "integer", None, False),
+    ("sex", "Sex", "integer", None, True),
+    ("DHS_compliance", "DHS compliance", "string", None, True),
+    ("DHS_compliance_text", "DHS compliance text", "string", None, False),
+    ("DHS_temporary_lawful_status", "DHS temporary lawful status", "integer", None, False),
+    ("resident_county", "Resident county", "string", None, False),
+    ("hazmat_endorsement_expiration_date", "HAZMAT endorsement expiration date", "string", "date", False),
+    ("CDL_indicator", "Commercial driving licence", "integer", None, False),
+    ("audit_information", "Audit information", "string", None, False),
+    ("aamva_version", "AAMVA version", "integer", None, True),
+]
+
+class CredentialSchemaBuilder:
+    """
+    Expand field tables into an OID4VCI credential schema.
+
+    Each namespace becomes an object property of the document, and each
+    field of a namespace a property carrying the usual linked data and
+    display metadata.
+    """
+
+    def __init__(self, name, version, doctype, display_name, base_id, locale="en"):
+        """
+        Args:
+            name: Name of the schema in the agency
+            version: Version of the schema
+            doctype: Document type, e.g. org.iso.18013.5.1.mDL
+            display_name: Name of the document shown to holders
+            base_id: Base of the linked data @id of every element
+            locale: Locale of the display names
+        """
+        self.name = name
+        self.version = version
+        self.doctype = doctype
+        self.display_name = display_name
+        self.base_id = base_id
+        self.locale = locale
+        self.namespaces = []
+
+    def add_namespace(self, namespace, fields, required=True):
+        """
+        Add a namespace of data elements.
+
+        Args:
+            namespace: Namespace identifier
+            fields: Field table rows of the namespace
+            required: Whether the document must contain the namespace
+
+        Returns:
+            The builder, so that calls can be chained
+        """
+        self.namespaces.append((namespace, fields, required))
+        return self
+
+    def _display(self, name):
+        return {"display": [{"name": name, "locale": self.locale}]}
+
+    def _field(self, namespace_id, identifier, display_name, field_type, field_format):
+        field = {
+            "$linkedData": {
+                "identifier": identifier,
+                "@id": f"{namespace_id}/{identifier}"
+            },
+            "$oid4vc": self._display(display_name),
+            "type": field_type
+        }
+        if field_format:
+            field["format"] = field_format
+        return field
+
+    def build(self):
+        """
+        Build the credential schema payload.
+
+        Returns:
+            Credential schema as dictionary
+        """
+        properties = {}
+        for namespace, fields, _ in self.namespaces:
+            namespace_id = f"{self.base_id}/{namespace}"
+            namespace_properties = {"@context": {"type": "array"}}
+            for identifier, display_name, field_type, field_format, _ in fields:
+                namespace_properties[identifier] = self._field(namespace_id, identifier, display_name,
+                                                               field_type, field_format)
+            properties[namespace] = {
+                "$linkedData": {
+                    "identifier": namespace,
+                    "@id": namespace_id
+                },
+                "type": "object",
+                "properties": namespace_properties,
+                "required": [field[0] for field in fields if field[4]],
+                "additionalProperties": False
+            }
+
+        return {
+            "name": self.name,
+            "version": self.version,
+            "schema": {
+                "$schema": "https://json-schema.org/draft/2020-12/schema",
+                "$linkedData": {
+                    "identifier": self.doctype,
+                    "@id": self.base_id,
+                    "@vocab": self.base_id,
+                    "@type": self.doctype
+                },
+                "$oid4vc": self._display(self.display_name),
+                "type": "object",
+                "properties": properties,
+                "required": [namespace for namespace, _, required in self.namespaces if required],
+                "additionalProperties": False
+            }
+        }
+
+    def compile(self):
+        """Build the schema and serialise it once, see CompiledSchema."""
+        return CompiledSchema(self.build())
+
+class CompiledSchema:
+    """
+    A credential schema together with its serialised request body and
+    fingerprint, computed once and reused by every tenant.
+    """
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.data = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        self.fingerprint = payload_fingerprint(payload)
+
+# Credential schemas which can be selected with CREDENTIAL_SCHEMA
+CREDENTIAL_SCHEMAS = {
+    'mdl': lambda: CredentialSchemaBuilder("oidschema", "1.0", MDL_DOCTYPE, "Mobile Drivers Licence", MDL_BASE_ID)
+        .add_namespace(MDL_NAMESPACE, MDL_DEMO_FIELDS),
+    'mdl-aamva': lambda: CredentialSchemaBuilder("mdlaamvaschema", "1.0", MDL_DOCTYPE, "Mobile Drivers Licence",
+                                                 MDL_BASE_ID)
+        .add_namespace(MDL_NAMESPACE, ISO_18013_5_FIELDS)
+        .add_namespace(AAMVA_NAMESPACE, AAMVA_FIELDS, required=False),
+}
+
+DEFAULT_CREDENTIAL_SCHEMA = 'mdl'
+
+_compiled_schemas = {}
+_compiled_schemas_lock = threading.Lock()
+
+def get_credential_schema(schema_name=None):
+    """
+    Get a registered credential schema, compiling it on first use.
+    
+    Args:
+        schema_name: Key of CREDENTIAL_SCHEMAS, defaults to the
+            CREDENTIAL_SCHEMA environment variable or 'mdl'
+        
+    Returns:
+        CompiledSchema
+    """
+    schema_name = schema_name or os.environ.get('CREDENTIAL_SCHEMA', DEFAULT_CREDENTIAL_SCHEMA)
+    if schema_name not in CREDENTIAL_SCHEMAS:
+        raise ValueError(f"unknown credential schema '{schema_name}', "
+                         f"expected one of {', '.join(CREDENTIAL_SCHEMAS)}")
+    with _compiled_schemas_lock:
+        if schema_name not in _compiled_schemas:
+            _compiled_schemas[schema_name] = CREDENTIAL_SCHEMAS[schema_name]().compile()
+        return _compiled_schemas[schema_name]
+
+def build_credential_schema_payload(schema_name=None):
+    """
+    Build the credential schema payload.
+    
+    Args:
+        schema_name: Optional key of CREDENTIAL_SCHEMAS
+        
+    Returns:
+        Credential schema as dictionary
+    """
+    return get_credential_schema(schema_name).payload
+
+def payload_fingerprint(payload):
+    """
+    Hash a request payload so that changes to it can be detected.
+    
+    Args:
+        payload: JSON serialisable payload
+        
+    Returns:
+        Hex SHA-256 digest of the canonical JSON encoding of the payload
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
@@ -0,0 +1,122 @@
+"""
+Settings shared by the provisioning commands.
+
+This module has no third party dependencies, so that the command line can
+be parsed and configuration-only commands can run without importing the
+HTTP stack.
+"""
+
+# Maximum number of provisioning steps run at the same time
+MAX_STEP_WORKERS = 4
+
+# Default number of tenants provisioned at the same time in bulk mode
+DEFAULT_TENANT_CONCURRENCY = 8
+
+# HTTP transports of the provisioning client, see provisioning.http.TRANSPORTS
+HTTP_TRANSPORTS = ['requests', 'http2']
+
+# Constants
+DMV_AGENT_NAME = "DMVIssuer"
+BANK_AGENT_NAME = "BankVerifier"
+# Lifetime of the verifier's presentation exchanges (s)
+DEFAULT_EXCHANGE_TTL = 120
+
+# Agency collections of the objects created for each issuer/verifier pair
+OBJECT_COLLECTIONS = {
+    'credential_schema': '/v2.0/diagency/credential_schemas',
+    'credential_definition': '/v2.0/diagency/credential_definitions',
+    'exchange_template': '/v1.0/oidvc/vp/exchange_templates',
+    'trust_registry': '/v1.0/diagency/trust/remote_providers/registries'
+}
+
+DEFAULT_STATE_FILE = '.provisioning-state.json'
+
+# Combined report of a provisioning run on several agencies
+DEFAULT_TARGETS_REPORT = 'targets-report.json'
+
+# Write-ahead journal of the completed provisioning steps, replayed by --resume
+DEFAULT_JOURNAL_FILE = '.provisioning-journal.jsonl'
+
+# Number of items requested per page when listing agency collections
+PAGE_SIZE = 100
+
+# Polling of asynchronous VICAL fetches
+VICAL_FETCH_TIMEOUT = 120
+VICAL_POLL_BASE_DELAY = 0.25
+VICAL_POLL_MAX_DELAY = 5
+VICAL_FETCH_DONE_STATES = {'fetched', 'ready', 'active'}
+VICAL_FETCH_FAILED_STATES = {'failed', 'error'}
+
+DEFAULT_TRACE_FILE = 'provisioning-trace.json'
+
+# Configuration files written for the web applications, by format
+CONFIG_FILES = {
+    'env': '.env',
+    'kubernetes': 'oid4vc-config.yaml',
+    'json': 'oid4vc-config.json'
+}
+CONFIG_FORMATS = list(CONFIG_FILES)
+CONFIG_MAP_NAME = 'oid4vc-config'
+CONFIG_SECRET_NAME = 'oid4vc-secrets'
+SECRET_MASK = '********'
+
+# Path segments which are followed by an object ID, used to group requests
+ID_COLLECTIONS = {
+    'agents', 'credential_schemas', 'credential_definitions', 'exchange_templates',
+    'registries', 'anchor', 'offers', 'exchanges', 'exchange'
+}
+
+INSTRUCTIONS = """This script is used to create the .env file for the
+demo environment when the verifiable credentials environment is running
+in an onpremise environment.
+
+There are a couple of environment variables which will need to be
+customised for the envionment in use, mostly AGENCY_URL and OIDC_TOKEN_ENDPOINT.
+
+If the verifiable credentials environment is running in an OpenShift cluster
+the KUBERNETES=1 environment variable can be set to tell this script to
+dynamically obtain the required information.
+
+Access tokens can be kept between runs by setting TOKEN_CACHE_FILE and
+TOKEN_CACHE_KEY (a Fernet key, requires the cryptography package).
+
+Agency calls are sent over requests by default. HTTP_TRANSPORT=http2 (or
+--transport http2) multiplexes them over a few HTTP/2 connections instead
+(requires the httpx[http2] package).
+
+Logos embedded in the agent profiles can be limited to LOGO_MAX_BYTES
+(requires Pillow), and encoded logos are kept in IMAGE_CACHE_DIR when set.
+
+CREDENTIAL_SCHEMA selects the credential schema created for the issuer:
+mdl (default) or mdl-aamva (the full ISO 18013-5 mDL with AAMVA extensions).
+"""
+
+# Benchmark of the provisioning against the mock agency
+DEFAULT_BASELINE_FILE = 'bench_baseline.json'
+BENCH_SCENARIOS = ['single', 'bulk']
+# Allowed growth over the baseline before a metric counts as a regression
+DEFAULT_TIME_TOLERANCE = 0.25
+DEFAULT_MEMORY_TOLERANCE = 0.25
+
+# Credential offer and presentation exchange load generation
+LOAD_SCENARIOS = ['offer', 'exchange', 'mixed']
+DEFAULT_LOAD_DURATION = 60
+DEFAULT_LOAD_USERS = 10
+DEFAULT_MAX_IN_FLIGHT = 256
+DEFAULT_POPULATION = 1000
+DEFAULT_SAMPLE_INTERVAL = 60
+DEFAULT_TIMESERIES_FILE = 'soak-timeseries.jsonl'
+# Growth over the start of a soak which is reported as drift
+DEFAULT_DRIFT_THRESHOLD = 1.5
+
+# Synthetic holder data for issuance tests
+DEFAULT_HOLDERS_DIR = 'holders'
+DEFAULT_HOLDER_COUNT = 1000
+DEFAULT_HOLDER_SHARD_SIZE = 100000
+DEFAULT_PORTRAIT_MAX_BYTES = 16 * 1024
+
+# Export and import of the agency objects
+DEFAULT_SNAPSHOT_DIR = 'agency-snapshot'
+DEFAULT_SNAPSHOT_SHARD_SIZE = 10000
+
+DEFAULT_MOCK_PORT = 9080
@@ -0,0 +1,440 @@
+"""
+Export of the agency objects to a local snapshot, and import of a snapshot
+into another agency.
+
+The export pages through the agents and every collection of
+OBJECT_COLLECTIONS, one thread per collection, and streams the items to
+gzip compressed JSON Lines shards of --shard-size items, so only one page
+per collection is held in memory however large the agency is:
+
+    python3 -m provisioning export --output-dir agency-snapshot
+    python3 -m provisioning import --input-dir agency-snapshot --concurrency 16
+
+The import creates the objects again, collection by collection in
+dependency order, with at most --concurrency requests in flight. Agents
+are created first, and the credential schemas, definitions and exchange
+templates are then created with the access token of the agent owning
+them, as the provision command does, so they keep their owner. The target
+agency assigns new IDs, so the owner of each object, the schema of each
+credential definition and the issuer agent in each trust registry endpoint
+are rewritten to the new IDs. Every created object is recorded in an import journal in the
+snapshot directory, so importing the snapshot again into the same agency,
+for example after a failed run, counts the objects already imported as
+existing and leaves them alone. Agent secrets are not exported, the agency
+issues new ones on import.
+"""
+
+import gzip
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from .agency import AgencyRequestError, get_access_token, iter_collection
+from .files import write_file_atomic
+from .http import ProvisioningClient
+from .journal import StepJournal
+from .limiter import create_limiter
+from .settings import OBJECT_COLLECTIONS
+
+# Collections of a snapshot, in the order they are imported so that no
+# object is created before one it refers to
+SNAPSHOT_COLLECTIONS = {'agent': '/v1.0/diagency/agents', **OBJECT_COLLECTIONS}
+
+SHARD_NAME = '{kind}-{shard:05d}.jsonl.gz'
+MANIFEST_NAME = 'manifest.json'
+# Old to new IDs of the imported objects, per target agency
+IMPORT_JOURNAL_NAME = 'import-journal.jsonl'
+# Fast gzip level, the export is bound by the agency rather than by
+# compression
+COMPRESS_LEVEL = 1
+
+# Field of the agent owning a schema, definition or template, set by the
+# agency from the access token the object was created with
+OWNER_FIELD = 'agent_id'
+OWNED_COLLECTIONS = ('credential_schema', 'credential_definition', 'exchange_template')
+
+# Fields set by the agency, which are left out of the import requests
+READ_ONLY_FIELDS = ('id', 'created', 'updated', 'modified', 'client_secret', 'did', 'state', 'last_fetched',
+                    OWNER_FIELD)
+
+# Issuer agent ID in the VICAL endpoint of a trust registry, see
+# create_isvdc_issuer_vical_url()
+VICAL_AGENT_PATTERN = re.compile(r'/trust/anchor/([^/]+)/vical')
+
+class ShardWriter:
+    """
+    Writer of the items of one collection to numbered compressed shards.
+
+    Each shard is written under a temporary name and renamed once it holds
+    shard_size items or the collection ends, so an existing shard is always
+    complete.
+    """
+
+    def __init__(self, output_dir, kind, shard_size):
+        self.output_dir = output_dir
+        self.kind = kind
+        self.shard_size = shard_size
+        self.shards = []
+        self.count = 0
+        self._file = None
+        self._path = None
+        self._in_shard = 0
+
+    def write(self, item):
+        if self._file is None:
+            self._path = os.path.join(self.output_dir, SHARD_NAME.format(kind=self.kind, shard=len(self.shards)))
+            self._file = gzip.open(f"{self._path}.tmp", 'wt', encoding='utf-8', compresslevel=COMPRESS_LEVEL)
+        self._file.write(json.dumps(item, separators=(',', ':')))
+        self._file.write('\n')
+        self.count += 1
+        self._in_shard += 1
+        if self._in_shard >= self.shard_size:
+            self.close()
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(f"{self._path}.tmp", self._path)
+        self.shards.append(os.path.basename(self._path))
+        self._file = None
+        self._in_shard = 0
+
+def export_collection(client, access_token, kind, output_dir, shard_size, page_size):
+    """
+    Stream one collection to its shards.
+
+    Returns:
+        Tuple of the shard names, the number of items and the elapsed time
+    """
+    start = time.monotonic()
+    writer = ShardWriter(output_dir, kind, shard_size)
+    for item in iter_collection(client, access_token, SNAPSHOT_COLLECTIONS[kind], page_size=page_size):
+        writer.write(item)
+    writer.close()
+    return writer.shards, writer.count, time.monotonic() - start
+
+def export_snapshot(client, access_token, output_dir, shard_size, page_size):
+    """
+    Export every collection of SNAPSHOT_COLLECTIONS, one thread per
+    collection, and write the manifest of the snapshot.
+
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token allowed to list the collections
+        output_dir: Directory receiving the shards and the manifest
+        shard_size: Maximum number of items per shard
+        page_size: Number of items requested per page
+
+    Returns:
+        The manifest dictionary
+
+    Raises:
+        AgencyRequestError: If a collection could not be listed
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=len(SNAPSHOT_COLLECTIONS)) as executor:
+        futures = {
+            kind: executor.submit(export_collection, client, access_token, kind, output_dir, shard_size, page_size)
+            for kind in SNAPSHOT_COLLECTIONS
+        }
+        collections = {}
+        for kind, future in futures.items():
+            shards, count, elapsed = future.result()
+            print(f"  {kind:<22} {count:>8} items  {len(shards)} shard(s)  {elapsed:.2f}s")
+            collections[kind] = {'path': SNAPSHOT_COLLECTIONS[kind], 'count': count, 'shards': shards}
+
+    manifest = {
+        'agency_url': client.agency_url,
+        'exported': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'collections': collections
+    }
+    write_file_atomic(os.path.join(output_dir, MANIFEST_NAME), json.dumps(manifest, indent=2) + "\n")
+    return manifest
+
+def read_shards(input_dir, shards):
+    """Stream the items of a collection from its shards, one line at a time."""
+    for shard in shards:
+        with gzip.open(os.path.join(input_dir, shard), 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def remap_references(kind, data, ids):
+    """
+    Rewrite the IDs an object refers to into the IDs of the objects
+    imported in their place.
+
+    Args:
+        kind: Collection of the object
+        data: Object, modified in place
+        ids: Dictionary of collection to a dictionary of old to new ID
+    """
+    if kind == 'credential_definition' and data.get('schema_id') in ids['credential_schema']:
+        data['schema_id'] = ids['credential_schema'][data['schema_id']]
+    elif kind == 'trust_registry' and data.get('endpoint'):
+        match = VICAL_AGENT_PATTERN.search(data['endpoint'])
+        if match and match.group(1) in ids['agent']:
+            start, end = match.span(1)
+            data['endpoint'] = data['endpoint'][:start] + ids['agent'][match.group(1)] + data['endpoint'][end:]
+
+class AgentTokens:
+    """
+    Access tokens of the imported agents, through the token cache of the
+    client. The secret of an agent is taken from the response creating it,
+    or read once with includepass=true for an agent imported by an earlier
+    run.
+    """
+
+    def __init__(self, client, admin_access_token):
+        self.client = client
+        self.admin_access_token = admin_access_token
+        self._secrets = {}
+        self._lock = threading.Lock()
+
+    def add(self, agent_id, client_secret):
+        with self._lock:
+            self._secrets[agent_id] = client_secret
+
+    def get(self, agent_id):
+        """
+        Returns:
+            Access token of the agent, or None if it could not be obtained
+        """
+        with self._lock:
+            client_secret = self._secrets.get(agent_id)
+        if client_secret is None:
+            response = self.client.get(
+                f"{self.client.agency_url}{SNAPSHOT_COLLECTIONS['agent']}/{agent_id}?includepass=true",
+                headers={'Accept': 'application/json', 'Authorization': f'Bearer {self.admin_access_token}'})
+            if response.status_code != 200:
+                return None
+            client_secret = response.json().get('client_secret')
+            self.add(agent_id, client_secret)
+        return get_access_token(self.client, agent_id, client_secret)
+
+def import_item(client, tokens, kind, item, ids):
+    """
+    Create one object of a snapshot, with the access token of its owning
+    agent when it has one, otherwise the admin token. The POST is not
+    repeated on failure, as it could create the object twice.
+
+    Returns:
+        Tuple of the new object ID, or None, and an error message, or None
+    """
+    data = {key: value for key, value in item.items() if key not in READ_ONLY_FIELDS}
+    remap_references(kind, data, ids)
+
+    access_token = tokens.admin_access_token
+    owner = item.get(OWNER_FIELD) if kind in OWNED_COLLECTIONS else None
+    if owner:
+        if owner not in ids['agent']:
+            return None, f"its owner, agent {owner}, was not imported"
+        access_token = tokens.get(ids['agent'][owner])
+        if not access_token:
+            return None, f"could not obtain an access token for agent {ids['agent'][owner]}"
+
+    url = f"{client.agency_url}{SNAPSHOT_COLLECTIONS[kind]}"
+    if kind == 'agent':
+        # The secret of a new agent gives the token its objects are created with
+        url += '?includepass=true'
+    headers = {
+        'Accept': 'application/json',
+        'Content-Type': 'application/json',
+        'Authorization': f'Bearer {access_token}'
+    }
+    try:
+        response = client.post(url, headers=headers, json=data)
+    except requests.exceptions.RequestException as e:
+        return None, str(e)
+    if response.status_code not in (200, 201):
+        return None, f"{response.status_code} {response.text}"
+    created = response.json()
+    object_id = created.get('id')
+    if not object_id:
+        return None, "no ID in the response"
+    if kind == 'agent':
+        tokens.add(object_id, created.get('client_secret'))
+    return object_id, None
+
+def imported_ids(client, access_token, kind, ids):
+    """
+    IDs of the objects of a collection imported by a previous run which
+    still exist in the agency. The collection is only listed when a
+    previous run imported some of it.
+    """
+    if not ids[kind]:
+        return set()
+    existing = {item.get('id') for item in iter_collection(client, access_token, SNAPSHOT_COLLECTIONS[kind],
+                                                            include=['id'])}
+    return {old_id for old_id, new_id in ids[kind].items() if new_id in existing}
+
+def import_collection(client, tokens, kind, items, concurrency, ids, journal):
+    """
+    Create the objects of one collection with at most concurrency requests
+    in flight. Items are read from the iterable as requests complete, so the
+    collection is never held in memory.
+
+    Args:
+        client: ProvisioningClient for the agency
+        tokens: AgentTokens giving the admin token and those of the agents
+        kind: Collection of the objects
+        items: Iterable of the exported objects
+        concurrency: Maximum number of requests in flight
+        ids: Dictionary of collection to a dictionary of old to new ID,
+            updated with the created objects
+        journal: StepJournal recording the created objects
+
+    Returns:
+        Dictionary of 'created', 'existing' and 'failed' counts
+
+    Raises:
+        AgencyRequestError: If the collection could not be listed
+    """
+    counts = {'created': 0, 'existing': 0, 'failed': 0}
+    existing = imported_ids(client, tokens.admin_access_token, kind, ids)
+    items = iter(items)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            for item in items:
+                if item.get('id') in existing:
+                    counts['existing'] += 1
+                    continue
+                running[executor.submit(import_item, client, tokens, kind, item, ids)] = item.get('id')
+                if len(running) >= concurrency:
+                    break
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                old_id = running.pop(future)
+                new_id, error = future.result()
+                if error:
+                    counts['failed'] += 1
+                    print(f"Error> failed to import {kind} {old_id}: {error}")
+                    continue
+                counts['created'] += 1
+                if old_id:
+                    ids[kind][old_id] = new_id
+                    journal.record(kind, old_id, new_id)
+    return counts
+
+def import_snapshot(client, access_token, input_dir, manifest, concurrency):
+    """
+    Import the collections of a snapshot, in the order of
+    SNAPSHOT_COLLECTIONS, recording the old and new ID of every created
+    object in the import journal of the snapshot.
+
+    Returns:
+        Dictionary of collection to the counts of import_collection()
+
+    Raises:
+        AgencyRequestError: If a collection could not be listed
+    """
+    results = {}
+    with StepJournal(os.path.join(input_dir, IMPORT_JOURNAL_NAME), client.agency_url).open(resume=True) as journal:
+        ids = {kind: journal.completed(kind) for kind in SNAPSHOT_COLLECTIONS}
+        tokens = AgentTokens(client, access_token)
+        for kind in SNAPSHOT_COLLECTIONS:
+            collection = manifest['collections'].get(kind)
+            if not collection:
+                continue
+            start = time.monotonic()
+            counts = import_collection(client, tokens, kind, read_shards(input_dir, collection['shards']),
+                                       concurrency, ids, journal)
+            print(f"  {kind:<22} {counts['created']:>8} created  {counts['existing']} existing  "
+                  f"{counts['failed']} failed  {time.monotonic() - start:.2f}s")
+            results[kind] = counts
+    return results
+
+def read_manifest(input_dir):
+    """
+    Read and check the manifest of a snapshot.
+
+    Raises:
+        ValueError: If the manifest is missing or lists missing shards
+    """
+    path = os.path.join(input_dir, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except OSError as e:
+        raise ValueError(f"cannot read {path}: {e}")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path} is not valid JSON: {e}")
+    for kind, collection in manifest.get('collections', {}).items():
+        if kind not in SNAPSHOT_COLLECTIONS:
+            raise ValueError(f"{path} lists an unknown collection '{kind}'")
+        missing = [shard for shard in collection.get('shards', [])
+                   if not os.path.exists(os.path.join(input_dir, shard))]
+        if missing:
+            raise ValueError(f"shard(s) of {kind} missing from {input_dir}: {', '.join(missing)}")
+    return manifest
+
+def main(args):
+    """Run the export or the import command."""
+    agency_url = os.environ.get('AGENCY_URL')
+    oidc_token_endpoint = os.environ.get('OIDC_TOKEN_ENDPOINT')
+    if not agency_url or not oidc_token_endpoint:
+        print("Error: AGENCY_URL and OIDC_TOKEN_ENDPOINT environment variables must be provided.")
+        sys.exit(1)
+
+    manifest = None
+    if args.command == 'import':
+        try:
+            manifest = read_manifest(args.input_dir)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    limiter = None
+    if args.command == 'import':
+        pool_maxsize = max(len(SNAPSHOT_COLLECTIONS), args.concurrency)
+        limiter = create_limiter(pool_maxsize, args.adaptive, args.rate_limit)
+    else:
+        pool_maxsize = len(SNAPSHOT_COLLECTIONS)
+    with ProvisioningClient(agency_url, oidc_token_endpoint, pool_maxsize=pool_maxsize,
+                            transport=args.transport, limiter=limiter) as client:
+        admin_access_token = get_access_token(client, os.environ.get('ADMIN_NAME', 'admin'),
+                                              os.environ.get('ADMIN_PASSWORD', 'secret'))
+        if not admin_access_token:
+            print("Error> failed to obtain an access token.")
+            sys.exit(1)
+
+        start = time.monotonic()
+        if args.command == 'export':
+            print(f"Exporting {agency_url} to {args.output_dir}...")
+            try:
+                manifest = export_snapshot(client, admin_access_token, args.output_dir, args.shard_size,
+                                           args.page_size)
+            except AgencyRequestError as e:
+                print(f"Error> failed to export the agency: {e}")
+                sys.exit(1)
+            total = sum(collection['count'] for collection in manifest['collections'].values())
+            print(f"Exported {total} objects in {time.monotonic() - start:.2f}s")
+            return
+
+        print(f"Importing {args.input_dir} (exported from {manifest.get('agency_url')}) into {agency_url}...")
+        try:
+            results = import_snapshot(client, admin_access_token, args.input_dir, manifest, args.concurrency)
+        except AgencyRequestError as e:
+            print(f"Error> could not list the imported objects: {e}")
+            sys.exit(1)
+
+    created = sum(counts['created'] for counts in results.values())
+    failed = sum(counts['failed'] for counts in results.values())
+    print(f"Imported {created} objects in {time.monotonic() - start:.2f}s ({failed} failed)")
+    if limiter is not None:
+        print(limiter.summary())
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,173 @@
+"""
+Local record of the provisioned objects, used to reconcile reruns.
+"""
+
+import json
+import os
+import threading
+
+import requests
+
+from .files import write_file_atomic
+from .schemas import payload_fingerprint
+from .settings import OBJECT_COLLECTIONS
+
+class ProvisioningState:
+    """
+    Local record of the objects created by this script.
+
+    Each logical object maps to the ID the agency gave it and the
+    fingerprint of the payload it was created from, so that a rerun can
+    skip objects which already exist and have not changed.
+
+    Recorded objects are written as soon as they are recorded, so that a
+    crashed run does not lose the IDs of the objects it already created.
+    HTTP cache validators are only written by save(), at the end of a run.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: JSON file holding the state
+        """
+        self.path = path
+        self._objects = {}
+        self._validators = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            self._objects = saved.get('objects', {})
+            self._validators = saved.get('validators', {})
+
+    @staticmethod
+    def key(agency_url, kind, name):
+        """Build the state key of an object of the given kind owned by name."""
+        return f"{agency_url}|{kind}|{name}"
+
+    def get(self, key):
+        with self._lock:
+            return self._objects.get(key)
+
+    def record(self, key, object_id, fingerprint):
+        """Record an object and write the state file."""
+        with self._lock:
+            self._objects[key] = {'id': object_id, 'fingerprint': fingerprint}
+            self._save()
+
+    def objects(self, agency_url=None):
+        """
+        List the recorded objects, optionally only those of one agency.
+
+        Returns:
+            List of (key, kind, name, object ID) tuples
+        """
+        with self._lock:
+            keys = list(self._objects.items())
+        objects = []
+        for key, entry in keys:
+            url, kind, name = key.rsplit('|', 2)
+            if agency_url is None or url == agency_url:
+                objects.append((key, kind, name, entry['id']))
+        return objects
+
+    def forget(self, *keys):
+        """Remove objects from the state and save the state file once."""
+        with self._lock:
+            removed = [key for key in keys if self._objects.pop(key, None) is not None]
+            if removed:
+                self._save()
+
+    def get_validators(self, key):
+        """Return the HTTP cache validators recorded for a fetched resource."""
+        with self._lock:
+            return self._validators.get(key)
+
+    def record_validators(self, key, validators):
+        """Record the HTTP cache validators of a fetched resource, written to the state file by save()."""
+        with self._lock:
+            self._validators[key] = validators
+            self._dirty = True
+
+    def save(self):
+        """Write the state file, if anything was recorded since it was last written."""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def _save(self):
+        write_file_atomic(self.path, json.dumps({'objects': self._objects, 'validators': self._validators},
+                                                indent=2))
+        self._dirty = False
+
+def reconcile_object(client, access_token, state, kind, name, payload, create, fingerprint=None,
+                     snapshot=None):
+    """
+    Create an object only if it is missing or its payload has changed.
+    
+    The state entry for the object is checked first: if its fingerprint
+    matches the payload and a GET (or the snapshot, when given) confirms
+    the object still exists, the recorded ID is returned without creating
+    anything. An object whose payload changed is replaced: the new one is
+    created first, then the one it supersedes is deleted.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token for authentication
+        state: ProvisioningState
+        kind: Object kind, a key of OBJECT_COLLECTIONS
+        name: Name of the agent owning the object
+        payload: Payload the object would be created from
+        create: Callable creating the object and returning its ID
+        fingerprint: Optional precomputed fingerprint of the payload
+        snapshot: Optional AgencySnapshot used instead of a GET
+        
+    Returns:
+        Tuple of (object ID, whether the object was created)
+    """
+    key = ProvisioningState.key(client.agency_url, kind, name)
+    fingerprint = fingerprint or payload_fingerprint(payload)
+    entry = state.get(key)
+
+    if entry and entry['fingerprint'] == fingerprint:
+        if snapshot is not None:
+            exists = snapshot.exists(kind, entry['id'])
+        else:
+            headers = {
+                'Accept': 'application/json',
+                'Authorization': f'Bearer {access_token}'
+            }
+            response = client.get(f"{client.agency_url}{OBJECT_COLLECTIONS[kind]}/{entry['id']}", headers=headers)
+            exists = response.status_code == 200
+        if exists:
+            return entry['id'], False
+
+    object_id = create()
+    if object_id:
+        state.record(key, object_id, fingerprint)
+        if snapshot is not None:
+            snapshot.add_object(kind, object_id)
+        if entry and entry['id'] != object_id:
+            delete_superseded_object(client, access_token, kind, name, entry['id'], object_id)
+    return object_id, True
+
+def delete_superseded_object(client, access_token, kind, name, object_id, new_object_id):
+    """
+    Delete an object replaced by one created from a changed payload. A
+    failure is only reported, the old object is then left in place for
+    the teardown command.
+    """
+    headers = {'Authorization': f'Bearer {access_token}'}
+    url = f"{client.agency_url}{OBJECT_COLLECTIONS[kind]}/{object_id}"
+    try:
+        response = client.delete(url, headers=headers)
+    except requests.exceptions.RequestException as e:
+        error = str(e)
+    else:
+        if response.status_code in (200, 202, 204, 404):
+            print(f"Deleted the {kind} of {name} superseded by {new_object_id}: {object_id}")
+            return
+        error = f"{response.status_code} {response.text}"
+    print(f"Warning: could not delete the superseded {kind} of {name} ({object_id}), left in place: {error}")
@@ -0,0 +1,454 @@
+"""
+Provisioning as a graph of steps, run concurrently where they do not
+depend on each other.
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+from .agency import get_access_token
+from .agents import create_agent
+from .credentials import (
+    build_credential_definition_payload, build_exchange_template_payload, create_oid4vci_credential_definition,
+    create_oid4vci_credential_schema, create_oid4vp_exchange_template
+)
+from .schemas import get_credential_schema
+from .settings import BANK_AGENT_NAME, DMV_AGENT_NAME, MAX_STEP_WORKERS
+from .state import ProvisioningState, reconcile_object
+from .tracing import current_step
+from .trust import (
+    build_trusted_authority_payload, create_isvdc_issuer_vical_url, create_trusted_authority, refresh_vical
+)
+
+class ProvisioningError(Exception):
+    """Raised when a provisioning step fails."""
+
+    def __init__(self, step, message):
+        super().__init__(f"{step}: {message}")
+        self.step = step
+        self.message = message
+
+class ProvisioningStep:
+    """
+    A single node in the provisioning dependency graph.
+
+    The action is called with the dictionary of results of the steps which
+    have already completed, and returns this step's result. A result of None
+    is treated as a failure unless the step is optional.
+    """
+
+    def __init__(self, name, action, requires=(), error=None, optional=False, checkpoint=lambda result: result):
+        """
+        Args:
+            name: Unique step name, also the key of its result
+            action: Callable taking the results dictionary
+            requires: Names of the steps which must complete first
+            error: Message reported when the step fails
+            optional: True if a result of None is not a failure
+            checkpoint: Callable returning the part of the result which is
+                recorded in the step journal, None for steps which are not
+                recorded, such as access tokens which expire
+        """
+        self.name = name
+        self.action = action
+        self.requires = tuple(requires)
+        self.error = error or f"step {name} failed."
+        self.optional = optional
+        self.checkpoint = checkpoint
+
+class StepOutput:
+    """
+    Stand-in for sys.stdout while steps run. The output of each step is
+    buffered up to the end of the line, then written as a whole under a
+    lock and prefixed with the name of the step printing it, so that the
+    lines of steps running at the same time do not interleave. Threads
+    which are not running a step, such as the writer of the bulk results,
+    write through unchanged.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+        # Per thread, the prefix and the text of the line being printed, and
+        # whether flush() already wrote the start of that line
+        self._pending = {}
+
+    def write(self, text):
+        name = getattr(current_step, 'name', None)
+        with self._lock:
+            if name is None:
+                self.stream.write(text)
+                return len(text)
+            prefix, pending, started = self._pending.pop(threading.get_ident(), (f"[{name}] ", '', False))
+            *lines, pending = (pending + text).split('\n')
+            if lines:
+                lines = [line if started and i == 0 else f"{prefix}{line}" for i, line in enumerate(lines)]
+                self.stream.write('\n'.join(lines) + '\n')
+                started = False
+            if pending or started:
+                self._pending[threading.get_ident()] = (prefix, pending, started)
+        return len(text)
+
+    def _write_pending(self, ident, end):
+        # Called with the lock held
+        prefix, pending, started = self._pending.pop(ident, ('', '', False))
+        if pending or started:
+            self.stream.write(f"{pending if started else prefix + pending}{end}")
+        return prefix, started
+
+    def flush(self):
+        """Write the text the calling thread printed so far, even without a newline."""
+        with self._lock:
+            prefix, started = self._write_pending(threading.get_ident(), '')
+            if prefix:
+                self._pending[threading.get_ident()] = (prefix, '', True)
+            self.stream.flush()
+
+    def end_line(self):
+        """End the line the calling thread was printing, when its step completes."""
+        with self._lock:
+            self._write_pending(threading.get_ident(), '\n')
+
+    def close_lines(self):
+        """End the lines every thread was printing, when no step runs anymore."""
+        with self._lock:
+            for ident in list(self._pending):
+                self._write_pending(ident, '\n')
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+# StepOutput installed while any run_provisioning_steps() call is running
+_step_output = None
+_step_output_users = 0
+_step_output_lock = threading.Lock()
+
+@contextmanager
+def step_output():
+    """Route sys.stdout through a StepOutput, shared by runs in progress at the same time."""
+    global _step_output, _step_output_users
+    with _step_output_lock:
+        if _step_output_users == 0:
+            _step_output = sys.stdout = StepOutput(sys.stdout)
+        _step_output_users += 1
+    try:
+        yield
+    finally:
+        with _step_output_lock:
+            _step_output_users -= 1
+            if _step_output_users == 0:
+                _step_output.close_lines()
+                if sys.stdout is _step_output:
+                    sys.stdout = _step_output.stream
+                _step_output = None
+
+def _timed_step(step, results):
+    current_step.name = step.name
+    start = time.monotonic()
+    try:
+        value = step.action(results)
+    finally:
+        output = _step_output
+        if output is not None:
+            output.end_line()
+        current_step.name = None
+    return value, start, time.monotonic()
+
+def _needed_steps(by_name, completed):
+    """
+    Names of the steps left to run: those which are not completed and are
+    either not required by any step or required by a step left to run.
+    """
+    dependents = {name: [] for name in by_name}
+    for step in by_name.values():
+        for dependency in step.requires:
+            dependents[dependency].append(step.name)
+
+    needed = {}
+
+    def is_needed(name):
+        if name not in needed:
+            needed[name] = False
+            needed[name] = name not in completed and (
+                not dependents[name] or any(is_needed(dependent) for dependent in dependents[name]))
+        return needed[name]
+
+    return {name for name in by_name if is_needed(name)}
+
+def run_provisioning_steps(steps, max_workers=MAX_STEP_WORKERS, completed=None, tracer=None,
+                           trace_attributes=None, checkpoint=None):
+    """
+    Run provisioning steps on a thread pool, starting each step as soon as
+    the steps it requires have completed.
+    
+    On the first failure no further steps are started, the steps already
+    running are allowed to finish, and the failing step is reported. What
+    the steps print is written a line at a time, prefixed with the step
+    name, see StepOutput.
+    
+    Args:
+        steps: List of ProvisioningStep
+        max_workers: Maximum number of steps running at the same time
+        completed: Optional results of steps which have already been run
+            elsewhere, these steps are not run again, nor the steps only
+            they required
+        tracer: Optional Tracer receiving a span for every step
+        trace_attributes: Optional attributes added to the step spans
+        checkpoint: Optional callable taking a step name and the
+            checkpoint of its result, called as each step completes, see
+            StepJournal.checkpoint()
+        
+    Returns:
+        Tuple of (results, timings) where results maps step names to their
+        results and timings maps step names to (start, end) offsets in
+        seconds from the start of the run
+        
+    Raises:
+        ProvisioningError: If a step fails or the graph is invalid
+    """
+    by_name = {step.name: step for step in steps}
+    for step in steps:
+        for dependency in step.requires:
+            if dependency not in by_name:
+                raise ProvisioningError(step.name, f"unknown dependency {dependency}.")
+
+    results = dict(completed or {})
+    timings = {}
+    needed = _needed_steps(by_name, results)
+    pending = {name: step for name, step in by_name.items() if name in needed}
+    running = {}
+    failure = None
+    origin = time.monotonic()
+
+    with step_output(), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            if failure is None:
+                for name, step in list(pending.items()):
+                    if all(dependency in results for dependency in step.requires):
+                        del pending[name]
+                        running[executor.submit(_timed_step, step, results)] = step
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                try:
+                    value, start, end = future.result()
+                except Exception as e:
+                    failure = failure or ProvisioningError(step.name, f"{step.error} ({e})")
+                    continue
+
+                timings[step.name] = (start - origin, end - origin)
+                if tracer is not None:
+                    tracer.record('step', step.name, start, end, error=value is None and not step.optional,
+                                  **(trace_attributes or {}))
+                if value is None and not step.optional:
+                    failure = failure or ProvisioningError(step.name, step.error)
+                    continue
+                results[step.name] = value
+                if checkpoint is not None and step.checkpoint is not None and value is not None:
+                    checkpoint(step.name, step.checkpoint(value))
+
+    if failure:
+        raise failure
+    if pending:
+        raise ProvisioningError(", ".join(pending), "dependency cycle detected.")
+
+    return results, timings
+
+def critical_path(steps, timings):
+    """
+    Find the chain of steps which determined the total run time.
+    
+    Starting from the step which finished last, repeatedly follow the
+    dependency which finished last.
+    
+    Args:
+        steps: List of ProvisioningStep
+        timings: Step timings returned by run_provisioning_steps()
+        
+    Returns:
+        List of step names, in execution order
+    """
+    if not timings:
+        return []
+
+    by_name = {step.name: step for step in steps}
+    path = [max(timings, key=lambda name: timings[name][1])]
+    while True:
+        dependencies = [name for name in by_name[path[-1]].requires if name in timings]
+        if not dependencies:
+            break
+        path.append(max(dependencies, key=lambda name: timings[name][1]))
+
+    return list(reversed(path))
+
+def print_critical_path(steps, timings):
+    """Print the critical path and the total run time of the provisioning steps."""
+    path = critical_path(steps, timings)
+    if not path:
+        return
+
+    total = timings[path[-1]][1]
+    chain = " -> ".join(f"{name} ({timings[name][1] - timings[name][0]:.2f}s)" for name in path)
+    print(f"Provisioning completed in {total:.2f}s, critical path: {chain}")
+
+def agent_checkpoint(agent):
+    """The fields of a created agent used by later steps and the configuration."""
+    return {field: agent.get(field) for field in ('id', 'client_secret', 'did')}
+
+def build_provisioning_steps(client, admin_name, admin_password, vical_base_url,
+                             dmv_agent_name=DMV_AGENT_NAME, bank_agent_name=BANK_AGENT_NAME, state=None,
+                             agent_index=None, snapshot=None, registry_index=None):
+    """
+    Declare the provisioning steps and the dependencies between them.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        admin_name: Tenant admin client ID
+        admin_password: Tenant admin client secret
+        vical_base_url: Base URL used to build the issuer VICAL URL
+        dmv_agent_name: Name of the issuer agent
+        bank_agent_name: Name of the verifier agent
+        state: Optional ProvisioningState, when given objects which already
+            exist with an unchanged payload are not created again
+        agent_index: Optional AgentIndex shared by the steps of many tenants
+        snapshot: Optional AgencySnapshot, used to look up agents and trust
+            registries and to check that reconciled objects still exist
+        registry_index: Optional TrustRegistryIndex shared by the steps of
+            many tenants
+        
+    Returns:
+        List of ProvisioningStep
+    """
+    if snapshot is not None:
+        agent_index = snapshot
+        registry_index = snapshot.registry_index
+
+    def admin_token(results):
+        print("Getting an access token...")
+        return get_access_token(client, admin_name, admin_password)
+
+    def agent(name, agent_type, results):
+        agent = create_agent(client, results['admin_token'], "", name, False, agent_type, agent_index)
+        if agent and state is not None:
+            # Agents are looked up by name rather than reconciled, they are
+            # recorded so that the teardown of the state file deletes them
+            state.record(ProvisioningState.key(client.agency_url, 'agent', name), agent['id'], None)
+        return agent
+
+    def dmv_agent(results):
+        return agent(dmv_agent_name, "issuer", results)
+
+    def bank_agent(results):
+        return agent(bank_agent_name, "verifier", results)
+
+    def dmv_token(results):
+        print("Generating DMV access token...")
+        agent = results['dmv_agent']
+        return get_access_token(client, agent.get('id'), agent.get('client_secret'))
+
+    def bank_token(results):
+        print("Generating Bank access token...")
+        agent = results['bank_agent']
+        return get_access_token(client, agent.get('id'), agent.get('client_secret'))
+
+    def create_or_reconcile(kind, name, access_token, build_payload, create, fingerprint=None):
+        # Returns the object ID and whether it was created rather than kept
+        if state is None:
+            return create(), True
+        return reconcile_object(client, access_token, state, kind, name, build_payload(), create, fingerprint,
+                                snapshot)
+
+    def credential_schema(results):
+        print("Creating credential schema...")
+        schema = get_credential_schema()
+        schema_id, created = create_or_reconcile(
+            'credential_schema', dmv_agent_name, results['dmv_token'],
+            lambda: schema.payload,
+            lambda: create_oid4vci_credential_schema(client, results['dmv_token']),
+            schema.fingerprint)
+        if schema_id:
+            print(f"{'Created' if created else 'Unchanged'} credential schema with ID: {schema_id}")
+        return schema_id
+
+    def credential_definition(results):
+        print("Creating credential definition...")
+        definition_id, created = create_or_reconcile(
+            'credential_definition', dmv_agent_name, results['dmv_token'],
+            lambda: build_credential_definition_payload(results['credential_schema']),
+            lambda: create_oid4vci_credential_definition(client, results['dmv_token'], results['credential_schema']))
+        if definition_id:
+            print(f"{'Created' if created else 'Unchanged'} credential definition with ID: {definition_id}")
+        return definition_id
+
+    def exchange_template(results):
+        print("Creating exchange template...")
+        template_id, created = create_or_reconcile(
+            'exchange_template', bank_agent_name, results['bank_token'],
+            build_exchange_template_payload,
+            lambda: create_oid4vp_exchange_template(client, results['bank_token']))
+        if template_id:
+            print(f"{'Created' if created else 'Unchanged'} exchange template with ID: {template_id}")
+        return template_id
+
+    def trusted_authority(results):
+        # Add the issuer to the verifiers trusted authorities list
+        print("Adding issuer to the verifiers trusted authorities...")
+        issuer_vical_url: str = create_isvdc_issuer_vical_url(vical_base_url, results['dmv_agent'].get('id'))
+
+        reused = False
+
+        def create():
+            nonlocal reused
+            issuing_authority = create_trusted_authority(client, results['admin_token'], issuer_vical_url,
+                                                         registry_index=registry_index)
+            if not issuing_authority:
+                return None
+            reused = issuing_authority.get('existing', False)
+            return issuing_authority.get('id')
+
+        issuing_authority_id, created = create_or_reconcile(
+            'trust_registry', dmv_agent_name, results['admin_token'],
+            lambda: build_trusted_authority_payload(issuer_vical_url), create)
+        if issuing_authority_id:
+            action = 'Unchanged' if not created else 'Reusing' if reused else 'Created'
+            print(f"{action} trusted issuing authority with ID: {issuing_authority_id}")
+        return issuing_authority_id
+
+    def vical_fetch(results):
+        # Runs in the background of the other steps, which do not need it
+        registry_id = results['trusted_authority']
+        if not registry_id:
+            return None
+        issuer_vical_url = create_isvdc_issuer_vical_url(vical_base_url, results['dmv_agent'].get('id'))
+        return refresh_vical(client, results['admin_token'], registry_id, issuer_vical_url, state)[0]
+
+    return [
+        ProvisioningStep('admin_token', admin_token,
+                         error="failed to obtain an access token.", checkpoint=None),
+        ProvisioningStep('dmv_agent', dmv_agent, ['admin_token'],
+                         error="failed to create DMV agent.", checkpoint=agent_checkpoint),
+        ProvisioningStep('bank_agent', bank_agent, ['admin_token'],
+                         error="failed to create Bank agent.", checkpoint=agent_checkpoint),
+        ProvisioningStep('dmv_token', dmv_token, ['dmv_agent'],
+                         error="failed to obtain DMV access token.", checkpoint=None),
+        ProvisioningStep('bank_token', bank_token, ['bank_agent'],
+                         error="failed to obtain Bank access token.", checkpoint=None),
+        ProvisioningStep('credential_schema', credential_schema, ['dmv_token'],
+                         error="failed to create credential schema."),
+        ProvisioningStep('credential_definition', credential_definition, ['dmv_token', 'credential_schema'],
+                         error="failed to create credential definition."),
+        ProvisioningStep('exchange_template', exchange_template, ['bank_token'],
+                         error="failed to create exchange template."),
+        ProvisioningStep('trusted_authority', trusted_authority, ['admin_token', 'dmv_agent'],
+                         error="failed to create trusted authority.", optional=True),
+        ProvisioningStep('vical_fetch', vical_fetch, ['admin_token', 'dmv_agent', 'trusted_authority'],
+                         error="failed to fetch the issuer VICAL.", optional=True),
+    ]
@@ -0,0 +1,158 @@
+"""
+Provisioning of the same issuer and verifier on several agencies at once.
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from .config import build_provisioned_config, emit_config
+from .http import POOL_MAXSIZE, ProvisioningClient, TokenCache
+from .journal import StepJournal
+from .limiter import create_limiter
+from .steps import ProvisioningError, build_provisioning_steps, critical_path, run_provisioning_steps
+from .tenants import load_manifest
+
+# Target names are used in file names
+TARGET_NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]*$')
+
+def load_targets(path):
+    """
+    Read the agencies to provision from a targets file.
+
+    Targets are listed like manifest tenants, see load_manifest(), a YAML
+    mapping holding them in a 'targets' list. Each target needs a 'name',
+    an 'agency_url' and a 'token_endpoint', and may set 'vical_base_url',
+    'admin_name' and 'admin_password', which default to the VICAL_BASE_URL,
+    ADMIN_NAME and ADMIN_PASSWORD environment variables.
+
+    Args:
+        path: Path to the targets file
+
+    Returns:
+        List of target dictionaries
+
+    Raises:
+        ValueError: If a target is incomplete or two targets share a name
+    """
+    targets = []
+    names = set()
+    for target in load_manifest(path, 'targets'):
+        missing = [key for key in ('name', 'agency_url', 'token_endpoint') if not target.get(key)]
+        if missing:
+            raise ValueError(f"target {target.get('name', len(targets) + 1)} has no {', '.join(missing)}")
+        if not TARGET_NAME_PATTERN.match(target['name']):
+            raise ValueError(f"target name '{target['name']}' cannot be used in file names")
+        if target['name'] in names:
+            raise ValueError(f"target name '{target['name']}' is used more than once")
+        names.add(target['name'])
+        targets.append(target)
+    return targets
+
+def target_path(path, name):
+    """Derive the file of a target from a shared file name, e.g. state.json to state-dev.json."""
+    root, extension = os.path.splitext(path)
+    return f"{root}-{name}{extension}"
+
+def provision_target(target, app_settings, config_formats, config_dir, journal_path, resume=False, state=None,
+                     tracer=None, transport=None, adaptive=False, rate_limits=None):
+    """
+    Provision the issuer and verifier on one target and write its
+    configuration to config_dir/<name>.
+
+    The target gets its own client, so its own connection pool, token cache
+    and concurrency limiter, and its own step journal.
+
+    Args:
+        target: Target dictionary from the targets file
+        app_settings: Settings returned by read_app_settings()
+        config_formats: Keys of CONFIG_FILES to write
+        config_dir: Directory receiving a directory per target
+        journal_path: Step journal path, suffixed with the target name, or
+            None to run without a journal
+        resume: Replay the journal of the target
+        state: Optional ProvisioningState used to reconcile existing objects
+        tracer: Optional Tracer shared by all targets
+        transport: Optional name of the HTTP transport
+        adaptive: Adapt the requests in flight to the target, see
+            ConcurrencyLimiter
+        rate_limits: Optional list of (endpoint, requests per second) pairs
+
+    Returns:
+        Result record for the target
+    """
+    name = target['name']
+    agency_url = target['agency_url']
+    record = {'target': name, 'agency_url': agency_url}
+    token_cache_file = os.environ.get('TOKEN_CACHE_FILE')
+    token_cache = TokenCache(target_path(token_cache_file, name) if token_cache_file else None,
+                             os.environ.get('TOKEN_CACHE_KEY'))
+    limiter = create_limiter(POOL_MAXSIZE, adaptive, rate_limits, tracer, metric=f"concurrency_limit.{name}")
+
+    start = time.monotonic()
+    try:
+        with ProvisioningClient(agency_url, target['token_endpoint'], token_cache=token_cache, tracer=tracer,
+                                transport=transport, limiter=limiter) as client, \
+                (StepJournal(target_path(journal_path, name), agency_url).open(resume) if journal_path
+                 else nullcontext()) as journal:
+            steps = build_provisioning_steps(client,
+                                             target.get('admin_name', os.environ.get('ADMIN_NAME', 'admin')),
+                                             target.get('admin_password', os.environ.get('ADMIN_PASSWORD', 'secret')),
+                                             target.get('vical_base_url', os.environ.get('VICAL_BASE_URL')),
+                                             state=state)
+            results, timings = run_provisioning_steps(steps, completed=journal.completed() if journal else None,
+                                                      tracer=tracer, trace_attributes={'target': name},
+                                                      checkpoint=journal.checkpoint() if journal else None)
+        config = build_provisioned_config(results, agency_url, target['token_endpoint'], app_settings)
+        directory = os.path.join(config_dir, name)
+        os.makedirs(directory, exist_ok=True)
+        files = [path for path, _ in emit_config(config, config_formats, directory)]
+    except ProvisioningError as e:
+        record.update(status='failed', failed_step=e.step, error=e.message,
+                      elapsed=round(time.monotonic() - start, 3))
+        return record
+    except OSError as e:
+        record.update(status='failed', failed_step=None, error=str(e), elapsed=round(time.monotonic() - start, 3))
+        return record
+    finally:
+        if limiter is not None:
+            record['limiter'] = limiter.metrics()
+
+    record.update(
+        status='ok',
+        dmv_agent_id=results['dmv_agent'].get('id'),
+        bank_agent_id=results['bank_agent'].get('id'),
+        credential_schema_id=results['credential_schema'],
+        credential_definition_id=results['credential_definition'],
+        exchange_template_id=results['exchange_template'],
+        trusted_authority_id=results.get('trusted_authority'),
+        files=files,
+        elapsed=round(time.monotonic() - start, 3),
+        timings={step: round(end - begin, 3) for step, (begin, end) in timings.items()},
+        critical_path=critical_path(steps, timings)
+    )
+    return record
+
+def provision_targets(targets, app_settings, config_formats, config_dir, journal_path, concurrency, resume=False,
+                      state=None, tracer=None, transport=None, adaptive=False, rate_limits=None):
+    """
+    Provision every target at the same time, so that the run takes about as
+    long as the slowest target rather than the sum of all of them.
+
+    Args:
+        targets: List of target dictionaries
+        concurrency: Maximum number of targets provisioned at the same time
+        Other arguments: see provision_target()
+
+    Returns:
+        List of result records, in the order of the targets
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(targets)))) as executor:
+        futures = [
+            executor.submit(provision_target, target, app_settings, config_formats, config_dir, journal_path,
+                            resume, state, tracer, transport, adaptive, rate_limits)
+            for target in targets
+        ]
+        return [future.result() for future in futures]
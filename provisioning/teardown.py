@@ -0,0 +1,318 @@
+"""
+The teardown command, deleting the objects recorded in the state file, or
+the objects this tool created which are found by scanning the agency.
+
+Reruns without --reconcile create new schemas, definitions, exchange
+templates and trust registries every time, so agencies collect orphaned
+objects which slow down their listings. --scan selects them by name, and
+--older-than by age, keeping the objects recorded in the state file and
+those used by the JSON configuration of the apps. Agents, and the trust
+registries of the agents which remain, are only selected when
+--name-pattern names them, so a scan never deletes the live issuer and
+verifier:
+
+    python3 -m provisioning teardown --scan --older-than 7d
+    python3 -m provisioning teardown --name-pattern 'BankVerifier-load-*' --yes --concurrency 16
+"""
+
+import fnmatch
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from .agency import AgencyRequestError, get_access_token, iter_collection
+from .credentials import build_exchange_template_payload
+from .http import POOL_MAXSIZE, ProvisioningClient
+from .limiter import create_limiter
+from .schemas import CREDENTIAL_SCHEMAS
+from .settings import OBJECT_COLLECTIONS
+from .state import ProvisioningState
+
+# Collections objects are deleted from, agents included
+TEARDOWN_COLLECTIONS = {**OBJECT_COLLECTIONS, 'agent': '/v1.0/diagency/agents'}
+
+# Objects are deleted in this order, so that none is deleted while another
+# one still refers to it, and the agents owning them go last
+TEARDOWN_ORDER = ['credential_definition', 'credential_schema', 'exchange_template', 'trust_registry', 'agent']
+
+# Fields listed when scanning the agency. Credential definitions have no
+# name, they are selected with their schema
+SCAN_FIELDS = {kind: ['id', 'name', 'created'] for kind in TEARDOWN_COLLECTIONS}
+SCAN_FIELDS['credential_definition'] = ['id', 'schema_id', 'created']
+SCAN_FIELDS['trust_registry'] = ['id', 'name', 'endpoint', 'created']
+
+# Keys of the JSON configuration holding the IDs of the objects in use
+CONFIG_ID_KEYS = ['DMV_AGENT_ID', 'BANK_AGENT_ID', 'CREDENTIAL_SCHEMA_ID', 'CREDENTIAL_DEFINITION_ID',
+                  'EXCHANGE_TEMPLATE_ID']
+
+def default_name_patterns():
+    """
+    Names this tool gives to the objects it creates, as fnmatch patterns.
+    Agents are left out, they are only scanned for with --name-pattern.
+    """
+    return [
+        *(build().name for build in CREDENTIAL_SCHEMAS.values()),
+        build_exchange_template_payload()['name'],
+        "Issuer * VICAL (*)",
+        "VICAL *"
+    ]
+
+def config_object_ids(path):
+    """
+    Read the IDs of the objects used by the apps from the JSON configuration
+    written by the provision command.
+
+    Returns:
+        Set of object IDs, empty if the file does not exist
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        values = json.load(f)
+    return {values[key] for key in CONFIG_ID_KEYS if values.get(key)}
+
+def created_at(value):
+    """
+    Parse the creation time of an object, seconds since the epoch or an
+    ISO 8601 string.
+
+    Returns:
+        Seconds since the epoch, or None if the time is missing or invalid
+    """
+    if isinstance(value, (int, float)):
+        # Milliseconds since the epoch
+        return value / 1000 if value > 1e11 else float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return None
+    return None
+
+def scan_objects(client, access_token, patterns, older_than=None, keep=None, agents=False):
+    """
+    Select the objects of the agency whose name matches one of the patterns
+    and, with older_than, which were created before that many seconds ago.
+
+    Credential definitions are selected with their schema, trust registries
+    whose VICAL belongs to an agent which is not selected are kept, and
+    objects without a valid creation time are never selected by age. Every
+    collection is listed concurrently and only the selected objects, and
+    the IDs of the agents, are kept.
+
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token allowed to list the collections
+        patterns: fnmatch patterns of the object names
+        older_than: Optional minimum age, in seconds
+        keep: Optional set of object IDs and agent names never selected
+        agents: Also select agents, otherwise every agent is kept
+
+    Returns:
+        List of (None, kind, name, object ID) tuples, as returned by
+        ProvisioningState.objects() for recorded objects
+
+    Raises:
+        AgencyRequestError: If a collection could not be listed
+    """
+    keep = keep or set()
+    cutoff = time.time() - older_than if older_than else None
+
+    def selected(item):
+        if item.get('id') in keep or item.get('name') in keep:
+            return False
+        endpoint = item.get('endpoint')
+        if endpoint and any(f"/{object_id}/" in endpoint for object_id in keep):
+            return False
+        if cutoff is not None:
+            created = created_at(item.get('created'))
+            if created is None or created > cutoff:
+                return False
+        return True
+
+    def matches(item):
+        return any(fnmatch.fnmatchcase(item.get('name') or '', pattern) for pattern in patterns)
+
+    def list_kind(kind):
+        items = []
+        agent_ids = set()
+        for item in iter_collection(client, access_token, TEARDOWN_COLLECTIONS[kind], include=SCAN_FIELDS[kind]):
+            if kind == 'agent':
+                agent_ids.add(item.get('id'))
+                if not agents:
+                    continue
+            if kind != 'credential_definition' and not matches(item):
+                continue
+            if selected(item):
+                items.append(item)
+        return items, agent_ids
+
+    with ThreadPoolExecutor(max_workers=len(TEARDOWN_COLLECTIONS)) as executor:
+        futures = {kind: executor.submit(list_kind, kind) for kind in TEARDOWN_COLLECTIONS}
+        items = {kind: future.result()[0] for kind, future in futures.items()}
+        agent_ids = futures['agent'].result()[1]
+
+    schema_ids = {item.get('id') for item in items['credential_schema']}
+    items['credential_definition'] = [item for item in items['credential_definition']
+                                      if item.get('schema_id') in schema_ids]
+    # The VICAL of an agent which remains is still in use
+    remaining = agent_ids - {item.get('id') for item in items['agent']}
+    items['trust_registry'] = [item for item in items['trust_registry']
+                               if not any(f"/{agent_id}/" in (item.get('endpoint') or '')
+                                          for agent_id in remaining)]
+    return [(None, kind, item.get('name') or item.get('schema_id'), item.get('id'))
+            for kind in TEARDOWN_ORDER for item in items[kind]]
+
+def delete_object(client, headers, kind, object_id):
+    """
+    Delete one object. DELETE requests are retried by the client on
+    connection errors and 429, 502, 503 and 504 responses.
+
+    Returns:
+        None once the object is gone, otherwise an error message
+    """
+    try:
+        response = client.delete(f"{client.agency_url}{TEARDOWN_COLLECTIONS[kind]}/{object_id}", headers=headers)
+    except requests.exceptions.RequestException as e:
+        return str(e)
+    if response.status_code in (200, 202, 204, 404):
+        return None
+    return f"{response.status_code} {response.text}"
+
+def teardown_objects(client, access_token, objects, concurrency=1, state=None, dry_run=False, verbose=False):
+    """
+    Delete objects kind by kind in TEARDOWN_ORDER, with at most concurrency
+    requests in flight, so that no object is deleted before the ones which
+    refer to it.
+
+    Objects the agency no longer knows count as deleted. Deleted objects
+    recorded in the state are removed from it.
+
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token for authentication
+        objects: List of (state key or None, kind, name, object ID) tuples
+        concurrency: Maximum number of objects deleted at the same time
+        state: Optional ProvisioningState the objects were recorded in
+        dry_run: Only count (and with verbose print) the objects
+        verbose: Print every object
+
+    Returns:
+        Tuple of (deleted, failed) counts, in a dry run the objects which
+        would be deleted are counted as deleted
+    """
+    headers = {
+        'Accept': 'application/json',
+        'Authorization': f'Bearer {access_token}'
+    }
+    by_kind = {kind: [entry for entry in objects if entry[1] == kind] for kind in TEARDOWN_ORDER}
+
+    deleted = failed = 0
+    for kind, entries in by_kind.items():
+        if not entries:
+            continue
+        if dry_run:
+            print(f"  {kind:<22} {len(entries):>8} would be deleted")
+            if verbose:
+                for _, _, name, object_id in entries:
+                    print(f"    {object_id} ({name})")
+            deleted += len(entries)
+            continue
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            errors = list(executor.map(lambda entry: delete_object(client, headers, kind, entry[3]), entries))
+
+        forgotten = []
+        kind_failed = 0
+        for (key, _, name, object_id), error in zip(entries, errors):
+            if error:
+                print(f"Error> failed to delete {kind} {object_id} ({name}): {error}")
+                kind_failed += 1
+                continue
+            if verbose:
+                print(f"    deleted {object_id} ({name})")
+            if key is not None:
+                forgotten.append(key)
+        if state is not None and forgotten:
+            state.forget(*forgotten)
+
+        print(f"  {kind:<22} {len(entries) - kind_failed:>8} deleted  {kind_failed} failed  "
+              f"{time.monotonic() - start:.2f}s")
+        deleted += len(entries) - kind_failed
+        failed += kind_failed
+    return deleted, failed
+
+def main(args):
+    """Run the teardown command."""
+    agency_url = os.environ.get('AGENCY_URL')
+    oidc_token_endpoint = os.environ.get('OIDC_TOKEN_ENDPOINT')
+    if not agency_url or not oidc_token_endpoint:
+        print("Error: AGENCY_URL and OIDC_TOKEN_ENDPOINT environment variables must be provided.")
+        sys.exit(1)
+
+    scan = args.scan or args.name_pattern or args.older_than
+    if scan and args.yes and not args.name_pattern:
+        # The default patterns match the objects of every tenant sharing the
+        # agency, so deleting them must be asked for by name
+        print("Error: deleting the objects found by a scan requires --name-pattern.")
+        sys.exit(1)
+    if not scan and not os.path.exists(args.state_file):
+        print(f"Error: state file {args.state_file} not found.")
+        sys.exit(1)
+    state = ProvisioningState(args.state_file) if os.path.exists(args.state_file) else None
+
+    pool_maxsize = max(POOL_MAXSIZE, args.concurrency)
+    limiter = create_limiter(pool_maxsize, args.adaptive, args.rate_limit)
+    with ProvisioningClient(agency_url, oidc_token_endpoint, pool_maxsize, transport=args.transport,
+                            limiter=limiter) as client:
+        admin_access_token = get_access_token(client, os.environ.get('ADMIN_NAME', 'admin'),
+                                              os.environ.get('ADMIN_PASSWORD', 'secret'))
+        if not admin_access_token:
+            print("Error> failed to obtain an access token.")
+            sys.exit(1)
+
+        if scan:
+            # The objects recorded in the state file, and their agents, and
+            # the objects of the apps configuration are the ones in use
+            recorded = state.objects(agency_url) if state is not None else []
+            keep = {object_id for _, _, _, object_id in recorded} | {name for _, _, name, _ in recorded}
+            try:
+                configured = config_object_ids(args.config)
+            except (OSError, ValueError) as e:
+                print(f"Error: could not read {args.config}: {e}")
+                sys.exit(1)
+            keep |= configured
+            patterns = args.name_pattern or default_name_patterns()
+            print(f"Scanning {agency_url} for objects named {', '.join(patterns)}"
+                  f"{f', created more than {args.older_than:g}s ago' if args.older_than else ''}...")
+            try:
+                objects = scan_objects(client, admin_access_token, patterns, args.older_than, keep,
+                                       agents=bool(args.name_pattern))
+            except AgencyRequestError as e:
+                print(f"Error> could not list the agency objects: {e}")
+                sys.exit(1)
+            if recorded:
+                print(f"Keeping the {len(recorded)} objects recorded in {args.state_file} and their agents")
+            if configured:
+                print(f"Keeping the {len(configured)} objects used by {args.config}")
+        else:
+            objects = [entry for entry in state.objects(agency_url) if entry[1] in TEARDOWN_COLLECTIONS]
+
+        start = time.monotonic()
+        deleted, failed = teardown_objects(client, admin_access_token, objects, args.concurrency, state,
+                                           dry_run=not args.yes, verbose=args.list)
+
+    if not args.yes:
+        print(f"{deleted} objects would be deleted, run again with --yes to delete them.")
+        return
+    print(f"Deleted {deleted} objects ({failed} failed) in {time.monotonic() - start:.2f}s")
+    if limiter is not None:
+        print(limiter.summary())
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,236 @@
+"""
+Bulk provisioning of the tenants listed in a manifest.
+"""
+
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .agency import AgentIndex, TrustRegistryIndex, get_access_token
+from .settings import BANK_AGENT_NAME, DEFAULT_TENANT_CONCURRENCY, DMV_AGENT_NAME
+from .steps import ProvisioningError, build_provisioning_steps, critical_path, run_provisioning_steps
+
+def iter_manifest(path, key):
+    """
+    Read the objects listed in a manifest file, with their location.
+    
+    JSONL manifests contain one object per line and are read incrementally.
+    YAML manifests (which require PyYAML) contain either a list of objects
+    or a mapping holding the list under key.
+    
+    Args:
+        path: Path to the manifest file
+        key: Key of the list in a YAML mapping
+        
+    Yields:
+        Tuples of (location, object), the location being the path and the
+        line number, or the position in the YAML list
+        
+    Raises:
+        ValueError: If a JSONL line is not valid JSON
+    """
+    if path.lower().endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            print("Error: PyYAML is required to read YAML manifests (pip install pyyaml).")
+            sys.exit(1)
+
+        with open(path) as f:
+            manifest = yaml.safe_load(f) or []
+        if isinstance(manifest, dict):
+            manifest = manifest.get(key, [])
+        for number, item in enumerate(manifest, 1):
+            yield f"{path}: {key} entry {number}", item
+        return
+
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if line and not line.startswith('#'):
+                try:
+                    yield f"{path}:{number}", json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"{path}:{number}: {e}") from e
+
+def load_manifest(path, key):
+    """
+    Read the objects listed in a manifest file, see iter_manifest().
+    
+    Args:
+        path: Path to the manifest file
+        key: Key of the list in a YAML mapping
+        
+    Yields:
+        Dictionaries
+    """
+    for _, item in iter_manifest(path, key):
+        yield item
+
+def load_tenant_manifest(path):
+    """
+    Read the tenants to provision from a manifest file, see iter_manifest().
+    
+    Each tenant needs a 'name', and may override 'dmv_agent_name' and
+    'bank_agent_name'. A YAML mapping holds them in a 'tenants' list.
+    
+    Args:
+        path: Path to the manifest file
+        
+    Yields:
+        Tenant dictionaries
+        
+    Raises:
+        ValueError: If a tenant has no name, with its location
+    """
+    for location, tenant in iter_manifest(path, 'tenants'):
+        if not isinstance(tenant, dict) or not tenant.get('name'):
+            raise ValueError(f"{location}: tenant has no name")
+        yield tenant
+
+def check_tenant_manifest(path):
+    """
+    Read a whole tenant manifest before any tenant is provisioned, so that
+    an invalid entry fails the run before it starts rather than midway.
+    
+    Returns:
+        Number of tenants
+        
+    Raises:
+        OSError: If the manifest cannot be read
+        ValueError: If an entry is invalid, with its location
+    """
+    return sum(1 for _ in load_tenant_manifest(path))
+
+def tenant_agent_names(tenant):
+    """Return the (issuer, verifier) agent names of a manifest tenant."""
+    name = tenant['name']
+    return (tenant.get('dmv_agent_name', f"{DMV_AGENT_NAME}-{name}"),
+            tenant.get('bank_agent_name', f"{BANK_AGENT_NAME}-{name}"))
+
+def provision_tenant(client, admin_name, admin_password, tenant, vical_base_url, state=None, agent_index=None,
+                     snapshot=None, registry_index=None, journal=None):
+    """
+    Provision the issuer and verifier objects for a single tenant.
+    
+    The admin access token is taken from the token cache of the client for
+    each tenant, so a run outlasting the token gets a new one rather than
+    failing partway.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        admin_name: Tenant admin client ID
+        admin_password: Tenant admin client secret
+        tenant: Tenant dictionary from the manifest
+        vical_base_url: Base URL used to build the issuer VICAL URL
+        state: Optional ProvisioningState used to reconcile existing objects
+        agent_index: Optional AgentIndex shared by all tenants
+        snapshot: Optional AgencySnapshot shared by all tenants
+        registry_index: Optional TrustRegistryIndex shared by all tenants
+        journal: Optional StepJournal recording the completed steps of the
+            tenant, whose steps replayed from it are not run again
+        
+    Returns:
+        Result record for the tenant
+    """
+    name = tenant['name']
+    dmv_agent_name, bank_agent_name = tenant_agent_names(tenant)
+    steps = build_provisioning_steps(client, admin_name, admin_password, vical_base_url, dmv_agent_name,
+                                     bank_agent_name, state, agent_index, snapshot, registry_index)
+
+    record = {
+        'tenant': name,
+        'dmv_agent_name': dmv_agent_name,
+        'bank_agent_name': bank_agent_name
+    }
+    completed = journal.completed(name) if journal else {}
+    resumed = sorted(completed)
+    start = time.monotonic()
+    try:
+        results, timings = run_provisioning_steps(steps, completed=completed, tracer=client.tracer,
+                                                  trace_attributes={'tenant': name},
+                                                  checkpoint=journal.checkpoint(name) if journal else None)
+    except ProvisioningError as e:
+        record.update(status='failed', failed_step=e.step, error=e.message,
+                      elapsed=round(time.monotonic() - start, 3))
+        return record
+
+    record.update(
+        status='ok',
+        dmv_agent_id=results['dmv_agent'].get('id'),
+        dmv_agent_password=results['dmv_agent'].get('client_secret'),
+        dmv_agent_did=results['dmv_agent'].get('did'),
+        bank_agent_id=results['bank_agent'].get('id'),
+        bank_agent_password=results['bank_agent'].get('client_secret'),
+        credential_schema_id=results['credential_schema'],
+        credential_definition_id=results['credential_definition'],
+        exchange_template_id=results['exchange_template'],
+        trusted_authority_id=results['trusted_authority'],
+        vical_fetched=results.get('vical_fetch') is not None,
+        elapsed=round(time.monotonic() - start, 3),
+        timings={name: round(end - begin, 3) for name, (begin, end) in timings.items()},
+        critical_path=critical_path(steps, timings)
+    )
+    if resumed:
+        record['resumed_steps'] = resumed
+    return record
+
+def provision_tenants(client, admin_name, admin_password, tenants, vical_base_url, output,
+                      concurrency=DEFAULT_TENANT_CONCURRENCY, state=None, snapshot=None, journal=None):
+    """
+    Provision many tenants, with at most `concurrency` in progress at once.
+    
+    Tenants are pulled from the iterable only as workers become free and
+    each result record is appended to the output as soon as its tenant
+    completes, so neither the manifest nor the results are held in memory.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        admin_name: Tenant admin client ID
+        admin_password: Tenant admin client secret
+        tenants: Iterable of tenant dictionaries
+        vical_base_url: Base URL used to build the issuer VICAL URL
+        output: Writable text file receiving one JSON record per tenant
+        concurrency: Maximum number of tenants provisioned at the same time
+        state: Optional ProvisioningState used to reconcile existing objects
+        snapshot: Optional AgencySnapshot, replaces the agent index and the
+            existence checks of reconciled objects
+        journal: Optional StepJournal, so that an interrupted run can be
+            resumed tenant by tenant
+        
+    Returns:
+        Tuple of (succeeded, failed) tenant counts
+    """
+    succeeded = failed = 0
+    tenants = iter(tenants)
+    running = set()
+    # Existing agents are resolved through one shared index rather than a
+    # listing per tenant
+    admin_access_token = get_access_token(client, admin_name, admin_password)
+    agent_index = snapshot or AgentIndex(client, admin_access_token)
+    registry_index = snapshot.registry_index if snapshot else TrustRegistryIndex(client, admin_access_token)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            for tenant in tenants:
+                running.add(executor.submit(provision_tenant, client, admin_name, admin_password, tenant,
+                                             vical_base_url, state, agent_index, snapshot, registry_index, journal))
+                if len(running) >= concurrency:
+                    break
+
+            if not running:
+                break
+
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+                if record['status'] == 'ok':
+                    succeeded += 1
+                else:
+                    failed += 1
+                    print(f"Error> tenant {record['tenant']} failed at {record['failed_step']}: {record['error']}")
+
+    return succeeded, failed
@@ -0,0 +1,140 @@
+"""
+Tracing of provisioning steps and agency requests.
+"""
+
+import json
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from .files import write_file_atomic
+from .settings import ID_COLLECTIONS
+
+def url_template(url, base_url=None):
+    """
+    Reduce a request URL to a template for grouping, e.g.
+    /v1.0/diagency/agents/{id}, by dropping the query and replacing the
+    path segments which follow a collection name.
+    
+    Args:
+        url: Request URL
+        base_url: Optional prefix (such as the agency URL) to strip
+        
+    Returns:
+        URL template string
+    """
+    if base_url and url.startswith(base_url):
+        url = url[len(base_url):]
+    path = urlsplit(url).path if '://' in url else url.split('?', 1)[0]
+
+    segments = path.split('/')
+    for i in range(1, len(segments)):
+        if segments[i - 1] in ID_COLLECTIONS and segments[i]:
+            segments[i] = '{id}'
+    return '/'.join(segments)
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(math.ceil(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class Tracer:
+    """
+    Collects timing spans for provisioning steps and HTTP requests.
+
+    Spans can be written to a JSON trace file and summarised as a table of
+    latency percentiles. Metrics sampled during the run, such as the
+    concurrency limit, are written with them.
+    """
+
+    def __init__(self):
+        self.spans = []
+        self.metrics = []
+        self.origin = time.monotonic()
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, kind, name, start, end, **attributes):
+        """
+        Record a span.
+        
+        Args:
+            kind: Span kind, 'step' or 'http'
+            name: Span name, e.g. the step name or 'GET /v1.0/diagency/agents'
+            start: time.monotonic() at the start of the span
+            end: time.monotonic() at the end of the span
+            attributes: Additional span attributes
+        """
+        span = {
+            'kind': kind,
+            'name': name,
+            'start': round(start - self.origin, 6),
+            'duration': round(end - start, 6)
+        }
+        span.update(attributes)
+        with self._lock:
+            self.spans.append(span)
+
+    def gauge(self, name, value):
+        """Record the current value of a metric, e.g. the concurrency limit."""
+        sample = {'name': name, 'time': round(time.monotonic() - self.origin, 6), 'value': value}
+        with self._lock:
+            self.metrics.append(sample)
+
+    def summary(self):
+        """
+        Summarise the spans by kind and name.
+        
+        Returns:
+            List of dictionaries with count, error count, latency
+            percentiles (seconds) and total bytes for each span name
+        """
+        groups = {}
+        with self._lock:
+            for span in self.spans:
+                groups.setdefault((span['kind'], span['name']), []).append(span)
+
+        rows = []
+        for (kind, name), spans in sorted(groups.items()):
+            durations = sorted(span['duration'] for span in spans)
+            rows.append({
+                'kind': kind,
+                'name': name,
+                'count': len(spans),
+                'errors': sum(1 for span in spans if span.get('error')),
+                'p50': percentile(durations, 0.5),
+                'p90': percentile(durations, 0.9),
+                'p99': percentile(durations, 0.99),
+                'max': durations[-1],
+                'bytes_out': sum(span.get('bytes_out') or 0 for span in spans),
+                'bytes_in': sum(span.get('bytes_in') or 0 for span in spans)
+            })
+        return rows
+
+    def write(self, path):
+        """Write the spans, the metrics and the summary to a JSON trace file."""
+        with self._lock:
+            spans = list(self.spans)
+            metrics = list(self.metrics)
+        trace = {
+            'started_at': datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(),
+            'spans': spans,
+            'metrics': metrics,
+            'summary': self.summary()
+        }
+        write_file_atomic(path, json.dumps(trace, indent=2))
+
+    def print_summary(self):
+        """Print the summary as a table, latencies in milliseconds."""
+        print(f"{'kind':<5} {'name':<70} {'count':>6} {'errors':>6} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+        for row in self.summary():
+            latencies = ' '.join(f"{row[key] * 1000:>9.1f}" for key in ('p50', 'p90', 'p99', 'max'))
+            print(f"{row['kind']:<5} {row['name'][:70]:<70} {row['count']:>6} {row['errors']:>6} {latencies}")
+
+# Name of the provisioning step running on the current thread, attached to
+# the HTTP spans it makes
+current_step = threading.local()
@@ -0,0 +1,364 @@
+"""
+Trust registries and the VICALs they fetch.
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+from .agency import AgencyRequestError, TrustRegistryIndex, iter_collection
+from .http import retry_after_delay
+from .settings import (
+    DEFAULT_TENANT_CONCURRENCY, OBJECT_COLLECTIONS, VICAL_FETCH_DONE_STATES, VICAL_FETCH_FAILED_STATES,
+    VICAL_FETCH_TIMEOUT, VICAL_POLL_BASE_DELAY, VICAL_POLL_MAX_DELAY
+)
+
+def create_isvdc_issuer_vical_url(vicalBaseUrl, issuer_agent_id) -> str:
+    """
+    Create ISVDC issuer VICAL URL.
+    """
+
+    return f'{vicalBaseUrl}/v1.0/diagency/trust/anchor/{issuer_agent_id}/vical'
+
+
+def trust_registry_name(vicalUrl):
+    """
+    Derive a descriptive registry name from a VICAL URL.
+    
+    Issuer VICALs published by an agency are named after the agency host
+    and the issuer agent ID, other VICALs after their host and path.
+    """
+    url = urlsplit(vicalUrl)
+    parts = [part for part in url.path.split('/') if part]
+    if 'anchor' in parts and parts.index('anchor') + 1 < len(parts):
+        return f"Issuer {parts[parts.index('anchor') + 1]} VICAL ({url.hostname})"
+    return f"VICAL {url.hostname}{url.path}"
+
+def build_trusted_authority_payload(vicalUrl, name=None):
+    """
+    Build the remote trust registry payload.
+    
+    Args:
+        vicalUrl: VICAL that contains issuer trust anchor cert
+        name: Optional registry name, derived from the URL by default
+        
+    Returns:
+        Remote registry as dictionary
+    """
+    return {
+        "name": name or trust_registry_name(vicalUrl),
+        "activated": True,
+        "endpoint": vicalUrl,
+        "registryType": "vical",
+        "entityType": "issuer"
+    }
+
+def find_trust_registry_id(client, access_token, vicalUrl):
+    """
+    Find the ID of the remote trust registry pulling the given VICAL.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token for authentication
+        vicalUrl: VICAL endpoint of the registry
+        
+    Returns:
+        Registry ID, or None if there is no such registry
+    """
+    for item in iter_collection(client, access_token, OBJECT_COLLECTIONS['trust_registry'],
+                                item_filter={'endpoint': vicalUrl}, include=['id', 'endpoint']):
+        if item.get('endpoint') == vicalUrl:
+            return item.get('id')
+    return None
+
+def create_trusted_authority(client, access_token, vicalUrl, name=None, registry_index=None):
+    """
+    Create trusted authority.
+    
+    A registry which already pulls the same VICAL is reused rather than
+    registered again. The registry is only created here, the agency is
+    asked to pull the VICAL by fetch_trusted_authority().
+    
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token for authentication
+        vicalUrl: VICAL that contains issuer trust anchor cert)
+        name: Optional registry name, derived from the URL by default
+        registry_index: Optional TrustRegistryIndex used to look up
+            existing registries
+        
+    Returns:
+        Remote registry data as dictionary, with 'existing' set when an
+        existing registry is reused
+    """
+    headers = {
+        'Content-Type': 'application/json',
+        'Accept': 'application/json',
+        'Authorization': f'Bearer {access_token}'
+    }
+
+    try:
+        if registry_index is not None:
+            registry_id = registry_index.lookup(vicalUrl)
+        else:
+            registry_id = find_trust_registry_id(client, access_token, vicalUrl)
+    except AgencyRequestError as e:
+        print(f"Error getting trust registries: {e.response.text}")
+        return None
+
+    if registry_id:
+        print(f"Trust registry for {vicalUrl} already exists: {registry_id}")
+        return {'id': registry_id, 'endpoint': vicalUrl, 'existing': True}
+    
+    reg_payload = build_trusted_authority_payload(vicalUrl, name)
+
+    # Create a reference to a remote registry
+    dc_remote_reg_url = f"{client.agency_url}/v1.0/diagency/trust/remote_providers/registries"
+    response = client.post(
+        url=dc_remote_reg_url,
+        headers=headers,
+        json=reg_payload
+    )
+    
+    if response.status_code not in [200, 201]:
+        print(f"Error creating trust registry: {response.text}")
+        return None
+
+    registry = response.json()
+    print(f"Successfully created trust registry: {registry}")
+    if registry_index is not None:
+        registry_index.add(vicalUrl, registry.get('id'))
+    return registry
+
+def check_vical_modified(client, vical_url, validators=None):
+    """
+    Check whether a VICAL changed since it was last fetched.
+    
+    A conditional HEAD request is sent with the ETag and Last-Modified
+    recorded at the previous fetch, so the VICAL itself is never
+    downloaded here. The check is sent once, outside the retries and the
+    circuit breaker of the agency calls: the VICAL may only be reachable
+    from the agency, in which case the fetch is simply triggered.
+    
+    Args:
+        client: ProvisioningClient
+        vical_url: URL of the VICAL
+        validators: Optional {'etag', 'last_modified'} of the previous fetch
+        
+    Returns:
+        Tuple of (modified, validators) where validators are the current
+        ones. A VICAL which cannot be checked is treated as modified.
+    """
+    validators = validators or {}
+    headers = {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+
+    try:
+        response = client.probe('HEAD', vical_url, headers=headers)
+    except requests.exceptions.RequestException as e:
+        print(f"Could not check VICAL {vical_url}: {e}")
+        return True, {}
+
+    if response.status_code == 304:
+        return False, validators
+    if response.status_code != 200:
+        return True, {}
+    return True, {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified')
+    }
+
+def poll_registry_fetch(client, headers, registry_url, timeout=VICAL_FETCH_TIMEOUT):
+    """
+    Poll a remote registry until the agency has finished fetching it.
+    
+    Polls back off exponentially, honouring any Retry-After header.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        headers: Request headers, including the authorization
+        registry_url: URL of the remote registry
+        timeout: Maximum time to wait, in seconds
+        
+    Returns:
+        Registry data as dictionary, or None if the fetch failed or did not
+        complete in time
+    """
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        response = client.get(registry_url, headers=headers)
+        if response.status_code != 200:
+            print(f"Error polling remote registry: {response.text}")
+            return None
+
+        registry = response.json()
+        fetch_state = registry.get('state')
+        if fetch_state in VICAL_FETCH_FAILED_STATES:
+            print(f"Remote registry fetch failed: {registry}")
+            return None
+        if fetch_state in VICAL_FETCH_DONE_STATES or (fetch_state is None and registry.get('last_fetched')):
+            return registry
+
+        attempt += 1
+        delay = retry_after_delay(response) or min(VICAL_POLL_MAX_DELAY, VICAL_POLL_BASE_DELAY * 2 ** (attempt - 1))
+        if time.monotonic() + delay > deadline:
+            print(f"Timed out waiting for the remote registry fetch after {timeout}s")
+            return None
+        time.sleep(delay)
+
+def fetch_trusted_authority(client, access_token, registry_id, timeout=VICAL_FETCH_TIMEOUT):
+    """
+    Ask the agency to pull the VICAL of a remote registry and wait for it.
+    
+    An agency which fetches asynchronously answers 202, the registry is
+    then polled until the fetch completes.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token for authentication
+        registry_id: Remote registry ID
+        timeout: Maximum time to wait for an asynchronous fetch, in seconds
+        
+    Returns:
+        Registry ID, or None if the fetch failed
+    """
+    headers = {
+        'Accept': 'application/json',
+        'Authorization': f'Bearer {access_token}'
+    }
+    registry_url = f"{client.agency_url}/v1.0/diagency/trust/remote_providers/registries/{registry_id}"
+
+    print(f"Fetching VICAL data from {registry_url}/fetch")
+    response = client.post(f"{registry_url}/fetch", headers=headers, idempotent=True)
+    if response.status_code not in [200, 201, 202]:
+        print(f"Error fetch data from remote registry: {response.text}")
+        return None
+
+    if response.status_code == 202 and poll_registry_fetch(client, headers, registry_url, timeout) is None:
+        return None
+
+    print(f"Successfully fetched registry data for {registry_id}")
+    return registry_id
+
+# VICAL validators of the current run, used when there is no state file
+_vical_validators = {}
+_vical_validators_lock = threading.Lock()
+
+def refresh_vical(client, access_token, registry_id, vical_url, state=None):
+    """
+    Have the agency pull a registry's VICAL, unless it is unchanged since
+    the last fetch.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token for authentication
+        registry_id: Remote registry ID
+        vical_url: VICAL endpoint of the registry
+        state: Optional ProvisioningState keeping the VICAL validators
+            between runs
+        
+    Returns:
+        Tuple of (registry ID or None if the fetch failed, whether it was fetched)
+    """
+    key = f"{client.agency_url}|vical|{registry_id}"
+    if state is not None:
+        previous = state.get_validators(key)
+    else:
+        with _vical_validators_lock:
+            previous = _vical_validators.get(key)
+
+    modified, validators = check_vical_modified(client, vical_url, previous)
+    if not modified:
+        print(f"VICAL {vical_url} is unchanged, not fetching it again")
+        return registry_id, False
+    if not fetch_trusted_authority(client, access_token, registry_id):
+        return None, False
+
+    if state is not None:
+        state.record_validators(key, validators)
+    else:
+        with _vical_validators_lock:
+            _vical_validators[key] = validators
+    return registry_id, True
+
+def load_trust_anchors(path):
+    """
+    Read the VICALs to register from a file.
+    
+    Each line holds either a VICAL URL or a JSON object with a 'url' and
+    an optional registry 'name'. Blank lines and # comments are ignored.
+    
+    Args:
+        path: Path to the file
+        
+    Returns:
+        List of {'url', 'name'} dictionaries
+    """
+    anchors = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            anchor = json.loads(line) if line.startswith('{') else {'url': line}
+            anchors.append({'url': anchor['url'], 'name': anchor.get('name')})
+    return anchors
+
+def sync_trust_registries(client, access_token, anchors, concurrency=DEFAULT_TENANT_CONCURRENCY,
+                          registry_index=None, state=None):
+    """
+    Register many issuer VICALs as remote trust registries.
+    
+    Existing registries are listed once and indexed by endpoint, so only
+    the missing VICALs are registered and each endpoint is registered at
+    most once. Registration and the fetches run on a bounded thread pool.
+    The VICAL checks do not count towards the circuit breaker of the
+    agency, see check_vical_modified(), so unreachable VICAL hosts only
+    cost a fetch each rather than stopping the sync.
+    
+    Args:
+        client: ProvisioningClient for the agency
+        access_token: Access token allowed to manage trust registries
+        anchors: Iterable of {'url', 'name'} dictionaries
+        concurrency: Maximum number of VICALs processed at the same time
+        registry_index: Optional TrustRegistryIndex, e.g. of a snapshot
+        state: Optional ProvisioningState keeping the VICAL validators
+        
+    Returns:
+        List of result records, one per distinct VICAL URL
+    """
+    if registry_index is None:
+        registry_index = TrustRegistryIndex(client, access_token)
+    unique = {}
+    for anchor in anchors:
+        unique.setdefault(anchor['url'], anchor)
+
+    try:
+        existing = {url: registry_index.lookup(url) for url in unique}
+    except AgencyRequestError as e:
+        print(f"Error getting trust registries: {e.response.text}")
+        return [{'url': url, 'name': anchor.get('name'), 'status': 'failed', 'id': None, 'fetched': False}
+                for url, anchor in unique.items()]
+
+    def sync(anchor):
+        record = {'url': anchor['url'], 'name': anchor.get('name'), 'fetched': False}
+        registry = create_trusted_authority(client, access_token, anchor['url'], anchor.get('name'), registry_index)
+        if not registry:
+            return dict(record, status='failed', id=None)
+        record.update(id=registry.get('id'), status='existing' if existing[anchor['url']] else 'created')
+        registry_id, fetched = refresh_vical(client, access_token, record['id'], anchor['url'], state)
+        if registry_id is None:
+            record['status'] = 'failed'
+        record['fetched'] = fetched
+        return record
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(sync, unique.values()))
@@ -0,0 +1,12 @@
+import pytest
+
+from provisioning.mock_agency import MockAgency
+
+@pytest.fixture
+def agency():
+    """Mock agency served on a free local port for the duration of a test."""
+    agency = MockAgency().start()
+    try:
+        yield agency
+    finally:
+        agency.stop()
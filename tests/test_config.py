@@ -0,0 +1,21 @@
+from provisioning.config import render_env
+from provisioning.settings import SECRET_MASK
+
+CONFIG = [
+    ('Agency', [('AGENCY_URL', 'https://agency.example', False), ('AGENT_SECRET', 's3cr3t', True)]),
+    ('Identity provider', [('IDP_CLIENT_SECRET', '', True)]),
+]
+
+def test_render_env():
+    assert render_env(CONFIG) == (
+        "# Agency\nAGENCY_URL=https://agency.example\nAGENT_SECRET=s3cr3t\n\n"
+        "# Identity provider\nIDP_CLIENT_SECRET="
+    )
+
+def test_render_env_masks_secrets():
+    rendered = render_env(CONFIG, mask_secrets=True)
+    assert 's3cr3t' not in rendered
+    assert f"AGENT_SECRET={SECRET_MASK}" in rendered
+    assert "AGENCY_URL=https://agency.example" in rendered
+    # Empty secrets are shown as missing rather than masked
+    assert rendered.endswith("IDP_CLIENT_SECRET=")
@@ -0,0 +1,61 @@
+from provisioning.agency import get_access_token
+from provisioning.http import ProvisioningClient
+from provisioning.mock_agency import COLLECTIONS
+from provisioning.state import ProvisioningState
+from provisioning.steps import build_provisioning_steps, run_provisioning_steps
+from provisioning.teardown import TEARDOWN_COLLECTIONS, teardown_objects
+
+PROVISIONED_COLLECTIONS = COLLECTIONS[:5]
+
+def provision(client, agency, state):
+    steps = build_provisioning_steps(client, 'admin', 'secret', agency.agency_url, state=state)
+    results, _ = run_provisioning_steps(steps)
+    return results
+
+def test_provision_reconcile_and_teardown(agency, tmp_path, capsys):
+    state = ProvisioningState(str(tmp_path / 'state.json'))
+    with ProvisioningClient(agency.agency_url, agency.token_endpoint) as client:
+        results = provision(client, agency, state)
+        for name in ('credential_schema', 'credential_definition', 'exchange_template', 'trusted_authority'):
+            assert results[name]
+        assert results['vical_fetch']
+        counts = {path: len(agency.collections[path]) for path in PROVISIONED_COLLECTIONS}
+        assert counts == {
+            '/v1.0/diagency/agents': 2,
+            '/v2.0/diagency/credential_schemas': 1,
+            '/v2.0/diagency/credential_definitions': 1,
+            '/v1.0/oidvc/vp/exchange_templates': 1,
+            '/v1.0/diagency/trust/remote_providers/registries': 1
+        }
+
+        # Written as the objects were recorded, so a new run reads them back
+        state = ProvisioningState(state.path)
+        capsys.readouterr()
+        rerun = provision(client, agency, state)
+        assert "Created" not in capsys.readouterr().out
+        assert rerun['credential_definition'] == results['credential_definition']
+        assert {path: len(agency.collections[path]) for path in PROVISIONED_COLLECTIONS} == counts
+
+        objects = [entry for entry in state.objects(agency.agency_url) if entry[1] in TEARDOWN_COLLECTIONS]
+        assert sorted(kind for _, kind, _, _ in objects) == [
+            'agent', 'agent', 'credential_definition', 'credential_schema', 'exchange_template', 'trust_registry'
+        ]
+        admin_token = get_access_token(client, 'admin', 'secret')
+        deleted, failed = teardown_objects(client, admin_token, objects, concurrency=4, state=state)
+
+    assert (deleted, failed) == (6, 0)
+    assert all(not agency.collections[path] for path in PROVISIONED_COLLECTIONS)
+    assert ProvisioningState(state.path).objects() == []
+
+def test_changed_object_replaces_the_old_one(agency, tmp_path):
+    state = ProvisioningState(str(tmp_path / 'state.json'))
+    with ProvisioningClient(agency.agency_url, agency.token_endpoint) as client:
+        first = provision(client, agency, state)
+        key = ProvisioningState.key(agency.agency_url, 'exchange_template', 'BankVerifier')
+        state.record(key, first['exchange_template'], 'changed')
+
+        second = provision(client, agency, state)
+
+    templates = agency.collections['/v1.0/oidvc/vp/exchange_templates']
+    assert second['exchange_template'] != first['exchange_template']
+    assert list(templates) == [second['exchange_template']]
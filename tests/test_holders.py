@@ -0,0 +1,28 @@
+import random
+from datetime import date
+
+import pytest
+
+from provisioning.holders import MAX_HOLDER_AGE, MIN_DRIVING_AGE, add_years, age_on, holder_attributes
+
+@pytest.mark.parametrize('today', [date(2026, 10, 17), date(2028, 2, 29)])
+def test_holder_dates_are_consistent(today):
+    for index in range(500):
+        attributes = holder_attributes(random.Random(index), index, today)
+        birth_date = date.fromisoformat(attributes['birth_date'])
+        issue_date = date.fromisoformat(attributes['issue_date'])
+        expiry_date = date.fromisoformat(attributes['expiry_date'])
+
+        assert age_on(birth_date, today) >= MIN_DRIVING_AGE
+        assert age_on(birth_date, today) <= MAX_HOLDER_AGE
+        assert age_on(birth_date, issue_date) >= MIN_DRIVING_AGE
+        assert issue_date <= today < expiry_date
+        assert attributes['document_number'] == f"DL-{index:09d}"
+
+def test_holders_are_reproducible():
+    today = date(2026, 10, 17)
+    assert holder_attributes(random.Random(7), 7, today) == holder_attributes(random.Random(7), 7, today)
+
+def test_add_years_from_29_february():
+    assert add_years(date(2024, 2, 29), 1) == date(2025, 2, 28)
+    assert add_years(date(2024, 2, 29), 4) == date(2028, 2, 29)
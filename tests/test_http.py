@@ -0,0 +1,53 @@
+from provisioning import http
+from provisioning.http import TokenCache
+
+ENDPOINT = 'https://idp.example/token'
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def fetcher(expires_in):
+    calls = []
+
+    def fetch():
+        calls.append(None)
+        return f"token-{len(calls)}", expires_in
+
+    return fetch, calls
+
+def test_token_reused_until_refresh_margin(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(http.time, 'time', clock)
+    cache = TokenCache(refresh_margin=30)
+    fetch, calls = fetcher(300)
+
+    assert cache.get(ENDPOINT, 'admin', 'secret', fetch) == 'token-1'
+    clock.now += 269
+    assert cache.get(ENDPOINT, 'admin', 'secret', fetch) == 'token-1'
+    clock.now += 1
+    assert cache.get(ENDPOINT, 'admin', 'secret', fetch) == 'token-2'
+    assert len(calls) == 2
+
+def test_refresh_margin_capped_at_half_lifetime(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(http.time, 'time', clock)
+    cache = TokenCache(refresh_margin=30)
+    fetch, calls = fetcher(20)
+
+    cache.get(ENDPOINT, 'admin', 'secret', fetch)
+    clock.now += 9
+    assert cache.get(ENDPOINT, 'admin', 'secret', fetch) == 'token-1'
+    clock.now += 1
+    assert cache.get(ENDPOINT, 'admin', 'secret', fetch) == 'token-2'
+
+def test_token_not_reused_for_another_secret():
+    cache = TokenCache()
+    fetch, calls = fetcher(300)
+
+    cache.get(ENDPOINT, 'admin', 'secret', fetch)
+    assert cache.get(ENDPOINT, 'admin', 'other', fetch) == 'token-2'
+    assert cache.get(ENDPOINT, 'other-client', 'other', fetch) == 'token-3'
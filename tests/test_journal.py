@@ -0,0 +1,42 @@
+from provisioning.journal import StepJournal
+
+AGENCY_URL = 'https://agency.example/diagency'
+
+def test_replay_returns_recorded_results(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    with StepJournal(path, AGENCY_URL).open() as journal:
+        journal.record(None, 'dmv_agent', {'id': 'a1'})
+        journal.record('tenant-1', 'credential_schema', 's1')
+        journal.checkpoint('tenant-1')('credential_definition', 'd1')
+
+    with StepJournal(path, AGENCY_URL).open(resume=True) as journal:
+        assert journal.completed() == {'dmv_agent': {'id': 'a1'}}
+        assert journal.completed('tenant-1') == {'credential_schema': 's1', 'credential_definition': 'd1'}
+        assert sorted(journal.scopes(), key=str) == [None, 'tenant-1']
+
+def test_replay_ignores_other_agencies(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    with StepJournal(path, 'https://other.example').open() as journal:
+        journal.record(None, 'dmv_agent', {'id': 'a1'})
+    assert StepJournal(path, AGENCY_URL).replay() == {}
+
+def test_line_cut_short_is_ignored_and_terminated(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    with StepJournal(str(path), AGENCY_URL).open() as journal:
+        journal.record(None, 'dmv_agent', {'id': 'a1'})
+    with open(path, 'a') as f:
+        f.write('{"agency_url": "https')
+
+    with StepJournal(str(path), AGENCY_URL).open(resume=True) as journal:
+        journal.record(None, 'bank_agent', {'id': 'b1'})
+    assert StepJournal(str(path), AGENCY_URL).replay() == {
+        None: {'dmv_agent': {'id': 'a1'}, 'bank_agent': {'id': 'b1'}}
+    }
+
+def test_open_without_resume_starts_again(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    with StepJournal(path, AGENCY_URL).open() as journal:
+        journal.record(None, 'dmv_agent', {'id': 'a1'})
+    with StepJournal(path, AGENCY_URL).open() as journal:
+        assert journal.completed() == {}
+    assert StepJournal(path, AGENCY_URL).replay() == {}
@@ -0,0 +1,63 @@
+import time
+
+from provisioning.limiter import ConcurrencyLimiter
+
+ENDPOINT = 'GET /v1.0/diagency/agents'
+
+def complete(limiter, latency=0.1, overloaded=False):
+    """Run one request which took latency seconds, as if it started that long ago."""
+    start = limiter.acquire(ENDPOINT)
+    limiter.release(ENDPOINT, start - latency, overloaded)
+
+def test_limit_grows_while_used():
+    limiter = ConcurrencyLimiter(16, initial=4)
+    starts = [limiter.acquire(ENDPOINT) for _ in range(4)]
+    for start in starts:
+        limiter.release(ENDPOINT, start - 0.1)
+    assert 4 < limiter.limit <= 5
+
+def test_limit_does_not_grow_while_unused():
+    limiter = ConcurrencyLimiter(16, initial=4)
+    for _ in range(10):
+        complete(limiter)
+    assert limiter.limit == 4
+
+def test_limit_halved_on_overload():
+    limiter = ConcurrencyLimiter(16, initial=8)
+    complete(limiter, overloaded=True)
+    assert int(limiter.limit) == 4
+    assert limiter.metrics()['backoffs'] == 1
+
+def test_limit_cut_once_per_round_trip():
+    limiter = ConcurrencyLimiter(16, initial=8)
+    starts = [limiter.acquire(ENDPOINT) for _ in range(3)]
+    for start in starts:
+        limiter.release(ENDPOINT, start, overloaded=True)
+    # The later failures were sent under the previous limit
+    assert int(limiter.limit) == 4
+
+def test_limit_cut_when_latency_rises():
+    limiter = ConcurrencyLimiter(16, initial=8)
+    complete(limiter, latency=0.01)
+    for _ in range(10):
+        complete(limiter, latency=0.1)
+        time.sleep(0.001)
+    assert limiter.limit < 8
+
+def test_limit_stays_within_bounds():
+    limiter = ConcurrencyLimiter(5, initial=4)
+    for _ in range(20):
+        # Sent after the previous cut, so each failure cuts the limit again
+        complete(limiter, latency=0, overloaded=True)
+        time.sleep(0.001)
+    assert limiter.limit == 1
+    starts = [limiter.acquire(ENDPOINT)]
+    for _ in range(200):
+        limiter.release(ENDPOINT, starts.pop() - 0.1)
+        starts.append(limiter.acquire(ENDPOINT))
+    assert limiter.limit <= 5
+
+def test_fixed_limit():
+    limiter = ConcurrencyLimiter(6, adaptive=False)
+    complete(limiter, overloaded=True)
+    assert limiter.limit == 6
@@ -0,0 +1,8 @@
+from provisioning.schemas import payload_fingerprint
+
+def test_fingerprint_ignores_key_order():
+    assert payload_fingerprint({'a': 1, 'b': [1, 2]}) == payload_fingerprint({'b': [1, 2], 'a': 1})
+
+def test_fingerprint_detects_changes():
+    assert payload_fingerprint({'a': 1}) != payload_fingerprint({'a': 2})
+    assert payload_fingerprint({'a': [1, 2]}) != payload_fingerprint({'a': [2, 1]})
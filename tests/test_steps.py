@@ -0,0 +1,63 @@
+import io
+import threading
+
+from provisioning.steps import ProvisioningStep, StepOutput, critical_path, run_provisioning_steps
+from provisioning.tracing import current_step
+
+def step(name, requires=()):
+    return ProvisioningStep(name, lambda results: name, requires)
+
+STEPS = [
+    step('token'),
+    step('issuer', ['token']),
+    step('verifier', ['token']),
+    step('schema', ['issuer']),
+    step('template', ['verifier']),
+    step('definition', ['issuer', 'schema']),
+]
+
+def test_critical_path_follows_the_latest_dependency():
+    timings = {
+        'token': (0.0, 1.0),
+        'issuer': (1.0, 2.0),
+        'verifier': (1.0, 4.0),
+        'schema': (2.0, 3.0),
+        'template': (4.0, 5.0),
+        'definition': (3.0, 6.0),
+    }
+    assert critical_path(STEPS, timings) == ['token', 'issuer', 'schema', 'definition']
+
+    timings['template'] = (4.0, 7.0)
+    assert critical_path(STEPS, timings) == ['token', 'verifier', 'template']
+
+def test_critical_path_of_no_steps():
+    assert critical_path(STEPS, {}) == []
+
+def test_run_skips_completed_steps():
+    ran = []
+
+    def action(name):
+        return lambda results: ran.append(name) or name
+
+    steps = [ProvisioningStep(s.name, action(s.name), s.requires) for s in STEPS]
+    results, timings = run_provisioning_steps(steps, completed={'token': 'token', 'issuer': 'issuer'})
+    assert sorted(ran) == ['definition', 'schema', 'template', 'verifier']
+    assert results['definition'] == 'definition'
+
+def test_step_output_prefixes_whole_lines():
+    stream = io.StringIO()
+    output = StepOutput(stream)
+
+    def run(name):
+        current_step.name = name
+        output.write('started')
+        output.flush()
+        output.write(' and done\nlast')
+        output.end_line()
+        current_step.name = None
+
+    thread = threading.Thread(target=run, args=('schema',))
+    thread.start()
+    thread.join()
+    output.write('not a step\n')
+    assert stream.getvalue() == '[schema] started and done\n[schema] last\nnot a step\n'
@@ -0,0 +1,28 @@
+import pytest
+
+from provisioning.tracing import percentile, url_template
+
+AGENCY_URL = 'https://agency.example/diagency'
+
+@pytest.mark.parametrize('url, template', [
+    (f"{AGENCY_URL}/v1.0/diagency/agents", '/v1.0/diagency/agents'),
+    (f"{AGENCY_URL}/v1.0/diagency/agents/1234?includepass=true", '/v1.0/diagency/agents/{id}'),
+    (f"{AGENCY_URL}/v2.0/diagency/credential_schemas/abc", '/v2.0/diagency/credential_schemas/{id}'),
+    (f"{AGENCY_URL}/v1.0/diagency/trust/remote_providers/registries/r1/fetch",
+     '/v1.0/diagency/trust/remote_providers/registries/{id}/fetch'),
+    ('/v1.0/oidvc/vp/exchange/e1?x=1', '/v1.0/oidvc/vp/exchange/{id}'),
+])
+def test_url_template(url, template):
+    assert url_template(url, AGENCY_URL) == template
+
+def test_url_template_of_another_host():
+    assert url_template('https://idp.example/oauth2/token?grant=1', AGENCY_URL) == '/oauth2/token'
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile(values, 1.0) == 100
+    assert percentile(values, 0.0) == 1
+    assert percentile([7], 0.9) == 7
+    assert percentile([], 0.5) is None